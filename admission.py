@@ -0,0 +1,299 @@
+"""
+Admission Control and Load Shedding
+Author: Onipede-22CG031936
+
+Decides, before any CPU-bound work starts, whether a request should run at
+all. Three checks are made, in order:
+
+    1. Per-client token bucket: a client over its rate gets 429.
+    2. Bounded in-flight work: at most max_in_flight requests run at once per
+       worker, and at most max_queue more wait for a slot. Beyond that the
+       request gets 503.
+    3. Deadlines: a request that cannot start before its deadline gets 503
+       right away, judged from the queue ahead of it and the recent service
+       time. A request whose deadline passes while it waits gets 503 too.
+
+Every rejection carries a Retry-After estimate. Under overload, work is shed
+at the door instead of piling up behind running requests and finishing after
+the client has given up, so the requests that are admitted still complete
+in time.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed
+
+    Args:
+        status: HTTP status (429 rate limited, 503 overloaded or deadline)
+        reason: 'rate_limited', 'queue_full' or 'deadline'
+        retry_after: Suggested seconds before retrying
+    """
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after}s")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """
+    One admitted request's in-flight slot; release it when the response is done
+    """
+
+    __slots__ = ('_controller', 'deadline', 'started', '_released')
+
+    def __init__(self, controller, deadline):
+        self._controller = controller
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        """Free the slot (safe to call more than once, from any thread)"""
+        self._controller._release(self)
+
+
+class _Waiter:
+    """A request queued for an in-flight slot"""
+
+    __slots__ = ('future', 'deadline')
+
+    def __init__(self, deadline):
+        self.future = Future()
+        self.deadline = deadline
+
+
+class AdmissionController:
+    """
+    Per-worker in-flight limit, wait queue and per-client token buckets
+
+    Args:
+        max_in_flight: Requests allowed to run at the same time
+        max_queue: Requests allowed to wait for a slot
+        rate: Requests per second refilled into each client's bucket (0 disables rate limiting)
+        burst: Bucket capacity, i.e. the requests a client may send at once
+        max_clients: Client buckets remembered (least recently seen are dropped)
+        initial_service_ms: Service time assumed until requests have been measured
+    """
+
+    def __init__(self, max_in_flight=4, max_queue=32, rate=10.0, burst=20,
+                 max_clients=10000, initial_service_ms=100.0):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.rate = max(0.0, float(rate))
+        self.burst = max(1.0, float(burst))
+        self.max_clients = max(1, int(max_clients))
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = deque()
+        self._buckets = OrderedDict()  # client -> [tokens, last refill time]
+        self._service_time = initial_service_ms / 1000.0  # moving average, seconds
+
+        self._admitted = 0
+        self._queued = 0
+        self._completed = 0
+        self._completed_late = 0
+        self._shed = {'rate_limited': 0, 'queue_full': 0, 'deadline': 0}
+
+    # ------------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------------
+
+    def _take_token(self, client, now):
+        """Spend one token from a client's bucket, or return seconds until one is available"""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+    def _expected_start(self, position):
+        """Seconds until the request at this queue position should get a slot"""
+        return math.ceil(position / self.max_in_flight) * self._service_time
+
+    def _reject(self, reason, retry_after):
+        self._shed[reason] += 1
+        status = 429 if reason == 'rate_limited' else 503
+        return AdmissionRejected(status, reason, max(1, math.ceil(retry_after)))
+
+    def _grant(self, deadline):
+        self._in_flight += 1
+        self._admitted += 1
+        return AdmissionTicket(self, deadline)
+
+    def request(self, client, timeout=None):
+        """
+        Ask for an in-flight slot without blocking
+
+        Args:
+            client: Client identity for rate limiting (None skips the rate limit)
+            timeout: Seconds from now until the request's deadline (None for no deadline)
+
+        Returns:
+            Future resolving to an AdmissionTicket (admit and admit_async also
+            take care of leaving the queue when the deadline passes)
+
+        Raises:
+            AdmissionRejected: Rejected immediately
+        """
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+        with self._lock:
+            if self.rate > 0 and client is not None:
+                wait = self._take_token(client, now)
+                if wait > 0:
+                    raise self._reject('rate_limited', wait)
+            if deadline is not None and deadline <= now:
+                raise self._reject('deadline', 0)
+
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                future = Future()
+                future.set_result(self._grant(deadline))
+                return future
+
+            position = len(self._waiters) + 1
+            expected_start = self._expected_start(position)
+            if position > self.max_queue:
+                raise self._reject('queue_full', expected_start)
+            if deadline is not None and now + expected_start > deadline:
+                raise self._reject('deadline', expected_start)
+
+            waiter = _Waiter(deadline)
+            self._waiters.append(waiter)
+            self._queued += 1
+            return waiter.future
+
+    def _withdraw(self, future):
+        """Take a request out of the queue; False if it has already been granted a slot"""
+        with self._lock:
+            for waiter in self._waiters:
+                if waiter.future is future:
+                    self._waiters.remove(waiter)
+                    return True
+        return False
+
+    def _expire(self, future):
+        """
+        Give up a queued request whose deadline has passed
+
+        Returns:
+            The ticket if the slot was granted in the meantime
+
+        Raises:
+            AdmissionRejected: The request was still waiting
+        """
+        if self._withdraw(future):
+            with self._lock:
+                raise self._reject('deadline', self._expected_start(len(self._waiters) + 1))
+        return future.result()
+
+    def admit(self, client, timeout=None):
+        """
+        Wait (at most until the deadline) for an in-flight slot
+
+        Args:
+            client: Client identity for rate limiting
+            timeout: Seconds from now until the request's deadline
+
+        Returns:
+            AdmissionTicket to release when the request is finished
+
+        Raises:
+            AdmissionRejected: The request was shed
+        """
+        future = self.request(client, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # (not the builtin TimeoutError before Python 3.11)
+            return self._expire(future)
+        except BaseException:
+            # Never leave a waiter behind: it would later be granted a slot nobody releases
+            if not self._withdraw(future) and future.done() and future.exception() is None:
+                future.result().release()
+            raise
+
+    async def admit_async(self, client, timeout=None):
+        """
+        admit for asyncio callers: waiting in the queue does not hold a thread
+        """
+        future = self.request(client, timeout)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            return self._expire(future)
+        except asyncio.CancelledError:
+            # The caller went away: leave the queue, or free a slot granted meanwhile
+            if not self._withdraw(future):
+                future.result().release()
+            raise
+
+    # ------------------------------------------------------------------------
+    # Release
+    # ------------------------------------------------------------------------
+
+    def _release(self, ticket):
+        now = time.monotonic()
+        with self._lock:
+            # Test-and-set under the lock: call_on_close, teardown and the GC finalizer may race
+            if ticket._released:
+                return
+            ticket._released = True
+            self._in_flight -= 1
+            self._completed += 1
+            if ticket.deadline is not None and now > ticket.deadline:
+                self._completed_late += 1
+            self._service_time = 0.9 * self._service_time + 0.1 * (now - ticket.started)
+
+            # Hand the slot to the oldest waiter that can still start in time
+            while self._waiters and self._in_flight < self.max_in_flight:
+                waiter = self._waiters.popleft()
+                if waiter.deadline is not None and now > waiter.deadline:
+                    waiter.future.set_exception(self._reject('deadline', self._expected_start(len(self._waiters) + 1)))
+                    continue
+                waiter.future.set_result(self._grant(waiter.deadline))
+
+    def stats(self):
+        """
+        Snapshot of admission counters for /stats
+
+        Returns:
+            Dictionary of limits, current load, admitted/shed counts and goodput
+        """
+        with self._lock:
+            shed = sum(self._shed.values())
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiters),
+                'clients_tracked': len(self._buckets),
+                'admitted': self._admitted,
+                'queued': self._queued,
+                'shed': dict(self._shed),
+                'shed_ratio': shed / (shed + self._admitted) if shed + self._admitted else 0.0,
+                'completed': self._completed,
+                'completed_late': self._completed_late,
+                'mean_service_ms': self._service_time * 1000.0,
+            }
@@ -4,54 +4,230 @@ This app uses a pre-trained TensorFlow model to detect emotions from uploaded im
 Author: Onipede-22CG031936
 """
 
-from flask import Flask, render_template, request, redirect, url_for
-import tensorflow as tf
-from tensorflow import keras
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, g, send_file, abort
 import numpy as np
 import cv2
+import io
+import math
 import os
-from werkzeug.utils import secure_filename
-import sqlite3
+from PIL import Image
+from werkzeug.exceptions import HTTPException
+import json
+import tempfile
+import threading
+import zipfile
+import zlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from batching import MicroBatcher, QueueFullError
+from admission import AdmissionController, AdmissionRejected
+from detectors import DetectorPool
+from storage import BackgroundWriter, UploadStore, KEY_PATTERN
+from prediction_cache import PredictionCache, file_fingerprint
+import database
+import serving_config
+from model_server import ModelServerClient
+from startup import StartupTracker
+from metrics import MetricsRegistry, SIZE_BUCKETS
+from video_analysis import analyze_video, ALLOWED_VIDEO_EXTENSIONS
+
+# Startup phases are timed from the first import of this module
+startup = StartupTracker()
+startup.record('imports', time.perf_counter() - _import_started)
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # Configuration
+# '0' imports app.py only for its helpers (bulk_score.py and dataset_compiler.py workers):
+# no database, upload folder or upload store, and no background writer or metrics snapshots
+app.config['SERVICES_ENABLED'] = os.environ.get('SERVICES_ENABLED', '1') == '1'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Upload handling: 'memory' decodes the upload stream directly, 'disk' saves then reads it back
+app.config['UPLOAD_MODE'] = os.environ.get('UPLOAD_MODE', 'memory')
+# Keep the original image for the results page (written in the background in memory mode)
+app.config['PERSIST_UPLOADS'] = os.environ.get('PERSIST_UPLOADS', '1') == '1'
+
+# Kept uploads are stored once per content hash; least recently used ones are evicted
+# when the store exceeds its size or age budget (0 disables a limit)
+app.config['UPLOAD_STORE_MAX_MB'] = float(os.environ.get('UPLOAD_STORE_MAX_MB', 1024))
+app.config['UPLOAD_STORE_MAX_AGE_DAYS'] = float(os.environ.get('UPLOAD_STORE_MAX_AGE_DAYS', 30))
+app.config['UPLOAD_EVICT_INTERVAL_SECONDS'] = float(os.environ.get('UPLOAD_EVICT_INTERVAL_SECONDS', 60))
+app.config['THUMBNAIL_SIZE'] = int(os.environ.get('THUMBNAIL_SIZE', 256))
+
 # Database configuration
 DATABASE_PATH = 'users_data.db'
 
+# Prediction logging: rows are group-committed by a background writer thread
+app.config['DB_WRITER_ENABLED'] = os.environ.get('DB_WRITER_ENABLED', '1') == '1'
+app.config['DB_WRITER_BATCH'] = int(os.environ.get('DB_WRITER_BATCH', 500))
+app.config['DB_WRITER_MAX_DELAY_MS'] = float(os.environ.get('DB_WRITER_MAX_DELAY_MS', 200))
+
+# Micro-batching configuration (concurrent requests share one model.predict call)
+app.config['BATCHING_ENABLED'] = os.environ.get('BATCHING_ENABLED', '1') == '1'
+app.config['BATCH_MAX_SIZE'] = int(os.environ.get('BATCH_MAX_SIZE', 32))
+app.config['BATCH_MAX_WAIT_MS'] = float(os.environ.get('BATCH_MAX_WAIT_MS', 5.0))
+app.config['BATCH_MAX_QUEUE'] = int(os.environ.get('BATCH_MAX_QUEUE', 256))
+
+# Face detector configuration (Haar cascade detectMultiScale parameters)
+app.config['DETECTOR_POOL_SIZE'] = int(os.environ.get('DETECTOR_POOL_SIZE', 8))
+app.config['DETECTOR_SCALE_FACTOR'] = float(os.environ.get('DETECTOR_SCALE_FACTOR', 1.1))
+app.config['DETECTOR_MIN_NEIGHBORS'] = int(os.environ.get('DETECTOR_MIN_NEIGHBORS', 5))
+app.config['DETECTOR_MIN_SIZE'] = int(os.environ.get('DETECTOR_MIN_SIZE', 30))
+
+# Prediction cache configuration (keyed by image content hash + model version)
+app.config['CACHE_ENABLED'] = os.environ.get('CACHE_ENABLED', '1') == '1'
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 4096))
+app.config['CACHE_TTL_SECONDS'] = float(os.environ.get('CACHE_TTL_SECONDS', 24 * 60 * 60))
+app.config['CACHE_PERSISTENT'] = os.environ.get('CACHE_PERSISTENT', '1') == '1'
+app.config['CACHE_PERSISTENT_MAX_ENTRIES'] = int(os.environ.get('CACHE_PERSISTENT_MAX_ENTRIES', 100000))
+
+# Multi-face mode: classify every detected face in one forward pass
+app.config['MULTI_FACE_ENABLED'] = os.environ.get('MULTI_FACE_ENABLED', '0') == '1'
+app.config['MAX_FACES_PER_IMAGE'] = int(os.environ.get('MAX_FACES_PER_IMAGE', 10))
+
+# Batch JSON API limits (/api/v1/predict)
+app.config['API_MAX_FILES'] = int(os.environ.get('API_MAX_FILES', 256))
+app.config['API_MAX_ARCHIVE_BYTES'] = int(os.environ.get('API_MAX_ARCHIVE_BYTES', 64 * 1024 * 1024))
+app.config['API_WORKERS'] = int(os.environ.get('API_WORKERS', 8))
+
+# Startup: 'background' loads and warms the model in a thread so /healthz answers at once,
+# 'blocking' finishes loading before the module import returns (scripts, --preload),
+# 'off' never loads the model (preprocessing-only processes such as bulk_score.py workers)
+app.config['STARTUP_MODE'] = os.environ.get('STARTUP_MODE', 'background')
+app.config['WARMUP_RUNS'] = int(os.environ.get('WARMUP_RUNS', 2))
+app.config['STARTUP_WAIT_SECONDS'] = float(os.environ.get('STARTUP_WAIT_SECONDS', 60))
+
+# Metrics: per-stage latency histograms and counters, exported on /metrics.
+# Workers write snapshots into METRICS_DIR so any worker can report server-wide totals
+# (defaults to a directory per gunicorn master, i.e. per parent process)
+app.config['METRICS_DIR'] = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), f'emotion-metrics-{os.getppid()}'))
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 1.0))
+# Log one line per request with the time spent in each stage
+app.config['TRACE_REQUESTS'] = os.environ.get('TRACE_REQUESTS', '0') == '1'
+
+# Admission control for the CPU-heavy endpoints: bounded in-flight work per worker (default
+# twice the core count, so the micro-batcher still sees concurrent requests), a bounded wait
+# queue, per-client token buckets and a default deadline (clients may send X-Request-Timeout-Ms)
+app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+app.config['ADMISSION_MAX_IN_FLIGHT'] = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 0)) or 2 * (os.cpu_count() or 1)
+app.config['ADMISSION_MAX_QUEUE'] = int(os.environ.get('ADMISSION_MAX_QUEUE', 32))
+app.config['ADMISSION_RATE_PER_SECOND'] = float(os.environ.get('ADMISSION_RATE_PER_SECOND', 10))
+app.config['ADMISSION_BURST'] = int(os.environ.get('ADMISSION_BURST', 20))
+app.config['ADMISSION_DEFAULT_TIMEOUT_MS'] = float(os.environ.get('ADMISSION_DEFAULT_TIMEOUT_MS', 30000))
+# Longest deadline a client may ask for with X-Request-Timeout-Ms
+app.config['ADMISSION_MAX_TIMEOUT_MS'] = float(os.environ.get('ADMISSION_MAX_TIMEOUT_MS', 300000))
+# Identify clients by the first X-Forwarded-For address (only behind a trusted proxy)
+app.config['ADMISSION_TRUST_PROXY'] = os.environ.get('ADMISSION_TRUST_PROXY', '0') == '1'
+ADMISSION_ENDPOINTS = ('predict', 'api_predict', 'api_video')
+
 # Create upload folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+if app.config['SERVICES_ENABLED']:
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+# Latency histograms and counters shared by every request thread of this worker
+metrics = MetricsRegistry((app.config['SERVICES_ENABLED'] and app.config['METRICS_DIR']) or None,
+                          app.config['METRICS_FLUSH_SECONDS'])
+metrics.histogram('emotion_stage_seconds', "Time spent in each stage of a prediction")
+metrics.histogram('emotion_request_seconds', "HTTP request latency by endpoint")
+metrics.histogram('emotion_upload_bytes', "Size of uploaded images", SIZE_BUCKETS)
+metrics.counter('emotion_requests_total', "HTTP requests by endpoint and status code")
+metrics.counter('emotion_faces_total', "Faces classified")
+metrics.counter('emotion_no_face_total', "Images where no face was found and the whole image was used")
+metrics.counter('emotion_cache_hits_total', "Predictions answered from the prediction cache")
+metrics.counter('emotion_errors_total', "Errors by stage")
+metrics.counter('emotion_admission_total', "Admission decisions by endpoint and outcome")
+
+# Emotion labels (adjust based on your model's output classes, in serving_config.py)
+EMOTION_LABELS = serving_config.EMOTION_LABELS
+
+# Inference backend settings, shared with model_server.py (see serving_config.py)
+app.config['INFERENCE_BACKEND'] = serving_config.INFERENCE_BACKEND
+app.config['COMPILED_BUCKETS'] = serving_config.COMPILED_BUCKETS
+app.config['COMPILED_XLA'] = serving_config.COMPILED_XLA
+app.config['TFLITE_MODEL_PATH'] = serving_config.TFLITE_MODEL_PATH
+app.config['TFLITE_NUM_THREADS'] = serving_config.TFLITE_NUM_THREADS
+app.config['TFLITE_BUCKETS'] = serving_config.TFLITE_BUCKETS
+# Shared model server (model_server.py): when set, workers send preprocessed faces to the one
+# process holding the model through shared memory instead of loading their own copy
+app.config['MODEL_SERVER_SOCKET'] = os.environ.get('MODEL_SERVER_SOCKET', '')
+app.config['MODEL_SERVER_SLOTS'] = int(os.environ.get('MODEL_SERVER_SLOTS', 64))
+app.config['MODEL_SERVER_SLOT_ROWS'] = int(os.environ.get('MODEL_SERVER_SLOT_ROWS', 16))
+app.config['MODEL_SERVER_TIMEOUT_SECONDS'] = float(os.environ.get('MODEL_SERVER_TIMEOUT_SECONDS', 30))
+
+# The pre-trained emotion detection model (loaded by start_worker, see STARTUP section)
+MODEL_PATH = serving_config.MODEL_PATH
+SERVED_MODEL_PATH = serving_config.SERVED_MODEL_PATH
+model = None
 
-# Emotion labels (adjust based on your model's output classes)
-EMOTION_LABELS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+# Model version is the content hash of the served model file, so retraining invalidates cached results
+MODEL_VERSION = None
 
-# Load the pre-trained emotion detection model
-MODEL_PATH = 'face_emotionModel.h5'
-try:
-    model = keras.models.load_model(MODEL_PATH)
-    print("Model loaded successfully!")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+
+def run_model(batch):
+    """
+    Run a forward pass of the loaded model on a batch of preprocessed faces
+    Args:
+        batch: Array of shape (N, 48, 48, 1)
+    Returns:
+        Array of shape (N, num_classes) with class probabilities
+    """
+    return model.predict(batch)
+
+
+# Face detectors are loaded once per worker and shared between request threads
+with startup.phase('detectors'):
+    face_detectors = DetectorPool(
+        max_size=app.config['DETECTOR_POOL_SIZE'],
+        scale_factor=app.config['DETECTOR_SCALE_FACTOR'],
+        min_neighbors=app.config['DETECTOR_MIN_NEIGHBORS'],
+        min_size=(app.config['DETECTOR_MIN_SIZE'], app.config['DETECTOR_MIN_SIZE'])
+    )
+    face_detectors.warm()
+
+
+# Writes uploads to disk off the request path
+upload_writer = BackgroundWriter() if app.config['SERVICES_ENABLED'] else None
+
+
+# Batching scheduler between predict_emotion and the model (created by start_worker)
+batcher = None
+
+
+def run_inference(batch):
+    """
+    Predict class probabilities, going through the micro-batcher when enabled
+    Args:
+        batch: Array of shape (N, 48, 48, 1)
+    Returns:
+        Array of shape (N, num_classes) with class probabilities
+    """
+    if batcher is not None:
+        return batcher.submit(batch)
+    return run_model(batch)
 
 
 # ============================================================================
 # DATABASE FUNCTIONS - Author: Onipede-22CG031936
 # ============================================================================
 
-def init_database():
+def init_database(db_path=DATABASE_PATH):
     """
     Initialize the SQLite database and create the predictions table if it doesn't exist
     This function is called when the app starts to ensure the database is ready
+    Args:
+        db_path: Database file to initialize
     """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = database.connect(db_path)
         cursor = conn.cursor()
 
         # Create table for storing user predictions
@@ -59,13 +235,35 @@ def init_database():
             CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_name TEXT NOT NULL,
-                image_filename TEXT NOT NULL,
+                image_filename TEXT,
                 predicted_emotion TEXT NOT NULL,
                 confidence_score REAL NOT NULL,
                 timestamp DATETIME NOT NULL
             )
         ''')
 
+        # Columns added for multi-face images (one row per face)
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(predictions)')}
+        if 'face_index' not in columns:
+            cursor.execute('ALTER TABLE predictions ADD COLUMN face_index INTEGER NOT NULL DEFAULT 0')
+        if 'face_box' not in columns:
+            cursor.execute('ALTER TABLE predictions ADD COLUMN face_box TEXT')
+        # Set when the stored upload referenced by image_filename has been evicted
+        if 'image_evicted' not in columns:
+            cursor.execute('ALTER TABLE predictions ADD COLUMN image_evicted INTEGER NOT NULL DEFAULT 0')
+        # 1 when image_filename is an upload store key; rows logged before the flag existed are
+        # classified by the shape of the key
+        if 'image_stored' not in columns:
+            cursor.execute('ALTER TABLE predictions ADD COLUMN image_stored INTEGER NOT NULL DEFAULT 1')
+            cursor.execute("UPDATE predictions SET image_stored = 0 "
+                           "WHERE image_filename NOT GLOB '[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]/*.*'")
+        conn.commit()
+        # Rows whose upload was not kept store NULL in image_filename
+        database.allow_null_image_filename(conn)
+
+        # History indexes and incrementally maintained rollup tables
+        database.init_analytics_schema(conn)
+
         conn.commit()
         conn.close()
         print("Database initialized successfully!")
@@ -74,42 +272,89 @@ def init_database():
         print(f"Error initializing database: {e}")
 
 
-def save_prediction_to_db(user_name, image_filename, emotion, confidence):
+def save_prediction_to_db(user_name, image_key, emotion, confidence, face_index=0, face_box=None):
     """
     Save a prediction result to the database
 
     Args:
         user_name: Name of the user (or "Anonymous" if not provided)
-        image_filename: Name of the uploaded image file
+        image_key: Upload store key of the image, or None if the upload was not kept
         emotion: Predicted emotion label
         confidence: Confidence score of the prediction
+        face_index: Position of the face within the image (0 for single-face mode)
+        face_box: Face bounding box as (x, y, w, h), or None if no face was detected
 
     Returns:
         Boolean indicating success or failure
     """
-    try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+    row = (user_name, image_key, emotion, confidence, datetime.now(),
+           face_index, ','.join(str(v) for v in face_box) if face_box else None, int(image_key is not None))
 
-        # Insert prediction record
-        cursor.execute('''
-            INSERT INTO predictions (user_name, image_filename, predicted_emotion, confidence_score, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_name, image_filename, emotion, confidence, datetime.now()))
+    with metrics.stage('db_save'):
+        # Hand the row to the group-commit writer when it is running
+        if prediction_writer is not None:
+            if prediction_writer.enqueue(row):
+                return True
+            metrics.inc('emotion_errors_total', stage='db_save')
+            print("Error saving to database: write queue is full")
+            return False
 
-        conn.commit()
-        conn.close()
+        try:
+            conn = database.thread_connection(DATABASE_PATH)
 
-        print(f"✓ Prediction saved to database: {user_name} - {emotion} ({confidence:.2f}%)")
-        return True
+            # Insert prediction record
+            with conn:
+                conn.execute(database.INSERT_PREDICTION_SQL, row)
 
-    except Exception as e:
-        print(f"Error saving to database: {e}")
-        return False
+            print(f"✓ Prediction saved to database: {user_name} - {emotion} ({confidence:.2f}%)")
+            return True
+
+        except Exception as e:
+            metrics.inc('emotion_errors_total', stage='db_save')
+            print(f"Error saving to database: {e}")
+            return False
 
 
 # Initialize database when app starts
-init_database()
+if app.config['SERVICES_ENABLED']:
+    with startup.phase('init_database'):
+        init_database()
+
+# Background writer that batches prediction inserts (flushed on shutdown)
+prediction_writer = None
+if app.config['SERVICES_ENABLED'] and app.config['DB_WRITER_ENABLED']:
+    prediction_writer = database.PredictionWriter(
+        DATABASE_PATH,
+        max_batch=app.config['DB_WRITER_BATCH'],
+        max_delay_ms=app.config['DB_WRITER_MAX_DELAY_MS']
+    )
+
+
+# Content-addressed store for kept uploads (objects, thumbnails, eviction)
+upload_store = None
+if app.config['SERVICES_ENABLED']:
+    upload_store = UploadStore(
+        app.config['UPLOAD_FOLDER'],
+        DATABASE_PATH,
+        upload_writer,
+        max_bytes=int(app.config['UPLOAD_STORE_MAX_MB'] * 1024 * 1024),
+        max_age_seconds=app.config['UPLOAD_STORE_MAX_AGE_DAYS'] * 24 * 60 * 60,
+        evict_interval=app.config['UPLOAD_EVICT_INTERVAL_SECONDS'],
+        thumbnail_size=app.config['THUMBNAIL_SIZE']
+    )
+
+# Result cache in front of predict_emotion (created by start_worker once MODEL_VERSION is known)
+prediction_cache = None
+
+# Admission controller in front of the CPU-heavy endpoints (see ADMISSION CONTROL section)
+admission = None
+if app.config['ADMISSION_ENABLED']:
+    admission = AdmissionController(
+        max_in_flight=app.config['ADMISSION_MAX_IN_FLIGHT'],
+        max_queue=app.config['ADMISSION_MAX_QUEUE'],
+        rate=app.config['ADMISSION_RATE_PER_SECOND'],
+        burst=app.config['ADMISSION_BURST']
+    )
 
 
 def allowed_file(filename):
@@ -123,75 +368,496 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def preprocess_image(image_path):
+def load_image(image):
     """
-    Preprocess the uploaded image for model prediction
+    Load an image from a path, encoded bytes or an array
     Args:
-        image_path: Path to the uploaded image
+        image: File path, encoded image bytes, or a decoded BGR/grayscale array
     Returns:
-        Preprocessed image array ready for prediction
+        Decoded image as a BGR or grayscale numpy array
     """
-    # Read the image using OpenCV
-    img = cv2.imread(image_path)
+    if isinstance(image, np.ndarray) and image.ndim >= 2:
+        # Already decoded
+        return image
+
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, 'rb') as f:
+            image = f.read()
+
+    buffer = np.frombuffer(image, dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    if img is None:
+        # OpenCV cannot decode GIF, fall back to Pillow for the first frame
+        try:
+            with Image.open(io.BytesIO(buffer.tobytes())) as pil_image:
+                img = cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR)
+        except Exception:
+            raise ValueError("Could not decode image")
+
+    return img
+
+
+def extract_faces(image, max_faces=1, timings=None):
+    """
+    Detect faces and turn them into a batch of model inputs
+    Args:
+        image: Path to the uploaded image, its encoded bytes, or a decoded array
+        max_faces: Maximum number of faces to keep (the largest ones are kept)
+        timings: Optional dict that receives per-stage timings in milliseconds
+    Returns:
+        Tuple of (faces array of shape (N, 48, 48, 1), list of N (x, y, w, h) boxes);
+        if no face is detected the whole image is used and its box is None
+    """
+    if timings is None:
+        timings = {}
+
+    # Decode the image using OpenCV
+    with metrics.stage('decode', timings):
+        img = load_image(image)
     
-    # Convert to grayscale (most emotion models use grayscale)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Convert to grayscale (most emotion models use grayscale)
+        if img.ndim == 2:
+            gray = img
+        else:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
-    # Detect face using Haar Cascade
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    # Detect faces using a pooled Haar Cascade
+    faces = face_detectors.detect(gray, timings)
     
     if len(faces) == 0:
         # If no face detected, use the whole image
-        face_roi = gray
+        boxes = [None]
+        rois = [gray]
     else:
-        # Use the first detected face
-        (x, y, w, h) = faces[0]
-        face_roi = gray[y:y+h, x:x+w]
+        if len(faces) > max_faces:
+            # Over the cap: keep the largest faces
+            faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)[:max_faces]
+        boxes = [tuple(int(v) for v in face) for face in faces]
+        rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in boxes]
     
+    with metrics.stage('resize_normalize', timings):
+        batch = normalize_faces(rois)
+    return batch, boxes
+
+
+def crop_faces(gray, boxes):
+    """
+    Crop face boxes out of a grayscale frame and turn them into model inputs
+    Args:
+        gray: Grayscale image
+        boxes: List of (x, y, w, h) boxes
+    Returns:
+        Array of shape (N, 48, 48, 1)
+    """
+    return normalize_faces([gray[y:y+h, x:x+w] for (x, y, w, h) in boxes])
+
+
+def normalize_faces(rois):
+    """
+    Resize and normalize grayscale face crops into a model input batch
+    Args:
+        rois: List of 2D grayscale crops
+    Returns:
+        Array of shape (N, 48, 48, 1) with values in [0, 1]
+    """
     # Resize to model's expected input size (typically 48x48 for emotion models)
-    face_roi = cv2.resize(face_roi, (48, 48))
+    batch = np.stack([cv2.resize(roi, (48, 48)) for roi in rois])
     
     # Normalize pixel values to [0, 1]
-    face_roi = face_roi.astype('float32') / 255.0
+    batch = batch.astype('float32') / 255.0
     
-    # Reshape for model input: (1, 48, 48, 1) for grayscale
-    face_roi = np.expand_dims(face_roi, axis=0)
-    face_roi = np.expand_dims(face_roi, axis=-1)
+    # Reshape for model input: (N, 48, 48, 1) for grayscale
+    batch = np.expand_dims(batch, axis=-1)
     
+    return batch
+
+
+def preprocess_image(image, timings=None):
+    """
+    Preprocess the uploaded image for model prediction
+    Args:
+        image: Path to the uploaded image, its encoded bytes, or a decoded array
+        timings: Optional dict that receives per-stage timings in milliseconds
+    Returns:
+        Preprocessed image array of shape (1, 48, 48, 1) ready for prediction
+    """
+    face_roi, _ = extract_faces(image, max_faces=1, timings=timings)
     return face_roi
 
 
-def predict_emotion(image_path):
+def classify_faces(image, max_faces=1):
     """
-    Predict emotion from the uploaded image
+    Classify every face in an image with one forward pass (raises on failure)
     Args:
-        image_path: Path to the uploaded image
+        image: Path to the uploaded image, its encoded bytes, or a decoded array
+        max_faces: Maximum number of faces to classify
     Returns:
-        Tuple of (predicted_emotion, confidence_score)
+        List of dicts with 'box', 'emotion' and 'confidence' for each face
     """
-    if model is None:
-        return "Model not loaded", 0.0
+    # Requests that arrive during startup wait for the model instead of failing
+    if not startup.wait_ready(app.config['STARTUP_WAIT_SECONDS']) or model is None:
+        raise RuntimeError("Model not loaded")
+
+    # Look up the result by content hash before doing any work
+    timings = {}
+    cache_key = None
+    if prediction_cache is not None:
+        with metrics.stage('cache_lookup', timings):
+            if isinstance(image, (str, os.PathLike)):
+                with open(image, 'rb') as f:
+                    image = f.read()
+            cache_key = prediction_cache.make_key(image, f'faces={max_faces}')
+            cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc('emotion_cache_hits_total')
+            metrics.record_timings(timings)
+            return cached
+
+    # Preprocess every face into one batch
+    faces, boxes = extract_faces(image, max_faces, timings)
+
+    # Make prediction (batched together with concurrent requests; includes queue wait)
+    with metrics.stage('inference', timings):
+        predictions = run_inference(faces)
+    metrics.record_timings(timings)
+    metrics.inc('emotion_faces_total', len(boxes))
+    if boxes == [None]:
+        metrics.inc('emotion_no_face_total')
     
-    try:
-        # Preprocess the image
-        processed_image = preprocess_image(image_path)
-        
-        # Make prediction
-        predictions = model.predict(processed_image)
-        
+    results = []
+    for box, probabilities in zip(boxes, predictions):
         # Get the emotion with highest probability
-        emotion_index = np.argmax(predictions[0])
-        confidence = float(predictions[0][emotion_index]) * 100
-        
-        # Get emotion label
-        emotion = EMOTION_LABELS[emotion_index]
-        
-        return emotion, confidence
+        emotion_index = int(np.argmax(probabilities))
+        results.append({
+            'box': list(box) if box is not None else None,
+            'emotion': EMOTION_LABELS[emotion_index],
+            'confidence': float(probabilities[emotion_index]) * 100
+        })
+
+    if cache_key is not None:
+        prediction_cache.put(cache_key, results)
+    
+    return results
+
+
+def predict_emotions(image, max_faces=1):
+    """
+    Predict the emotion of every face in the uploaded image with one forward pass
+    Args:
+        image: Path to the uploaded image, its encoded bytes, or a decoded array
+        max_faces: Maximum number of faces to classify
+    Returns:
+        List of dicts with 'box', 'emotion' and 'confidence' for each face
+    """
+    try:
+        return classify_faces(image, max_faces)
     
     except Exception as e:
+        metrics.inc('emotion_errors_total', stage='predict')
         print(f"Error during prediction: {e}")
-        return "Error", 0.0
+        emotion = "Model not loaded" if model is None else "Error"
+        return [{'box': None, 'emotion': emotion, 'confidence': 0.0}]
+
+
+def predict_emotion(image):
+    """
+    Predict emotion from the uploaded image
+    Args:
+        image: Path to the uploaded image, its encoded bytes, or a decoded array
+    Returns:
+        Tuple of (predicted_emotion, confidence_score)
+    """
+    result = predict_emotions(image, max_faces=1)[0]
+    return result['emotion'], result['confidence']
+
+
+# ============================================================================
+# STARTUP - Author: Onipede-22CG031936
+# ============================================================================
+
+def warm_up():
+    """
+    Run synthetic requests so graph tracing and lazy allocations happen before traffic
+    """
+    # Detection path on a synthetic image
+    synthetic = np.full((240, 240), 128, dtype=np.uint8)
+    cv2.ellipse(synthetic, (120, 120), (70, 95), 0, 0, 360, 190, -1)
+    extract_faces(synthetic, max_faces=app.config['MAX_FACES_PER_IMAGE'])
+
+    # Forward passes at the batch sizes the batcher produces
+    batch_sizes = sorted({1, app.config['BATCH_MAX_SIZE'] if batcher is not None else 1})
+    for batch_size in batch_sizes:
+        inputs = np.random.rand(batch_size, 48, 48, 1).astype('float32')
+        for _ in range(app.config['WARMUP_RUNS']):
+            run_model(inputs)
+
+
+def load_served_backend():
+    """
+    Load the inference backend configured in app.config in this process
+
+    Returns:
+        Backend with a predict(batch) method
+    """
+    return serving_config.load_served_backend(
+        app.config['INFERENCE_BACKEND'],
+        SERVED_MODEL_PATH,
+        buckets=app.config['TFLITE_BUCKETS' if app.config['INFERENCE_BACKEND'] == 'tflite' else 'COMPILED_BUCKETS'],
+        jit_compile=app.config['COMPILED_XLA'],
+        num_threads=app.config['TFLITE_NUM_THREADS']
+    )
+
+
+def start_worker():
+    """
+    Load the model, build the model-dependent services and warm up, then mark the worker ready
+    """
+    global model, MODEL_VERSION, batcher, prediction_cache
+
+    try:
+        if app.config['MODEL_SERVER_SOCKET']:
+            # The model lives in model_server.py; this worker never imports TensorFlow
+            with startup.phase('connect_model_server'):
+                loaded = ModelServerClient(
+                    app.config['MODEL_SERVER_SOCKET'],
+                    slots=app.config['MODEL_SERVER_SLOTS'],
+                    slot_rows=app.config['MODEL_SERVER_SLOT_ROWS'],
+                    timeout=app.config['MODEL_SERVER_TIMEOUT_SECONDS'],
+                    connect_timeout=app.config['STARTUP_WAIT_SECONDS']
+                )
+            print(f"Connected to model server at {app.config['MODEL_SERVER_SOCKET']}")
+        else:
+            with startup.phase('load_model'):
+                loaded = load_served_backend()
+            print(f"Model loaded successfully! ({loaded.name} backend: {SERVED_MODEL_PATH})")
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        startup.mark_failed(e)
+        return
+
+    with startup.phase('model_fingerprint'):
+        MODEL_VERSION = loaded.model_version if app.config['MODEL_SERVER_SOCKET'] else file_fingerprint(SERVED_MODEL_PATH)
+
+    if app.config['CACHE_ENABLED']:
+        with startup.phase('prediction_cache'):
+            prediction_cache = PredictionCache(
+                MODEL_VERSION,
+                max_entries=app.config['CACHE_MAX_ENTRIES'],
+                ttl_seconds=app.config['CACHE_TTL_SECONDS'],
+                db_path=DATABASE_PATH if app.config['CACHE_PERSISTENT'] and app.config['SERVICES_ENABLED'] else None,
+                writer=prediction_writer,
+                max_persistent_entries=app.config['CACHE_PERSISTENT_MAX_ENTRIES']
+            )
+
+    model = loaded
+    # With a model server, batching across all workers happens there
+    if app.config['BATCHING_ENABLED'] and not app.config['MODEL_SERVER_SOCKET']:
+        batcher = MicroBatcher(
+            run_model,
+            max_batch_size=app.config['BATCH_MAX_SIZE'],
+            max_wait_ms=app.config['BATCH_MAX_WAIT_MS'],
+            max_queue_size=app.config['BATCH_MAX_QUEUE']
+        )
+
+    startup.set_state('warming')
+    try:
+        with startup.phase('warmup'):
+            warm_up()
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        startup.mark_failed(e)
+        return
+
+    startup.mark_ready()
+
+
+if app.config['STARTUP_MODE'] == 'blocking':
+    start_worker()
+elif app.config['STARTUP_MODE'] != 'off':
+    threading.Thread(target=start_worker, name='startup', daemon=True).start()
+
+
+# ============================================================================
+# REQUEST METRICS - Author: Onipede-22CG031936
+# ============================================================================
+
+@app.before_request
+def start_request_metrics():
+    """
+    Start timing the request and collecting its per-stage trace
+    """
+    g.request_started = time.perf_counter()
+    metrics.start_trace()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Record request latency and status, and log the per-stage trace when enabled
+    (for streamed responses this is the time until the first byte)
+    """
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    endpoint = request.endpoint or 'unknown'
+    metrics.observe('emotion_request_seconds', elapsed, endpoint=endpoint)
+    metrics.inc('emotion_requests_total', endpoint=endpoint, status=str(response.status_code))
+
+    stages = metrics.end_trace()
+    if app.config['TRACE_REQUESTS'] and endpoint not in ('metrics', 'healthz', 'readyz', 'static'):
+        print("trace " + json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000.0, 3),
+            'stages_ms': stages,
+        }))
+    return response
+
+
+# ============================================================================
+# ADMISSION CONTROL - Author: Onipede-22CG031936
+# ============================================================================
+
+def admission_target(environ):
+    """
+    Decide whether a request goes through admission control
+
+    Args:
+        environ: WSGI environ (also built by asgi.py before dispatching)
+
+    Returns:
+        Tuple of (endpoint, client, timeout seconds or None), or None for requests
+        that are always served
+    """
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    if endpoint not in ADMISSION_ENDPOINTS:
+        return None
+
+    client = environ.get('REMOTE_ADDR')
+    forwarded = environ.get('HTTP_X_FORWARDED_FOR')
+    if app.config['ADMISSION_TRUST_PROXY'] and forwarded:
+        client = forwarded.split(',')[0].strip()
+
+    # A default of 0 means no deadline; a valid client-sent budget is honoured up to the
+    # configured maximum, anything else (inf, nan, <= 0, not a number) is ignored
+    timeout_ms = app.config['ADMISSION_DEFAULT_TIMEOUT_MS'] or None
+    try:
+        requested = float(environ['HTTP_X_REQUEST_TIMEOUT_MS'])
+    except (KeyError, ValueError):
+        requested = None
+    if requested is not None and math.isfinite(requested) and requested > 0:
+        timeout_ms = min(requested, app.config['ADMISSION_MAX_TIMEOUT_MS'])
+    return endpoint, client, timeout_ms / 1000.0 if timeout_ms is not None else None
+
+
+def admission_rejection(e):
+    """
+    JSON body and headers for a shed request (shared with asgi.py)
+
+    Returns:
+        Tuple of (body dict, headers dict)
+    """
+    messages = {
+        'rate_limited': "Too many requests from this client",
+        'queue_full': "Server is overloaded",
+        'deadline': "Request cannot be started before its deadline",
+    }
+    body = {'error': messages[e.reason], 'reason': e.reason, 'retry_after': e.retry_after}
+    return body, {'Retry-After': str(e.retry_after)}
+
+
+@app.before_request
+def admit_request():
+    """
+    Hold an in-flight slot for CPU-heavy requests, or shed them (429/503)
+    """
+    if admission is None:
+        return
+    # asgi.py admits requests on the event loop before handing them over
+    ticket = request.environ.get('emotion.admission_ticket')
+    if ticket is None:
+        target = admission_target(request.environ)
+        if target is None:
+            return
+        endpoint, client, timeout = target
+        ticket = admission.admit(client, timeout)
+        metrics.inc('emotion_admission_total', endpoint=endpoint, outcome='admitted')
+    g.admission_ticket = ticket
+
+
+@app.after_request
+def hand_over_admission_ticket(response):
+    """
+    Keep the slot of a streamed response until it is fully sent (its work happens then)
+    """
+    if response.is_streamed:
+        ticket = g.pop('admission_ticket', None)
+        if ticket is not None:
+            response.call_on_close(ticket.release)
+            # Fallback for clients that never close the response (release is idempotent)
+            weakref.finalize(response, ticket.release)
+    return response
+
+
+@app.teardown_request
+def release_admission_ticket(exc):
+    """
+    Free the slot once a buffered response is built, or when the request failed
+    """
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    """
+    Answer a shed request with 429/503 and Retry-After
+    """
+    metrics.inc('emotion_admission_total', endpoint=request.endpoint or 'unknown', outcome=e.reason)
+    body, headers = admission_rejection(e)
+    return jsonify(body), e.status, headers
+
+
+@app.errorhandler(QueueFullError)
+def inference_queue_full(e):
+    """
+    The micro-batcher's queue is full: shed the request instead of failing with 500
+    """
+    metrics.inc('emotion_errors_total', stage='batch_queue_full')
+    return jsonify({'error': "Server is overloaded", 'reason': 'queue_full', 'retry_after': 1}), 503, {'Retry-After': '1'}
+
+
+# ============================================================================
+# ROUTES - Author: Onipede-22CG031936
+# ============================================================================
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint, aggregated across all gunicorn workers
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness probe: the process is up and serving HTTP
+    """
+    return jsonify({'status': 'ok', 'state': startup.state})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness probe: 200 only once the model is loaded and warmed up
+    """
+    report = startup.report()
+    return jsonify(report), 200 if startup.ready else 503
 
 
 @app.route('/', methods=['GET'])
@@ -227,27 +893,306 @@ def predict():
         if not user_name:
             user_name = "Anonymous"
 
-        # Secure the filename and save the file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        extension = file.filename.rsplit('.', 1)[1].lower()
+
+        # Kept uploads are stored by content hash; predictions reference the object key
+        image_key = None
+        with metrics.stage('upload'):
+            if app.config['UPLOAD_MODE'] == 'disk':
+                # Save the file, then predict from it
+                saved = tempfile.NamedTemporaryFile(dir=app.config['UPLOAD_FOLDER'], suffix='.upload', delete=False)
+                with saved:
+                    file.save(saved)
+                upload_size = os.path.getsize(saved.name)
+                image_key = upload_store.put_file(saved.name, extension)
+                image = upload_store.object_path(image_key)
+            else:
+                # Decode straight from the upload stream, persist in the background
+                image = file.read()
+                upload_size = len(image)
+                if app.config['PERSIST_UPLOADS']:
+                    image_key = upload_store.put(image, extension)
+        metrics.observe('emotion_upload_bytes', upload_size, endpoint='predict')
 
-        # Predict emotion
-        emotion, confidence = predict_emotion(filepath)
+        # Predict emotion for one face, or for every face in multi-face mode
+        multi_face = app.config['MULTI_FACE_ENABLED'] or request.form.get('multi_face') == 'on'
+        max_faces = app.config['MAX_FACES_PER_IMAGE'] if multi_face else 1
+        faces = predict_emotions(image, max_faces)
 
-        # Save prediction to database
-        save_prediction_to_db(user_name, filename, emotion, confidence)
+        # Save one prediction row per face to database
+        for face_index, face in enumerate(faces):
+            save_prediction_to_db(user_name, image_key, face['emotion'], face['confidence'],
+                                  face_index, face['box'])
 
         # Render template with results
-        return render_template('index.htm',
-                             emotion=emotion,
-                             confidence=round(confidence, 2),
-                             image_path=filepath,
-                             user_name=user_name)
+        with metrics.stage('render'):
+            return render_template('index.htm',
+                                 emotion=faces[0]['emotion'],
+                                 confidence=round(faces[0]['confidence'], 2),
+                                 faces=faces if multi_face else None,
+                                 image_url=url_for('upload_thumbnail', key=image_key) if image_key else None,
+                                 user_name=user_name)
     else:
         return render_template('index.htm', error="Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF)")
 
 
+@app.route('/uploads/<path:key>', methods=['GET'])
+def upload_thumbnail(key):
+    """
+    Serve the thumbnail of a stored upload (the original until the thumbnail is written)
+    """
+    if not KEY_PATTERN.match(key):
+        abort(404)
+    upload_store.touch(key)
+    for path, mimetype in ((upload_store.thumbnail_path(key), 'image/jpeg'), (upload_store.object_path(key), None)):
+        if os.path.exists(path):
+            return send_file(os.path.abspath(path), mimetype=mimetype, max_age=24 * 60 * 60)
+    abort(404)
+
+
+# ============================================================================
+# BATCH JSON API - Author: Onipede-22CG031936
+# ============================================================================
+
+# Worker threads that feed API images into the shared batching pipeline
+api_executor = ThreadPoolExecutor(max_workers=app.config['API_WORKERS'], thread_name_prefix='api')
+
+
+def collect_api_images(files):
+    """
+    Expand uploaded files (and zip archives) into a list of images to score
+    Args:
+        files: List of uploaded FileStorage objects
+    Returns:
+        List of (filename, image_bytes, error) tuples; error is None for valid images
+    """
+    images = []
+    archive_budget = app.config['API_MAX_ARCHIVE_BYTES']
+
+    for file in files:
+        name = file.filename or ''
+        if name.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file.stream) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not allowed_file(info.filename):
+                            continue
+                        if info.file_size > archive_budget:
+                            images.append((info.filename, None, "Archive exceeds size limit"))
+                            break
+                        archive_budget -= info.file_size
+                        try:
+                            images.append((info.filename, archive.read(info), None))
+                        except NotImplementedError:
+                            images.append((info.filename, None, "Unsupported compression method"))
+                        except RuntimeError:
+                            images.append((info.filename, None, "Encrypted archive entry"))
+                        except (zipfile.BadZipFile, zlib.error, EOFError):
+                            images.append((info.filename, None, "Corrupt archive entry"))
+            except zipfile.BadZipFile:
+                images.append((name, None, "Invalid zip archive"))
+        elif allowed_file(name):
+            images.append((name, file.read(), None))
+        else:
+            images.append((name, None, "Invalid file type"))
+
+    return images
+
+
+def score_api_image(index, filename, image_bytes, user_name, max_faces):
+    """
+    Score one API image and save its predictions
+    Args:
+        index: Position of the image in the request
+        filename: Original file name
+        image_bytes: Encoded image
+        user_name: Name stored with the predictions
+        max_faces: Maximum number of faces to classify
+    Returns:
+        Result dictionary for one NDJSON line
+    """
+    metrics.observe('emotion_upload_bytes', len(image_bytes), endpoint='api')
+    try:
+        faces = classify_faces(image_bytes, max_faces)
+    except Exception as e:
+        metrics.inc('emotion_errors_total', stage='predict')
+        return {'index': index, 'filename': filename, 'error': str(e)}
+
+    # Kept like /predict uploads, so every stored image_filename is an upload store key
+    image_key = None
+    if app.config['PERSIST_UPLOADS']:
+        image_key = upload_store.put(image_bytes, filename.rsplit('.', 1)[1])
+    for face_index, face in enumerate(faces):
+        save_prediction_to_db(user_name, image_key, face['emotion'], face['confidence'],
+                              face_index, face['box'])
+
+    return {'index': index, 'filename': filename, 'faces': faces}
+
+
+@app.route('/api/v1/predict', methods=['POST'])
+def api_predict():
+    """
+    Score many images (multipart 'files' fields and/or zip archives) in one request
+    Streams one NDJSON line per image as soon as its result is ready
+    """
+    files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
+        return jsonify({'error': "No files uploaded"}), 400
+
+    images = collect_api_images(files)
+    if len(images) > app.config['API_MAX_FILES']:
+        return jsonify({'error': f"Too many images (max {app.config['API_MAX_FILES']})"}), 413
+
+    user_name = request.form.get('user_name', '').strip() or "Anonymous"
+    multi_face = request.form.get('multi_face', '').lower() in ('1', 'true', 'on')
+    max_faces = app.config['MAX_FACES_PER_IMAGE'] if multi_face else 1
+
+    # Invalid entries are reported inline, valid ones run concurrently so they share batches
+    futures = []
+    errors = []
+    for index, (filename, image_bytes, error) in enumerate(images):
+        if error is not None:
+            errors.append({'index': index, 'filename': filename, 'error': error})
+        else:
+            futures.append(api_executor.submit(score_api_image, index, filename, image_bytes,
+                                               user_name, max_faces))
+
+    def generate():
+        for result in errors:
+            yield json.dumps(result) + '\n'
+        for future in as_completed(futures):
+            yield json.dumps(future.result()) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/api/v1/video', methods=['POST'])
+def api_video():
+    """
+    Per-second emotion timeline of an uploaded video clip ('file' field)
+    Form fields: sample_fps (default 2), redetect_seconds (default 1)
+    Streams one NDJSON line per face per second, then a summary line
+    """
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': "No file uploaded"}), 400
+    extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    if extension not in ALLOWED_VIDEO_EXTENSIONS:
+        return jsonify({'error': f"Invalid video type (use {', '.join(sorted(ALLOWED_VIDEO_EXTENSIONS))})"}), 400
+
+    try:
+        sample_fps = float(request.form.get('sample_fps', 2.0))
+        redetect_seconds = float(request.form.get('redetect_seconds', 1.0))
+    except ValueError:
+        return jsonify({'error': "sample_fps and redetect_seconds must be numbers"}), 400
+    if sample_fps <= 0 or redetect_seconds <= 0:
+        return jsonify({'error': "sample_fps and redetect_seconds must be positive"}), 400
+
+    if not startup.wait_ready(app.config['STARTUP_WAIT_SECONDS']) or model is None:
+        return jsonify({'error': "Model not loaded"}), 503
+
+    # OpenCV decodes video from files only, so the upload is spooled to a temp file
+    video_file = tempfile.NamedTemporaryFile(suffix=f'.{extension}', delete=False)
+    try:
+        with video_file:
+            file.save(video_file)
+    except BaseException:
+        os.remove(video_file.name)
+        raise
+
+    def remove_video():
+        try:
+            os.remove(video_file.name)
+        except FileNotFoundError:
+            pass
+
+    def generate():
+        summary = {}
+        try:
+            for entry in analyze_video(video_file.name, face_detectors.detect, crop_faces, run_inference,
+                                       EMOTION_LABELS, sample_fps=sample_fps,
+                                       redetect_seconds=redetect_seconds,
+                                       max_faces=app.config['MAX_FACES_PER_IMAGE'], summary=summary):
+                yield json.dumps(entry) + '\n'
+            yield json.dumps({'summary': summary}) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    # Runs when the server closes the response, even if the client left before the body was read
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(remove_video)
+    return response
+
+
+# ============================================================================
+# HISTORY AND ANALYTICS API - Author: Onipede-22CG031936
+# ============================================================================
+
+@app.route('/api/v1/history', methods=['GET'])
+def api_history():
+    """
+    Page through logged predictions, newest first
+    Query parameters: user, emotion, start, end, limit (max 500), cursor
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': "limit and cursor must be integers"}), 400
+
+    items, next_cursor = database.query_history(
+        database.thread_connection(DATABASE_PATH),
+        user_name=request.args.get('user') or None,
+        emotion=request.args.get('emotion') or None,
+        start=request.args.get('start') or None,
+        end=request.args.get('end') or None,
+        before_id=cursor,
+        limit=limit
+    )
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+
+@app.route('/api/v1/analytics', methods=['GET'])
+def api_analytics():
+    """
+    Emotion distribution per hour or day, read from the rollup tables
+    Query parameters: granularity (hour|day), user, by_user, start, end
+    """
+    granularity = request.args.get('granularity', 'day')
+    try:
+        buckets = database.query_distribution(
+            database.thread_connection(DATABASE_PATH),
+            granularity=granularity,
+            user_name=request.args.get('user') or None,
+            start=request.args.get('start') or None,
+            end=request.args.get('end') or None,
+            by_user=request.args.get('by_user', '').lower() in ('1', 'true', 'on')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'granularity': granularity, 'buckets': buckets})
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Report serving statistics as JSON for throughput/latency tuning
+    """
+    return jsonify({
+        'admission': admission.stats() if admission is not None else None,
+        'batching': batcher.stats() if batcher is not None else None,
+        'model_server': model.stats() if isinstance(model, ModelServerClient) else None,
+        'detectors': face_detectors.stats(),
+        'upload_writer': upload_writer.stats() if upload_writer is not None else None,
+        'upload_store': upload_store.stats() if upload_store is not None else None,
+        'cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'db_writer': prediction_writer.stats() if prediction_writer is not None else None,
+        'startup': startup.report()
+    })
+
+
 @app.route('/reset', methods=['GET'])
 def reset():
     """
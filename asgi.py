@@ -0,0 +1,231 @@
+"""
+Async Serving Mode (ASGI)
+Author: Onipede-22CG031936
+
+Serves the same Flask routes from an asyncio event loop. Under sync
+gunicorn workers a client that uploads slowly holds a worker thread for the
+whole transfer. Here the request body is received by the event loop instead,
+so thousands of slow clients cost only a coroutine and a spooled buffer each.
+Only once the body is complete is the request handed to the Flask app, which
+runs in a bounded thread pool sized to the CPU count. That is where decode,
+detection and inference happen, with exactly the code the sync mode runs.
+Responses, including streamed NDJSON, are sent back without blocking the loop.
+
+Admission control (admission.py) also runs on the event loop, so requests
+waiting for an in-flight slot, or shed with 429/503, never occupy a thread.
+
+Any ASGI server can run it, for example:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import app as emotion_app
+from admission import AdmissionRejected
+
+
+# Threads running Flask handlers: one per admitted CPU-heavy request plus one per core
+# for the cheap routes (just the core count when admission control is off)
+ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', 0)) or (
+    (emotion_app.app.config['ADMISSION_MAX_IN_FLIGHT'] if emotion_app.admission is not None else 0)
+    + (os.cpu_count() or 1))
+# Request bodies above this size are spooled to a temporary file while they arrive
+ASYNC_SPOOL_BYTES = int(os.environ.get('ASYNC_SPOOL_BYTES', 1024 * 1024))
+
+executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix='asgi')
+
+_END = object()
+
+
+def build_environ(scope, body, content_length):
+    """
+    Translate an ASGI HTTP scope into a WSGI environ for the Flask app
+
+    Args:
+        scope: ASGI connection scope
+        body: File object holding the complete request body
+        content_length: Number of bytes in body
+
+    Returns:
+        WSGI environ dictionary
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(content_length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+            # The body has been fully received, its real length is set above
+            continue
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def call_flask(environ):
+    """
+    Run the Flask app on one request (in a worker thread)
+
+    Returns:
+        Tuple of (status line, header list, response iterator, iterable to close)
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = status
+        started['headers'] = headers
+
+    iterable = emotion_app.app(environ, start_response)
+    return started['status'], started['headers'], iter(iterable), iterable
+
+
+async def _respond(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _receive_body(receive, limit):
+    """
+    Receive the request body without blocking the event loop
+
+    Returns:
+        Tuple of (spooled file, length), or (None, status) when the body was
+        rejected (413) or the client disconnected (0)
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=ASYNC_SPOOL_BYTES)
+    length = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None, 0
+        chunk = message.get('body', b'')
+        length += len(chunk)
+        if limit is not None and length > limit:
+            body.close()
+            return None, 413
+        if chunk:
+            body.write(chunk)
+        if not message.get('more_body', False):
+            break
+    body.seek(0)
+    return body, length
+
+
+async def _admit(environ, send):
+    """
+    Run admission control for a complete request on the event loop
+
+    Returns:
+        Tuple of (admitted, ticket or None); a shed request has been answered already
+    """
+    target = emotion_app.admission_target(environ) if emotion_app.admission is not None else None
+    if target is None:
+        return True, None
+
+    endpoint, client, timeout = target
+    try:
+        ticket = await emotion_app.admission.admit_async(client, timeout)
+    except AdmissionRejected as e:
+        emotion_app.metrics.inc('emotion_admission_total', endpoint=endpoint, outcome=e.reason)
+        emotion_app.metrics.inc('emotion_requests_total', endpoint=endpoint, status=str(e.status))
+        body, headers = emotion_app.admission_rejection(e)
+        await _respond(send, e.status, [(b'content-type', b'application/json')] + [
+            (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()
+        ], json.dumps(body).encode('utf-8'))
+        return False, None
+    emotion_app.metrics.inc('emotion_admission_total', endpoint=endpoint, outcome='admitted')
+    environ['emotion.admission_ticket'] = ticket
+    return True, ticket
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point serving every route of app.py
+    """
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    limit = emotion_app.app.config['MAX_CONTENT_LENGTH']
+    declared = dict(scope.get('headers', [])).get(b'content-length')
+    if limit is not None and declared is not None and declared.isdigit() and int(declared) > limit:
+        await _respond(send, 413, [(b'content-type', b'text/plain')], b'Request Entity Too Large')
+        return
+
+    body, length = await _receive_body(receive, limit)
+    if body is None:
+        if length == 413:
+            await _respond(send, 413, [(b'content-type', b'text/plain')], b'Request Entity Too Large')
+        return
+
+    loop = asyncio.get_running_loop()
+    iterable = None
+    ticket = None
+    try:
+        environ = build_environ(scope, body, length)
+        admitted, ticket = await _admit(environ, send)
+        if not admitted:
+            return
+        status, headers, iterator, iterable = await loop.run_in_executor(executor, call_flask, environ)
+
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        # Each chunk is produced in the pool, so streamed responses never block the loop
+        while True:
+            chunk = await loop.run_in_executor(executor, next, iterator, _END)
+            if chunk is _END:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if iterable is not None and hasattr(iterable, 'close'):
+            await loop.run_in_executor(executor, iterable.close)
+        if ticket is not None:
+            ticket.release()
+        body.close()
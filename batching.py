@@ -0,0 +1,245 @@
+"""
+Dynamic Micro-Batching for Emotion Model Inference
+Author: Onipede-22CG031936
+
+Collects preprocessed face tensors from concurrent requests and runs them
+through the model as a single batch. A batch is dispatched as soon as either
+the maximum batch size is reached or the oldest queued request has waited
+for the maximum wait time, and each caller then receives its own rows of the
+prediction output.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the batching queue is at its configured depth"""
+
+
+class _PendingRequest:
+    """A single caller's inputs waiting to be batched"""
+
+    __slots__ = ('inputs', 'future', 'enqueued_at')
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Batching scheduler between request handlers and the model
+
+    Args:
+        predict_fn: Callable taking an (N, 48, 48, 1) array and returning (N, num_classes)
+        max_batch_size: Maximum number of rows sent to the model in one call
+        max_wait_ms: Longest time the first queued request waits for others to join
+        max_queue_size: Maximum number of requests waiting for a batch slot
+        latency_window: Number of recent requests kept for latency percentiles
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0,
+                 max_queue_size=256, latency_window=1000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max(1, int(max_queue_size))
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._carry = None  # Request that did not fit in the previous batch
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._queue_waits = deque(maxlen=latency_window)
+        self._batch_sizes = {}
+        self._requests = 0
+        self._rows = 0
+        self._batches = 0
+        self._rejected = 0
+        self._errors = 0
+        self._model_time = 0.0
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs, timeout=None):
+        """
+        Queue inputs for batched prediction and wait for the result
+
+        Args:
+            inputs: Array of shape (n, 48, 48, 1) for a single caller
+            timeout: Seconds to wait for the result (None waits forever)
+
+        Returns:
+            Array of shape (n, num_classes) with this caller's predictions
+        """
+        if inputs.shape[0] > self.max_batch_size:
+            # Oversized requests bypass the queue instead of starving it
+            return self.predict_fn(inputs)
+
+        return self.submit_async(inputs).result(timeout=timeout)
+
+    def submit_async(self, inputs):
+        """
+        Queue inputs for batched prediction without waiting for the result
+
+        Args:
+            inputs: Array of shape (n, 48, 48, 1); must stay unchanged until the future is done
+
+        Returns:
+            Future resolving to an array of shape (n, num_classes)
+        """
+        if inputs.shape[0] > self.max_batch_size:
+            future = Future()
+            try:
+                future.set_result(self.predict_fn(inputs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self._stopped.is_set():
+            raise RuntimeError("Batcher has been closed")
+
+        pending = _PendingRequest(inputs)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_size} pending requests)")
+
+        pending.future.add_done_callback(lambda future: self._record_latency(pending))
+        return pending.future
+
+    def _record_latency(self, pending):
+        if pending.future.exception() is None:
+            latency = time.perf_counter() - pending.enqueued_at
+            with self._stats_lock:
+                self._latencies.append(latency)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until size or wait limit"""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+            if first is None:
+                return None
+
+        batch = [first]
+        rows = first.inputs.shape[0]
+        deadline = first.enqueued_at + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                self._stopped.set()
+                break
+            if rows + item.inputs.shape[0] > self.max_batch_size:
+                self._carry = item
+                break
+
+            batch.append(item)
+            rows += item.inputs.shape[0]
+
+        return batch
+
+    def _run(self):
+        """Worker loop: collect a batch, run the model, hand results back"""
+        while True:
+            if self._stopped.is_set() and self._carry is None and self._queue.empty():
+                break
+
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            dispatched_at = time.perf_counter()
+            inputs = np.concatenate([item.inputs for item in batch], axis=0)
+
+            try:
+                outputs = self.predict_fn(inputs)
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                with self._stats_lock:
+                    self._errors += 1
+                continue
+
+            model_time = time.perf_counter() - dispatched_at
+
+            offset = 0
+            for item in batch:
+                n = item.inputs.shape[0]
+                item.future.set_result(outputs[offset:offset + n])
+                offset += n
+
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._rows += inputs.shape[0]
+                self._model_time += model_time
+                self._batch_sizes[inputs.shape[0]] = self._batch_sizes.get(inputs.shape[0], 0) + 1
+                for item in batch:
+                    self._queue_waits.append(dispatched_at - item.enqueued_at)
+
+    def close(self, timeout=5.0):
+        """Stop the worker after draining requests that are already queued"""
+        self._stopped.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+
+    def stats(self):
+        """
+        Snapshot of batching statistics for tuning throughput against latency
+
+        Returns:
+            Dictionary of counters, batch size distribution and latency percentiles (ms)
+        """
+        with self._stats_lock:
+            latencies = list(self._latencies)
+            queue_waits = list(self._queue_waits)
+            batches = self._batches
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'max_queue_size': self.max_queue_size,
+                'queue_depth': self._queue.qsize(),
+                'requests': self._requests,
+                'rows': self._rows,
+                'batches': batches,
+                'rejected': self._rejected,
+                'errors': self._errors,
+                'mean_batch_size': self._rows / batches if batches else 0.0,
+                'mean_model_time_ms': self._model_time / batches * 1000.0 if batches else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'latency_ms': _percentiles(latencies),
+                'queue_wait_ms': _percentiles(queue_waits),
+            }
+
+
+def _percentiles(samples):
+    """Return p50/p95/p99/max of a list of durations in seconds, as milliseconds"""
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    values = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(values.max())}
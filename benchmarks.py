@@ -0,0 +1,356 @@
+"""
+Inference Path Microbenchmarks
+Author: Onipede-22CG031936
+
+Times every stage a prediction goes through, from the filename check to the
+full /predict request, so a slower app.py shows up before it is deployed:
+
+    allowed_file, decode, haar_detect, preprocess_image, resize_normalize,
+    predict_bs<N> (model.predict, the 'keras' backend, at several batch sizes),
+    compiled_bs<N> / compiled_xla_bs<N> (the compiled backend, without and with XLA),
+    save_prediction_to_db (insert and commit), save_prediction_enqueue (hand-off
+    to the group-commit writer), predict_endpoint (Flask test client)
+
+The benchmarks use synthetic face images and a randomly initialized
+create_emotion_model, so they need neither the trained weights nor network
+access. The app runs from a temporary directory, so the real database and
+upload folder are never touched.
+
+Results are compared with a JSON baseline: any stage whose median time grows
+by more than the threshold is reported and the script exits with status 1.
+
+Usage:
+    python benchmarks.py --save-baseline          # record benchmarks_baseline.json
+    python benchmarks.py                          # compare against it
+    python benchmarks.py --threshold 0.1 --only decode,haar_detect
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, 'benchmarks_baseline.json')
+PREDICT_BATCH_SIZES = (1, 8, 32, 128)
+
+
+# ============================================================================
+# SYNTHETIC INPUTS
+# ============================================================================
+
+def synthetic_face(size=200, seed=0):
+    """
+    Draw a grayscale face that the frontal Haar cascade detects
+
+    Args:
+        size: Width and height of the face image in pixels
+        seed: Varies the skin tone slightly
+
+    Returns:
+        uint8 array of shape (size, size)
+    """
+    rng = np.random.default_rng(seed)
+    skin, dark = 190 + int(rng.integers(-10, 10)), 40
+    img = np.full((size, size), 90, np.uint8)
+    c = size // 2
+    cv2.ellipse(img, (c, c), (int(size * 0.32), int(size * 0.42)), 0, 0, 360, skin, -1)
+    eye_y, eye_x = int(c - size * 0.1), int(size * 0.13)
+    for side in (-1, 1):
+        x = c + side * eye_x
+        cv2.ellipse(img, (x, eye_y), (int(size * 0.07), int(size * 0.04)), 0, 0, 360, dark, -1)
+        cv2.line(img, (x - int(size * 0.08), eye_y - int(size * 0.08)),
+                 (x + int(size * 0.08), eye_y - int(size * 0.08)), dark, max(2, size // 40))
+    cv2.ellipse(img, (c, c + int(size * 0.2)), (int(size * 0.12), int(size * 0.04)), 0, 0, 360, dark + 30, -1)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def synthetic_photo(width=640, height=480):
+    """
+    A BGR photo-sized image with one synthetic face in it, PNG-encoded
+
+    Returns:
+        Encoded PNG bytes
+    """
+    canvas = np.full((height, width), 90, np.uint8)
+    face = synthetic_face(240)
+    top, left = (height - 240) // 2, (width - 240) // 2
+    canvas[top:top + 240, left:left + 240] = face
+    return cv2.imencode('.png', cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR))[1].tobytes()
+
+
+# ============================================================================
+# TIMING
+# ============================================================================
+
+def measure(fn, repeat=30, number=1, warmup=3):
+    """
+    Time a callable
+
+    Args:
+        fn: Callable taking no arguments
+        repeat: Number of timed samples
+        number: Calls per sample (for very fast functions)
+        warmup: Untimed calls before measuring
+
+    Returns:
+        Dictionary with median, p95, min and mean milliseconds per call
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000.0 / number)
+
+    samples = np.array(samples)
+    return {
+        'median_ms': round(float(np.median(samples)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'mean_ms': round(float(samples.mean()), 4),
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def environment():
+    """Describe the machine so baselines from different hosts are not compared blindly"""
+    import tensorflow as tf
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tensorflow': tf.__version__,
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }
+
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def load_app(workdir):
+    """
+    Import app.py in a temporary working directory and serve a random model
+
+    Args:
+        workdir: Directory for the database and uploads of this run
+
+    Returns:
+        Tuple of (imported app module ready to serve predictions,
+        dict of backend name -> backend over the same random model)
+    """
+    os.environ['STARTUP_MODE'] = 'off'
+    os.environ['CACHE_ENABLED'] = '0'
+    # Back-to-back requests from one client would hit the per-client rate limit
+    os.environ['ADMISSION_ENABLED'] = '0'
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    import app as emotion_app
+    from inference_backends import load_backend
+    from model import create_emotion_model, compile_model
+
+    # Random weights behave exactly like trained ones for timing purposes
+    model_path = os.path.join(workdir, 'random_emotionModel.h5')
+    random_model = compile_model(create_emotion_model(num_classes=len(emotion_app.EMOTION_LABELS)))
+    random_model.save(model_path)
+
+    backends = {
+        'predict': load_backend('keras', model_path),
+        'compiled': load_backend('compiled', model_path, buckets=emotion_app.app.config['COMPILED_BUCKETS']),
+        'compiled_xla': load_backend('compiled', model_path, buckets=emotion_app.app.config['COMPILED_BUCKETS'],
+                                     jit_compile=True),
+    }
+
+    # /predict goes through the backend the app is configured to serve
+    configured = emotion_app.app.config['INFERENCE_BACKEND']
+    if configured == 'compiled' and emotion_app.app.config['COMPILED_XLA']:
+        configured = 'compiled_xla'
+    emotion_app.model = backends.get(configured, backends['predict'])
+    emotion_app.MODEL_VERSION = 'benchmark'
+    emotion_app.startup.mark_ready()
+    return emotion_app, backends
+
+
+def run_benchmarks(emotion_app, backends, repeat=30, only=None):
+    """
+    Run the benchmark suite
+
+    Args:
+        emotion_app: Module returned by load_app
+        backends: Backends returned by load_app
+        repeat: Timed samples per benchmark
+        only: Optional set of benchmark names to run
+
+    Returns:
+        Dictionary of benchmark name -> timing dictionary
+    """
+    photo = synthetic_photo()
+    gray = cv2.cvtColor(emotion_app.load_image(photo), cv2.COLOR_BGR2GRAY)
+    boxes = emotion_app.face_detectors.detect(gray)
+    if len(boxes) == 0:
+        raise RuntimeError("The synthetic face was not detected; benchmarks would not be representative")
+    x, y, w, h = boxes[0]
+    roi = gray[y:y + h, x:x + w]
+    filenames = ['photo.jpg', 'scan.PNG', 'notes.txt', 'archive.tar.gz', 'no_extension', 'anim.gif']
+    client = emotion_app.app.test_client()
+
+    def allowed_file():
+        for name in filenames:
+            emotion_app.allowed_file(name)
+
+    def post_predict():
+        response = client.post('/predict', data={
+            'file': (io.BytesIO(photo), 'face.png'),
+            'user_name': 'benchmark',
+        }, content_type='multipart/form-data')
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f"/predict returned {response.status_code}")
+
+    def save_prediction():
+        emotion_app.save_prediction_to_db('benchmark', None, 'Happy', 87.5, 0, (10, 10, 100, 100))
+
+    def save_prediction_to_db():
+        # With the writer running, the call only queues the row; bypass it so the insert and commit are timed
+        writer = emotion_app.prediction_writer
+        emotion_app.prediction_writer = None
+        try:
+            save_prediction()
+        finally:
+            emotion_app.prediction_writer = writer
+
+    benchmarks = [
+        ('allowed_file', allowed_file, {'number': 1000}),
+        ('decode', lambda: emotion_app.load_image(photo), {}),
+        ('haar_detect', lambda: emotion_app.face_detectors.detect(gray), {}),
+        ('preprocess_image', lambda: emotion_app.preprocess_image(photo), {}),
+        ('resize_normalize', lambda: emotion_app.normalize_faces([roi]), {'number': 100}),
+    ]
+    for batch_size in PREDICT_BATCH_SIZES:
+        batch = np.random.rand(batch_size, 48, 48, 1).astype('float32')
+        for prefix, backend in backends.items():
+            benchmarks.append((f'{prefix}_bs{batch_size}',
+                               lambda batch=batch, backend=backend: backend.predict(batch), {}))
+    benchmarks.append(('save_prediction_to_db', save_prediction_to_db, {'number': 100}))
+    if emotion_app.prediction_writer is not None:
+        benchmarks.append(('save_prediction_enqueue', save_prediction, {'number': 100}))
+    benchmarks.append(('predict_endpoint', post_predict, {}))
+
+    results = {}
+    for name, fn, options in benchmarks:
+        if only and name not in only:
+            continue
+        results[name] = measure(fn, repeat=repeat, **options)
+        if '_bs' in name:
+            batch_size = int(name.rsplit('_bs', 1)[1])
+            results[name]['per_image_ms'] = round(results[name]['median_ms'] / batch_size, 4)
+        print(f"  {name:<24} median {results[name]['median_ms']:>10.4f} ms   "
+              f"p95 {results[name]['p95_ms']:>10.4f} ms")
+
+    if emotion_app.prediction_writer is not None:
+        emotion_app.prediction_writer.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare median times against a baseline
+
+    Args:
+        results: Dictionary from run_benchmarks
+        baseline: Previously saved results dictionary
+        threshold: Allowed relative slowdown (0.2 means 20%)
+
+    Returns:
+        List of (name, baseline ms, current ms, relative change) for regressions
+    """
+    regressions = []
+    print(f"\n{'benchmark':<24} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<24} {'-':>12} {current['median_ms']:>10.4f}ms {'new':>9}")
+            continue
+        change = current['median_ms'] / previous['median_ms'] - 1.0 if previous['median_ms'] else 0.0
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{name:<24} {previous['median_ms']:>10.4f}ms {current['median_ms']:>10.4f}ms "
+              f"{change * 100:>+8.1f}%{flag}")
+        if change > threshold:
+            regressions.append((name, previous['median_ms'], current['median_ms'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for every inference-path stage")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=float(os.environ.get('BENCH_THRESHOLD', 0.25)),
+                        help="Allowed median slowdown before failing (default 0.25 = 25%%)")
+    parser.add_argument('--repeat', type=int, default=30, help="Timed samples per benchmark")
+    parser.add_argument('--only', help="Comma-separated benchmark names to run")
+    parser.add_argument('--output', help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+    only = set(args.only.split(',')) if args.only else None
+
+    with tempfile.TemporaryDirectory(prefix='emotion-bench-') as workdir:
+        print("Preparing app with a randomly initialized model...")
+        emotion_app, backends = load_app(workdir)
+        print("Running benchmarks:")
+        results = run_benchmarks(emotion_app, backends, repeat=args.repeat, only=only)
+        os.chdir(REPO_DIR)
+
+    report = {'environment': environment(), 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        if only and os.path.exists(baseline_path):
+            # Partial runs only replace the benchmarks that were run
+            with open(baseline_path) as f:
+                saved = json.load(f)
+            saved['results'].update(results)
+            report['results'] = saved['results']
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Baseline saved to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("\n⚠️  Baseline was recorded on a different environment; comparisons may be noisy")
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f"\n✗ {len(regressions)} benchmark(s) regressed by more than {args.threshold * 100:.0f}%")
+        return 1
+    print(f"\n✓ No regressions beyond {args.threshold * 100:.0f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Bulk Emotion Scoring for Image Directories
+Author: Onipede-22CG031936
+
+Scores every image under a directory with the same preprocessing and model
+as the web app, without going through HTTP. Images are decoded and their
+faces detected in a pool of worker processes, while the main process feeds
+large batches to the model. Results go to the predictions table, a CSV file
+or Parquet part files.
+
+Progress is checkpointed after every chunk, so an interrupted run picks up
+where it stopped when the same command is run again, without duplicating
+rows: db output commits a chunk's rows and its checkpoint in one transaction
+(the checkpoint tables live in the output database), CSV output truncates
+the file back to the last checkpointed size, and Parquet parts are numbered
+by the checkpoint, so a part written after the last checkpoint is replaced.
+
+Usage:
+    python bulk_score.py /archive/images --output db
+    python bulk_score.py /archive/images --output csv --output-path scores.csv --workers 8
+    python bulk_score.py /archive/images --output parquet --output-path scores/ --max-faces 5
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+
+# Set in worker processes by _init_worker
+_worker_app = None
+_worker_max_faces = 1
+
+
+def _init_worker(max_faces):
+    """Import app.py in preprocessing-only mode (no model, no app services) inside each worker process"""
+    global _worker_app, _worker_max_faces
+    os.environ['STARTUP_MODE'] = 'off'
+    os.environ['SERVICES_ENABLED'] = '0'
+    import app as emotion_app
+    _worker_app = emotion_app
+    _worker_max_faces = max_faces
+
+
+def _preprocess_worker(path):
+    """
+    Decode an image and extract its faces (runs in a worker process)
+
+    Returns:
+        Tuple of (path, faces array, boxes, error message or None)
+    """
+    try:
+        faces, boxes = _worker_app.extract_faces(path, max_faces=_worker_max_faces)
+        return path, faces, boxes, None
+    except Exception as e:
+        return path, None, None, str(e) or e.__class__.__name__
+
+
+def find_images(input_dir, allowed_extensions):
+    """
+    List image files under a directory in a stable order
+
+    Args:
+        input_dir: Root directory to scan recursively
+        allowed_extensions: Set of lowercase extensions without the dot
+
+    Returns:
+        Sorted list of file paths
+    """
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in files:
+            if '.' in name and name.rsplit('.', 1)[1].lower() in allowed_extensions:
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths
+
+
+class Checkpoint:
+    """
+    Set of finished image paths stored in SQLite
+
+    Args:
+        path: Checkpoint database file (the output database for db output)
+        prefix: Prefix of the checkpoint table names
+    """
+
+    def __init__(self, path, prefix=''):
+        import database
+        self.conn = database.connect(path)
+        self.done_table = f'{prefix}done'
+        self.meta_table = f'{prefix}meta'
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {self.done_table} (path TEXT PRIMARY KEY)')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {self.meta_table} (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+    def completed(self):
+        """Return the set of paths already scored"""
+        return {row[0] for row in self.conn.execute(f'SELECT path FROM {self.done_table}')}
+
+    def get(self, key, default=None):
+        row = self.conn.execute(f'SELECT value FROM {self.meta_table} WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def record(self, paths, **meta):
+        """Add a finished chunk (and optional metadata) to the caller's open transaction"""
+        self.conn.executemany(f'INSERT OR IGNORE INTO {self.done_table} (path) VALUES (?)', [(p,) for p in paths])
+        self.conn.executemany(f'INSERT OR REPLACE INTO {self.meta_table} (key, value) VALUES (?, ?)',
+                              [(k, str(v)) for k, v in meta.items()])
+
+    def mark(self, paths, **meta):
+        """Record a finished chunk (and optional metadata) in one transaction"""
+        with self.conn:
+            self.record(paths, **meta)
+
+    def close(self):
+        self.conn.close()
+
+
+class ResultWriter:
+    """
+    Writes scored rows to the predictions table, a CSV file or Parquet parts,
+    and checkpoints each chunk so that a resumed run never duplicates rows
+
+    Args:
+        output: 'db', 'csv' or 'parquet'
+        output_path: Database file, CSV file, or directory for Parquet parts
+        checkpoint: Checkpoint of the run (for db output, one opened on output_path)
+    """
+
+    COLUMNS = ['image_filename', 'face_index', 'face_box', 'predicted_emotion', 'confidence_score', 'error']
+
+    def __init__(self, output, output_path, checkpoint):
+        self.output = output
+        self.output_path = output_path
+        self.checkpoint = checkpoint
+        self.part = int(checkpoint.get('parquet_part', 0))
+
+        if output == 'db':
+            # Rows and checkpoint share one connection, so they commit together
+            self.conn = checkpoint.conn
+        elif output == 'csv':
+            new_file = not os.path.exists(output_path)
+            offset = checkpoint.get('csv_offset')
+            if not new_file and offset is not None and os.path.getsize(output_path) > int(offset):
+                # Rows written after the last checkpoint belong to a chunk that is scored again
+                os.truncate(output_path, int(offset))
+            self.file = open(output_path, 'a', newline='')
+            self.csv = csv.writer(self.file)
+            if new_file:
+                self.csv.writerow(self.COLUMNS)
+                checkpoint.mark([], csv_offset=self._sync_file())
+        elif output == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                sys.exit("Parquet output needs pyarrow: pip install pyarrow")
+            os.makedirs(output_path, exist_ok=True)
+        else:
+            raise ValueError(f"Unknown output '{output}'")
+
+    def _sync_file(self):
+        """Make the CSV durable and return its size"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return os.fstat(self.file.fileno()).st_size
+
+    def write(self, rows, user_name, paths):
+        """
+        Persist one chunk of rows and checkpoint its paths
+
+        Args:
+            rows: List of dicts with COLUMNS keys
+            user_name: Name stored in the predictions table (db output)
+            paths: Source paths of the chunk
+        """
+        if self.output == 'db':
+            import database
+            now = datetime.now()
+            with self.conn:
+                self.conn.executemany(database.INSERT_PREDICTION_SQL, [
+                    (user_name, row['image_filename'], row['predicted_emotion'], row['confidence_score'],
+                     now, row['face_index'], row['face_box'], 0)
+                    for row in rows if row['error'] is None
+                ])
+                self.checkpoint.record(paths)
+            return
+
+        if self.output == 'csv':
+            self.csv.writerows([[row[column] for column in self.COLUMNS] for row in rows])
+            self.checkpoint.mark(paths, csv_offset=self._sync_file())
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({column: [row[column] for row in rows] for column in self.COLUMNS})
+        pq.write_table(table, os.path.join(self.output_path, f'part-{self.part:05d}.parquet'))
+        self.part += 1
+        self.checkpoint.mark(paths, parquet_part=self.part)
+
+    def close(self):
+        if self.output == 'csv':
+            self.file.close()
+        self.checkpoint.close()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def score_chunk(preprocessed, input_dir, predict_fn, labels, batch_size):
+    """
+    Run the model over a chunk of preprocessed images in large batches
+
+    Args:
+        preprocessed: List of (path, faces, boxes, error) tuples from the workers
+        input_dir: Root directory, used to store relative file names
+        predict_fn: Callable(batch) -> probabilities
+        labels: Emotion label for each output class
+        batch_size: Faces per forward pass
+
+    Returns:
+        List of output row dicts
+    """
+    import numpy as np
+
+    rows = []
+    pending_faces, pending_meta = [], []
+
+    def flush():
+        if not pending_faces:
+            return
+        probabilities = predict_fn(np.concatenate(pending_faces, axis=0))
+        for (name, face_index, box), probs in zip(pending_meta, probabilities):
+            index = int(np.argmax(probs))
+            rows.append({
+                'image_filename': name,
+                'face_index': face_index,
+                'face_box': ','.join(str(v) for v in box) if box else None,
+                'predicted_emotion': labels[index],
+                'confidence_score': float(probs[index]) * 100,
+                'error': None,
+            })
+        pending_faces.clear()
+        pending_meta.clear()
+
+    for path, faces, boxes, error in preprocessed:
+        name = os.path.relpath(path, input_dir)
+        if error is not None:
+            rows.append({'image_filename': name, 'face_index': 0, 'face_box': None,
+                         'predicted_emotion': None, 'confidence_score': None, 'error': error})
+            continue
+        pending_faces.append(faces)
+        pending_meta.extend((name, face_index, box) for face_index, box in enumerate(boxes))
+        if len(pending_meta) >= batch_size:
+            flush()
+    flush()
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk emotion scoring of an image directory")
+    parser.add_argument('input_dir', help="Directory of images (scanned recursively)")
+    parser.add_argument('--output', choices=['db', 'csv', 'parquet'], default='db',
+                        help="Where results go (default: predictions table)")
+    parser.add_argument('--output-path', help="Database file, CSV file or Parquet directory")
+    parser.add_argument('--checkpoint', default='bulk_score_checkpoint.db',
+                        help="Progress file for resuming csv/parquet output (db output keeps its "
+                             "progress in the output database)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Preprocessing processes")
+    parser.add_argument('--batch-size', type=int, default=256, help="Faces per forward pass")
+    parser.add_argument('--chunk-size', type=int, default=2048, help="Images per checkpointed chunk")
+    parser.add_argument('--max-faces', type=int, default=1, help="Faces scored per image")
+    parser.add_argument('--user-name', default='bulk', help="user_name stored with db output")
+    args = parser.parse_args()
+
+    # Workers are spawned before TensorFlow is loaded in this process
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(args.workers, initializer=_init_worker, initargs=(args.max_faces,))
+
+    print("Loading model...")
+    os.environ['STARTUP_MODE'] = 'blocking'
+    os.environ['BATCHING_ENABLED'] = '0'
+    os.environ['CACHE_ENABLED'] = '0'
+    # Only the model and helpers are needed, not the web app's database, uploads and writers
+    os.environ['SERVICES_ENABLED'] = '0'
+    import app as emotion_app
+    if emotion_app.model is None:
+        sys.exit("Model could not be loaded")
+
+    output_path = args.output_path or {
+        'db': emotion_app.DATABASE_PATH, 'csv': 'bulk_scores.csv', 'parquet': 'bulk_scores'
+    }[args.output]
+    if args.output == 'db':
+        emotion_app.init_database(output_path)
+        checkpoint = Checkpoint(output_path, prefix='bulk_score_')
+    else:
+        checkpoint = Checkpoint(args.checkpoint)
+    writer = ResultWriter(args.output, output_path, checkpoint)
+
+    all_paths = find_images(args.input_dir, emotion_app.ALLOWED_EXTENSIONS)
+    done = checkpoint.completed()
+    paths = [p for p in all_paths if p not in done]
+    print(f"{len(all_paths)} images found, {len(all_paths) - len(paths)} already scored, {len(paths)} to go")
+
+    chunks = list(_chunks(paths, args.chunk_size))
+    start = time.perf_counter()
+    scored = 0
+    try:
+        # Preprocessing of the next chunk overlaps with inference on the current one
+        next_result = pool.map_async(_preprocess_worker, chunks[0], chunksize=16) if chunks else None
+        for index, chunk in enumerate(chunks):
+            preprocessed = next_result.get()
+            if index + 1 < len(chunks):
+                next_result = pool.map_async(_preprocess_worker, chunks[index + 1], chunksize=16)
+
+            rows = score_chunk(preprocessed, args.input_dir, emotion_app.run_model,
+                               emotion_app.EMOTION_LABELS, args.batch_size)
+            writer.write(rows, args.user_name, chunk)
+
+            scored += len(chunk)
+            elapsed = time.perf_counter() - start
+            errors = sum(1 for row in rows if row['error'] is not None)
+            print(f"[{scored}/{len(paths)}] {scored / elapsed:.1f} images/sec "
+                  f"({errors} unreadable in this chunk)")
+    except KeyboardInterrupt:
+        print("\nInterrupted - run the same command again to resume")
+    finally:
+        pool.terminate()
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    if scored:
+        print(f"✓ Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,446 @@
+"""
+SQLite Persistence Layer
+Author: Onipede-22CG031936
+
+Opens long-lived SQLite connections in WAL mode with tuned pragmas and
+provides a background writer that group-commits prediction rows, so the
+request path never waits for an fsync or for another worker's write lock.
+"""
+
+import atexit
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# Pragmas applied to every connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',      # Readers don't block the writer and vice versa
+    'PRAGMA synchronous=NORMAL',    # fsync at checkpoints only (safe with WAL)
+    'PRAGMA busy_timeout=5000',     # Wait for other workers' locks instead of failing
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',     # 16MB page cache
+)
+
+# image_filename is an upload store key when image_stored is 1, otherwise NULL (upload not kept)
+# or the path of an image outside the store (bulk_score.py)
+INSERT_PREDICTION_SQL = '''
+    INSERT INTO predictions (user_name, image_filename, predicted_emotion, confidence_score, timestamp,
+                             face_index, face_box, image_stored)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def connect(db_path, check_same_thread=True):
+    """
+    Open a SQLite connection with the standard pragmas applied
+
+    Args:
+        db_path: Path of the SQLite database file
+        check_same_thread: Passed to sqlite3.connect
+
+    Returns:
+        sqlite3.Connection
+    """
+    conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=check_same_thread)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Indexes backing the history queries (keyset pagination on id)
+INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user_name, id)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_emotion ON predictions (predicted_emotion, id)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_user_emotion ON predictions (user_name, predicted_emotion, id)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)',
+    # Eviction marks the predictions that reference a stored upload
+    'CREATE INDEX IF NOT EXISTS idx_predictions_image ON predictions (image_filename)',
+)
+
+def allow_null_image_filename(conn):
+    """
+    Drop the NOT NULL constraint of predictions.image_filename in older databases
+
+    SQLite cannot change a column constraint in place, so the table is rebuilt
+    from its own CREATE statement. Its indexes and rollup triggers go with the
+    old table; run init_analytics_schema afterwards to recreate them.
+
+    Args:
+        conn: Open sqlite3 connection (not inside a transaction)
+    """
+    # IMMEDIATE: workers starting together wait here instead of migrating twice
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'predictions'").fetchone()[0]
+        relaxed = sql.replace('image_filename TEXT NOT NULL', 'image_filename TEXT', 1)
+        if relaxed != sql:
+            conn.execute('ALTER TABLE predictions RENAME TO predictions_migrating')
+            conn.execute(relaxed)
+            conn.execute('INSERT INTO predictions SELECT * FROM predictions_migrating')
+            conn.execute('DROP TABLE predictions_migrating')
+            print("Migrated predictions.image_filename to allow NULL")
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+# Time bucket formats of the rollup tables
+ROLLUP_GRANULARITIES = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+}
+
+
+def _rollup_schema(granularity, bucket_format):
+    """SQL for one rollup table plus the triggers keeping it in sync with predictions"""
+    table = f'emotion_rollup_{granularity}'
+    bucket = f"strftime('{bucket_format}', {{row}}.timestamp)"
+    return (
+        f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_name TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            predicted_emotion TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            confidence_sum REAL NOT NULL,
+            PRIMARY KEY (user_name, bucket, predicted_emotion)
+        ) WITHOUT ROWID
+        ''',
+        f'CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON predictions
+        BEGIN
+            INSERT INTO {table} (user_name, bucket, predicted_emotion, count, confidence_sum)
+            VALUES (NEW.user_name, {bucket.format(row='NEW')}, NEW.predicted_emotion, 1, NEW.confidence_score)
+            ON CONFLICT (user_name, bucket, predicted_emotion) DO UPDATE SET
+                count = count + 1,
+                confidence_sum = confidence_sum + excluded.confidence_sum;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON predictions
+        BEGIN
+            UPDATE {table}
+            SET count = count - 1, confidence_sum = confidence_sum - OLD.confidence_score
+            WHERE user_name = OLD.user_name
+              AND bucket = {bucket.format(row='OLD')}
+              AND predicted_emotion = OLD.predicted_emotion;
+        END
+        ''',
+    ), table, bucket.format(row='predictions')
+
+
+def init_analytics_schema(conn):
+    """
+    Create history indexes and the incrementally maintained rollup tables
+
+    Rollups are updated by triggers on every insert into predictions, so
+    analytics queries never scan the predictions table. Existing rows are
+    folded into a rollup once, when the rollup table is first created.
+
+    Args:
+        conn: Open sqlite3 connection
+    """
+    for statement in INDEX_SQL:
+        conn.execute(statement)
+
+    for granularity, bucket_format in ROLLUP_GRANULARITIES.items():
+        statements, table, bucket = _rollup_schema(granularity, bucket_format)
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        for statement in statements:
+            conn.execute(statement)
+        if not exists:
+            # One-time backfill of rows logged before the rollup existed
+            conn.execute(f'''
+                INSERT INTO {table} (user_name, bucket, predicted_emotion, count, confidence_sum)
+                SELECT user_name, {bucket}, predicted_emotion, COUNT(*), SUM(confidence_score)
+                FROM predictions
+                GROUP BY 1, 2, 3
+            ''')
+
+
+def query_history(conn, user_name=None, emotion=None, start=None, end=None, before_id=None, limit=50):
+    """
+    Page through predictions, newest first, using keyset pagination
+
+    Args:
+        conn: Open sqlite3 connection
+        user_name: Only rows for this user
+        emotion: Only rows with this predicted emotion
+        start: Only rows with timestamp >= start ('YYYY-MM-DD[ HH:MM:SS]')
+        end: Only rows with timestamp < end
+        before_id: Cursor from the previous page (rows with a smaller id)
+        limit: Page size
+
+    Returns:
+        Tuple of (list of row dicts, next cursor or None)
+    """
+    clauses = []
+    params = []
+    for column, op, value in (('user_name', '=', user_name), ('predicted_emotion', '=', emotion),
+                              ('timestamp', '>=', start), ('timestamp', '<', end),
+                              ('id', '<', before_id)):
+        if value is not None:
+            clauses.append(f'{column} {op} ?')
+            params.append(value)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(f'''
+        SELECT id, user_name, image_filename, predicted_emotion, confidence_score, timestamp,
+               face_index, face_box, image_evicted, image_stored
+        FROM predictions
+        {where}
+        ORDER BY id DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+    columns = ('id', 'user_name', 'image_filename', 'predicted_emotion', 'confidence_score',
+               'timestamp', 'face_index', 'face_box', 'image_evicted', 'image_stored')
+    items = [dict(zip(columns, row)) for row in rows[:limit]]
+    next_cursor = items[-1]['id'] if len(rows) > limit else None
+    return items, next_cursor
+
+
+def query_distribution(conn, granularity='day', user_name=None, start=None, end=None, by_user=False):
+    """
+    Emotion distribution per time bucket, read from the rollup tables
+
+    Args:
+        conn: Open sqlite3 connection
+        granularity: 'hour' or 'day'
+        user_name: Only this user's predictions
+        start: First bucket to include (same format as the bucket)
+        end: Buckets strictly before this value
+        by_user: Keep users separate instead of summing across them
+
+    Returns:
+        List of dicts with 'bucket', optional 'user_name', 'total', 'counts'
+        and 'mean_confidence' per emotion
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {sorted(ROLLUP_GRANULARITIES)}")
+
+    clauses = ['count > 0']
+    params = []
+    for column, op, value in (('user_name', '=', user_name), ('bucket', '>=', start), ('bucket', '<', end)):
+        if value is not None:
+            clauses.append(f'{column} {op} ?')
+            params.append(value)
+
+    group_user = 'user_name' if by_user else "''"
+    rows = conn.execute(f'''
+        SELECT bucket, {group_user}, predicted_emotion, SUM(count), SUM(confidence_sum)
+        FROM emotion_rollup_{granularity}
+        WHERE {' AND '.join(clauses)}
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2
+    ''', params).fetchall()
+
+    buckets = {}
+    for bucket, user, emotion, count, confidence_sum in rows:
+        entry = buckets.get((bucket, user))
+        if entry is None:
+            entry = buckets[(bucket, user)] = {'bucket': bucket, 'total': 0, 'counts': {}, 'mean_confidence': {}}
+            if by_user:
+                entry['user_name'] = user
+        entry['total'] += count
+        entry['counts'][emotion] = count
+        entry['mean_confidence'][emotion] = confidence_sum / count
+
+    return list(buckets.values())
+
+
+_thread_local = threading.local()
+
+
+def thread_connection(db_path):
+    """
+    Return a long-lived connection owned by the calling thread
+
+    Args:
+        db_path: Path of the SQLite database file
+
+    Returns:
+        sqlite3.Connection reused for every call from this thread
+    """
+    connections = getattr(_thread_local, 'connections', None)
+    if connections is None:
+        connections = _thread_local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect(db_path)
+    return conn
+
+
+class PredictionWriter:
+    """
+    Background thread that inserts prediction rows with group commits
+
+    Rows are queued by request threads and written with executemany. A commit
+    happens when max_batch rows are waiting or the oldest row has waited
+    max_delay_ms, which bounds how long an accepted row stays unwritten.
+    Other tables (e.g. the prediction cache) can queue their own statements.
+    They are committed in a separate transaction, so a failing cache
+    statement never rolls back prediction rows.
+
+    Args:
+        db_path: Path of the SQLite database file
+        max_batch: Maximum rows per commit
+        max_delay_ms: Maximum durability lag of a queued row
+        max_pending: Queue bound; enqueue blocks (backpressure) when full
+    """
+
+    def __init__(self, db_path, max_batch=500, max_delay_ms=200.0, max_pending=10000):
+        self.db_path = db_path
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._commit_times = deque(maxlen=1000)
+        self._rows_written = 0
+        self._commits = 0
+        self._failed_rows = 0
+        self._max_lag = 0.0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name='prediction-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, row, timeout=1.0, sql=INSERT_PREDICTION_SQL):
+        """
+        Queue a row for insertion
+
+        Args:
+            row: Tuple matching the parameters of sql
+            timeout: Seconds to wait for queue space
+            sql: Statement to run for the row (a prediction insert by default)
+
+        Returns:
+            Boolean indicating whether the row was accepted
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue.put((time.monotonic(), sql, row), timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def _collect(self):
+        """Block for the first row, then gather more until batch size or delay"""
+        first = self._queue.get()
+        if first is None:
+            self._queue.task_done()
+            return None, True
+
+        batch = [first]
+        deadline = first[0] + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.task_done()
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        """Worker loop: one connection, one transaction per batch"""
+        conn = connect(self.db_path, check_same_thread=False)
+        try:
+            while True:
+                batch, stopping = self._collect()
+                if batch:
+                    self._write(conn, batch)
+                if stopping:
+                    break
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        """Insert a batch: prediction rows in one transaction, other statements in another"""
+        predictions = [item for item in batch if item[1] == INSERT_PREDICTION_SQL]
+        others = [item for item in batch if item[1] != INSERT_PREDICTION_SQL]
+        try:
+            if predictions:
+                self._commit(conn, predictions)
+            if others:
+                self._commit(conn, others)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _commit(self, conn, items):
+        """Run queued statements in a single transaction (all or none of them)"""
+        start = time.perf_counter()
+        try:
+            with conn:
+                # Consecutive rows of the same statement go through one executemany
+                for sql, group in itertools.groupby(items, key=lambda item: item[1]):
+                    conn.executemany(sql, [row for _, _, row in group])
+        except sqlite3.Error as e:
+            print(f"Error saving to database: {e}")
+            with self._lock:
+                self._failed_rows += len(items)
+            return
+
+        elapsed = time.perf_counter() - start
+        lag = time.monotonic() - items[0][0]
+        with self._lock:
+            self._rows_written += len(items)
+            self._commits += 1
+            self._commit_times.append(elapsed)
+            self._max_lag = max(self._max_lag, lag)
+        print(f"✓ {len(items)} row(s) saved to database ({elapsed * 1000:.1f} ms commit)")
+
+    def flush(self):
+        """Block until every queued row has been committed (returns at once after close)"""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self, timeout=10.0):
+        """Commit outstanding rows and stop the writer thread"""
+        self._closed = True
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def stats(self):
+        """
+        Snapshot of writer activity
+
+        Returns:
+            Dictionary with pending rows, commit counts and commit time percentiles (ms)
+        """
+        with self._lock:
+            times = np.asarray(self._commit_times) * 1000.0
+            stats = {
+                'pending': self._queue.qsize(),
+                'rows_written': self._rows_written,
+                'failed_rows': self._failed_rows,
+                'commits': self._commits,
+                'mean_rows_per_commit': self._rows_written / self._commits if self._commits else 0.0,
+                'max_lag_ms': self._max_lag * 1000.0,
+                'max_delay_ms': self.max_delay * 1000.0,
+            }
+        if len(times):
+            p50, p99 = np.percentile(times, [50, 99])
+            stats['commit_ms'] = {'p50': float(p50), 'p99': float(p99), 'max': float(times.max())}
+        else:
+            stats['commit_ms'] = {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        return stats
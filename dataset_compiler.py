@@ -0,0 +1,312 @@
+"""
+Compiled Training Dataset
+Author: Onipede-22CG031936
+
+Packs a class-folder image tree (data/train, data/validation, data/test) into
+memory-mappable files, so training and evaluation no longer decode and resize
+every image on each run. Each build of a split is a directory with:
+
+    images.npy      uint8 array of shape (N, 48, 48, 1)
+    labels.npy      uint8 array of shape (N,) with class indices
+    manifest.json   class names, settings, the size/mtime of every source file
+                    and the files skipped as unreadable
+
+Builds live in build-<id> directories inside the split directory, and a
+CURRENT file names the one to read. A rebuild writes a new build directory and
+then replaces CURRENT in one atomic rename, so readers always get arrays and a
+manifest from the same build. The previous build is kept for readers that
+opened it just before the swap; older ones are deleted.
+
+Images go through the same decoding and resizing as app.py. With --face-crop,
+the largest detected face is cropped first, exactly like preprocess_image at
+inference time. Rebuilds are incremental: rows of unchanged files are copied
+from the previous build, files skipped as unreadable stay skipped until they
+change, and only new or modified files are processed again.
+
+Usage:
+    python dataset_compiler.py data data_compiled
+    python dataset_compiler.py data data_compiled --face-crop --workers 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+IMAGE_SHAPE = (48, 48, 1)
+SPLITS = ('train', 'validation', 'test')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+# Set in worker processes by _init_worker
+_worker_app = None
+_worker_face_crop = False
+
+
+def _init_worker(face_crop):
+    """Import app.py in preprocessing-only mode (no model, no app services) inside each worker process"""
+    global _worker_app, _worker_face_crop
+    os.environ['STARTUP_MODE'] = 'off'
+    os.environ['SERVICES_ENABLED'] = '0'
+    import app as emotion_app
+    _worker_app = emotion_app
+    _worker_face_crop = face_crop
+
+
+def _preprocess_worker(path):
+    """
+    Turn one image file into a 48x48 uint8 array (runs in a worker process)
+
+    Returns:
+        Tuple of (path, uint8 array or None, error message or None)
+    """
+    try:
+        if _worker_face_crop:
+            faces, _ = _worker_app.extract_faces(path, max_faces=1)
+        else:
+            img = _worker_app.load_image(path)
+            gray = img if img.ndim == 2 else _worker_app.cv2.cvtColor(img, _worker_app.cv2.COLOR_BGR2GRAY)
+            faces = _worker_app.normalize_faces([gray])
+        # normalize_faces divides uint8 pixels by 255, so this round trip is exact
+        return path, np.round(faces[0] * 255.0).astype(np.uint8), None
+    except Exception as e:
+        return path, None, str(e) or e.__class__.__name__
+
+
+def scan_split(source_dir):
+    """
+    List the class folders and image files of one split
+
+    Args:
+        source_dir: Directory with one subdirectory per class
+
+    Returns:
+        Tuple of (sorted class names, list of [relative path, size, mtime_ns, label])
+    """
+    class_names = sorted(d for d in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, d)))
+    files = []
+    for label, class_name in enumerate(class_names):
+        for root, dirs, names in os.walk(os.path.join(source_dir, class_name)):
+            dirs.sort()
+            for name in sorted(names):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append([os.path.relpath(path, source_dir), stat.st_size, stat.st_mtime_ns, label])
+    return class_names, files
+
+
+def current_build(split_dir):
+    """Build directory that CURRENT points to (the split directory itself for pre-CURRENT builds)"""
+    try:
+        with open(os.path.join(split_dir, 'CURRENT')) as f:
+            return os.path.join(split_dir, f.read().strip())
+    except FileNotFoundError:
+        return split_dir
+
+
+def _read_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_manifest(split_dir):
+    """Read a compiled split's current manifest, or None if it has not been built"""
+    return _read_manifest(current_build(split_dir))
+
+
+def load_compiled(split_dir):
+    """
+    Open a compiled split without reading it into memory
+
+    Args:
+        split_dir: Directory written by compile_split
+
+    Returns:
+        Tuple of (memory-mapped images, labels, manifest)
+
+    Raises:
+        FileNotFoundError: The split has not been compiled
+        ValueError: The arrays do not match the manifest
+    """
+    build_dir = current_build(split_dir)
+    manifest = _read_manifest(build_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No compiled dataset in '{split_dir}' (run dataset_compiler.py first)")
+    images = np.load(os.path.join(build_dir, 'images.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(build_dir, 'labels.npy'), mmap_mode='r')
+    if not len(images) == len(labels) == manifest['count'] == len(manifest['files']):
+        raise ValueError(f"Compiled dataset in '{build_dir}' is inconsistent "
+                         f"({len(images)} images, {len(labels)} labels, manifest lists {manifest['count']})")
+    return images, labels, manifest
+
+
+def compile_split(source_dir, split_dir, face_crop=False, workers=None):
+    """
+    Build or incrementally update one compiled split
+
+    Args:
+        source_dir: Class-folder directory of source images
+        split_dir: Output directory for the split's builds and its CURRENT pointer
+        face_crop: Crop the largest detected face before resizing
+        workers: Preprocessing processes (defaults to the CPU count)
+
+    Returns:
+        Dictionary with counts of total, reused, processed and skipped images
+    """
+    class_names, files = scan_split(source_dir)
+    old_build = current_build(split_dir)
+    old = _read_manifest(old_build)
+    if old is not None and (old.get('format_version') != FORMAT_VERSION or old.get('face_crop') != face_crop):
+        print(f"  Settings changed, rebuilding '{split_dir}' from scratch")
+        old = None
+
+    # Rows of the previous build, keyed by source file identity
+    old_rows = {}
+    old_skipped = set()
+    if old is not None:
+        old_rows = {(path, size, mtime): row for row, (path, size, mtime, _) in enumerate(old['files'])}
+        old_skipped = {tuple(entry) for entry in old.get('skipped', [])}
+        previous = sorted(list(old_rows) + list(old_skipped))
+        if old['class_names'] == class_names and sorted(tuple(f[:3]) for f in files) == previous:
+            return {'total': len(old['files']), 'reused': len(old['files']), 'processed': 0,
+                    'skipped': len(old_skipped), 'up_to_date': True}
+
+    # Files skipped last time are only retried once they change
+    todo = [f for f in files if tuple(f[:3]) not in old_rows and tuple(f[:3]) not in old_skipped]
+    processed = {}
+    if todo:
+        # Workers are only started when something needs processing
+        pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker, initargs=(face_crop,))
+        try:
+            paths = [os.path.join(source_dir, f[0]) for f in todo]
+            for path, image, error in pool.imap(_preprocess_worker, paths, chunksize=64):
+                processed[os.path.relpath(path, source_dir)] = (image, error)
+        finally:
+            pool.terminate()
+
+    kept, skipped = [], []
+    for entry in files:
+        key = tuple(entry[:3])
+        if key in old_rows:
+            kept.append(entry)
+        elif key in old_skipped:
+            skipped.append(entry[:3])
+        elif processed[entry[0]][1] is None:
+            kept.append(entry)
+        else:
+            skipped.append(entry[:3])
+            print(f"  Skipping unreadable file {entry[0]}: {processed[entry[0]][1]}")
+
+    old_images = np.load(os.path.join(old_build, 'images.npy'), mmap_mode='r') if old_rows else None
+
+    # Everything goes into a fresh build directory; CURRENT is switched to it at the end
+    build_name = f'build-{time.time_ns()}'
+    build_dir = os.path.join(split_dir, build_name)
+    os.makedirs(build_dir)
+    images = np.lib.format.open_memmap(os.path.join(build_dir, 'images.npy'), mode='w+', dtype=np.uint8,
+                                       shape=(len(kept),) + IMAGE_SHAPE)
+    labels = np.empty(len(kept), dtype=np.uint8)
+    reused = 0
+    for row, entry in enumerate(kept):
+        key = tuple(entry[:3])
+        if key in old_rows:
+            images[row] = old_images[old_rows[key]]
+            reused += 1
+        else:
+            images[row] = processed[entry[0]][0]
+        labels[row] = entry[3]
+    images.flush()
+    del images, old_images
+
+    np.save(os.path.join(build_dir, 'labels.npy'), labels)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'source_dir': os.path.abspath(source_dir),
+        'face_crop': face_crop,
+        'image_shape': list(IMAGE_SHAPE),
+        'class_names': class_names,
+        'class_counts': {name: int((labels == label).sum()) for label, name in enumerate(class_names)},
+        'count': len(kept),
+        'files': kept,
+        'skipped': skipped,
+    }
+    with open(os.path.join(build_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    current_tmp = os.path.join(split_dir, 'CURRENT.tmp')
+    with open(current_tmp, 'w') as f:
+        f.write(build_name)
+    os.replace(current_tmp, os.path.join(split_dir, 'CURRENT'))
+    _remove_old_builds(split_dir, keep=(build_dir, old_build))
+
+    return {'total': len(kept), 'reused': reused, 'processed': len(todo),
+            'skipped': len(skipped), 'up_to_date': False}
+
+
+def _remove_old_builds(split_dir, keep):
+    """Delete builds other than the current and the previous one"""
+    keep = {os.path.abspath(path) for path in keep}
+    for name in os.listdir(split_dir):
+        path = os.path.join(split_dir, name)
+        if name.startswith('build-') and os.path.abspath(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+    if os.path.abspath(split_dir) not in keep:
+        # Files of a build made before CURRENT existed
+        for name in ('images.npy', 'labels.npy', 'manifest.json'):
+            try:
+                os.remove(os.path.join(split_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def compile_dataset(data_dir, output_dir, face_crop=False, workers=None, splits=SPLITS):
+    """
+    Compile every split found under a data directory
+
+    Args:
+        data_dir: Directory containing train/validation/test class folders
+        output_dir: Directory that receives one compiled directory per split
+        face_crop: Crop the largest detected face before resizing
+        workers: Preprocessing processes (defaults to the CPU count)
+        splits: Split names to look for
+
+    Returns:
+        Dictionary of split name -> compile_split result
+    """
+    results = {}
+    for split in splits:
+        source_dir = os.path.join(data_dir, split)
+        if not os.path.isdir(source_dir):
+            continue
+        print(f"Compiling '{source_dir}'...")
+        result = compile_split(source_dir, os.path.join(output_dir, split), face_crop, workers)
+        if result['up_to_date']:
+            print(f"  Up to date ({result['total']} images)")
+        else:
+            print(f"  {result['total']} images: {result['reused']} reused, "
+                  f"{result['processed']} processed, {result['skipped']} skipped")
+        results[split] = result
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile class-folder image trees into memory-mapped arrays")
+    parser.add_argument('data_dir', help="Directory containing train/validation/test class folders")
+    parser.add_argument('output_dir', help="Directory for the compiled splits")
+    parser.add_argument('--face-crop', action='store_true', help="Crop the largest face like the web app does")
+    parser.add_argument('--workers', type=int, default=None, help="Preprocessing processes")
+    args = parser.parse_args()
+
+    compile_dataset(args.data_dir, args.output_dir, face_crop=args.face_crop, workers=args.workers)
@@ -0,0 +1,164 @@
+"""
+Face Detector Pool
+Author: Onipede-22CG031936
+
+Haar cascade classifiers are expensive to build (the XML file is parsed from
+disk each time) and are not safe to share between threads. This module loads
+each detector once per worker process and lends instances out to request
+threads through a thread-safe pool.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+
+# Default Haar cascade used by preprocess_image
+FRONTAL_FACE_CASCADE = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+
+class DetectorPool:
+    """
+    Thread-safe pool of Haar cascade face detectors
+
+    Detectors are created lazily, up to max_size instances, and reused across
+    requests. A thread holds a detector exclusively while it runs detection.
+
+    Args:
+        cascade_path: Path to the Haar cascade XML file
+        max_size: Maximum number of detector instances in this process
+        scale_factor: detectMultiScale scaleFactor
+        min_neighbors: detectMultiScale minNeighbors
+        min_size: detectMultiScale minSize as (width, height)
+    """
+
+    def __init__(self, cascade_path=FRONTAL_FACE_CASCADE, max_size=8,
+                 scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
+        self.cascade_path = cascade_path
+        self.max_size = max(1, int(max_size))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = tuple(min_size)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {
+            'acquisitions': 0,
+            'detections': 0,
+            'acquire_time': 0.0,
+            'detect_time': 0.0,
+            'load_time': 0.0,
+        }
+
+    def _create_detector(self):
+        """Load a new cascade from disk (only happens max_size times per process)"""
+        start = time.perf_counter()
+        detector = cv2.CascadeClassifier(self.cascade_path)
+        if detector.empty():
+            raise RuntimeError(f"Could not load Haar cascade: {self.cascade_path}")
+        with self._lock:
+            self._stats['load_time'] += time.perf_counter() - start
+        return detector
+
+    @contextmanager
+    def acquire(self):
+        """
+        Borrow a detector for the duration of a with-block
+
+        Yields:
+            cv2.CascadeClassifier owned exclusively by the calling thread
+        """
+        detector = None
+        try:
+            detector = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    detector = self._create_detector()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                # Pool exhausted: wait for another thread to return one
+                detector = self._idle.get()
+
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
+
+    def detect(self, gray, timings=None):
+        """
+        Detect faces in a grayscale image
+
+        Args:
+            gray: Grayscale image as a 2D uint8 array
+            timings: Optional dict that receives 'detector_acquire_ms' and 'detect_ms'
+
+        Returns:
+            Array of (x, y, w, h) face rectangles (may be empty)
+        """
+        start = time.perf_counter()
+        with self.acquire() as detector:
+            acquired = time.perf_counter()
+            faces = detector.detectMultiScale(
+                gray,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.min_neighbors,
+                minSize=self.min_size
+            )
+        finished = time.perf_counter()
+
+        acquire_time = acquired - start
+        detect_time = finished - acquired
+        with self._lock:
+            self._stats['acquisitions'] += 1
+            self._stats['detections'] += 1
+            self._stats['acquire_time'] += acquire_time
+            self._stats['detect_time'] += detect_time
+
+        if timings is not None:
+            timings['detector_acquire_ms'] = acquire_time * 1000.0
+            timings['detect_ms'] = detect_time * 1000.0
+
+        return faces
+
+    def warm(self, count=1):
+        """Load detectors up front so the first requests do not pay for it"""
+        with self._lock:
+            count = min(count, self.max_size - self._created)
+            self._created += max(0, count)
+        for _ in range(max(0, count)):
+            self._idle.put(self._create_detector())
+
+    def stats(self):
+        """
+        Snapshot of pool usage and cumulative timings
+
+        Returns:
+            Dictionary with instance counts and mean acquire/detect times (ms)
+        """
+        with self._lock:
+            detections = self._stats['detections']
+            return {
+                'cascade': self.cascade_path,
+                'scale_factor': self.scale_factor,
+                'min_neighbors': self.min_neighbors,
+                'min_size': list(self.min_size),
+                'max_size': self.max_size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'detections': detections,
+                'load_time_ms': self._stats['load_time'] * 1000.0,
+                'mean_acquire_ms': self._stats['acquire_time'] / detections * 1000.0 if detections else 0.0,
+                'mean_detect_ms': self._stats['detect_time'] / detections * 1000.0 if detections else 0.0,
+            }
@@ -0,0 +1,403 @@
+"""
+Distributed Training Across Processes and Hosts
+Author: Onipede-22CG031936
+
+Trains the emotion model with multi-worker data parallelism
+(tf.distribute.MultiWorkerMirroredStrategy). Every worker process holds a
+full replica of the model and trains on its own shard of the data. After
+each step the gradients are all-reduced, so all replicas stay identical.
+Workers can be several processes on one machine (each pinned to its own
+cores) or processes on several hosts.
+
+How training is scaled:
+    - The batch size is per worker; the global batch is batch size x workers.
+    - The learning rate is scaled by the number of workers (linear scaling
+      rule) and warmed up from the single-worker rate over the first epochs.
+    - Each worker keeps only its shard of the file list (or compiled rows)
+      before decoding, so no image is decoded twice per epoch.
+
+Callbacks: create_callbacks() is used unchanged. EarlyStopping and
+ReduceLROnPlateau run on every worker. They see the same all-reduced
+metrics, so every worker stops and decays the learning rate at the same
+epoch. Only the chief logs, prints throughput and writes the checkpoint and
+the final model. The other workers save to a temporary directory that is
+deleted afterwards, because saving reads synchronized variables and every
+worker has to take part.
+
+Only the 'tfdata' and 'compiled' input pipelines are supported (an
+ImageDataGenerator cannot be sharded).
+
+Usage:
+    # 4 processes on this machine
+    python distributed_train.py --local-workers 4 --train-dir data/train --val-dir data/validation
+
+    # 2 hosts: run on each host with its own --task-index (0 is the chief)
+    python distributed_train.py --hosts 10.0.0.1:23456,10.0.0.2:23456 --task-index 0 \\
+        --train-dir data/train --val-dir data/validation
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import tensorflow as tf
+from tensorflow import keras
+
+import model as emotion_model
+
+
+# ============================================================================
+# CLUSTER CONFIGURATION
+# ============================================================================
+
+def cluster_config(hosts, task_index):
+    """
+    Build a TF_CONFIG value for one worker
+
+    Args:
+        hosts: List of 'host:port' addresses, one per worker
+        task_index: This worker's position in hosts (0 is the chief)
+
+    Returns:
+        TF_CONFIG JSON string
+    """
+    return json.dumps({
+        'cluster': {'worker': list(hosts)},
+        'task': {'type': 'worker', 'index': int(task_index)},
+    })
+
+
+def worker_info():
+    """
+    Read this process's place in the cluster from TF_CONFIG
+
+    Returns:
+        Tuple of (number of workers, task index, is chief)
+    """
+    config = json.loads(os.environ.get('TF_CONFIG') or '{}')
+    workers = config.get('cluster', {}).get('worker', [])
+    task = config.get('task', {})
+    index = int(task.get('index', 0))
+    # Without a separate 'chief' task, worker 0 acts as the chief
+    is_chief = task.get('type', 'worker') == 'chief' or (task.get('type', 'worker') == 'worker' and index == 0)
+    return max(1, len(workers)), index, is_chief
+
+
+def _free_ports(count):
+    """Reserve count free localhost ports (released just before the workers bind them)"""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('localhost', 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def split_cores(num_workers):
+    """
+    Split the cores this process may use into one disjoint set per worker
+
+    Args:
+        num_workers: Number of processes to spread over the cores
+
+    Returns:
+        List of core index lists, one per worker
+    """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cores) // num_workers)
+    if per_worker * num_workers > len(cores):
+        # Fewer cores than workers: workers share cores round-robin
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+    return [cores[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+
+
+def pin_to_cores(cpus):
+    """
+    Restrict this process, and TensorFlow's thread pools, to the given cores
+
+    Must run before TensorFlow executes its first operation.
+
+    Args:
+        cpus: List of core indices
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    tf.config.threading.set_intra_op_parallelism_threads(len(cpus))
+    tf.config.threading.set_inter_op_parallelism_threads(min(2, len(cpus)))
+
+
+# ============================================================================
+# DISTRIBUTED TRAINING
+# ============================================================================
+
+class LearningRateWarmup(keras.callbacks.Callback):
+    """
+    Ramp the learning rate linearly from the single-worker rate to the
+    scaled rate over the first warmup_steps batches, then leave it to
+    ReduceLROnPlateau
+    """
+
+    def __init__(self, base_learning_rate, target_learning_rate, warmup_steps):
+        super().__init__()
+        self.base_learning_rate = base_learning_rate
+        self.target_learning_rate = target_learning_rate
+        self.warmup_steps = warmup_steps
+
+    def on_train_batch_begin(self, batch, logs=None):
+        # The optimizer's step counter also survives a BackupAndRestore resume
+        step = int(self.model.optimizer.iterations.numpy())
+        if step > self.warmup_steps:
+            return
+        progress = step / self.warmup_steps if self.warmup_steps else 1.0
+        learning_rate = self.base_learning_rate + (self.target_learning_rate - self.base_learning_rate) * progress
+        keras.backend.set_value(self.model.optimizer.learning_rate, learning_rate)
+
+
+def _split_info(split_dir, pipeline, class_names=None):
+    """Sample count and class names of a whole (unsharded) split"""
+    if pipeline == 'tfdata':
+        paths, _, class_names = emotion_model.list_image_files(split_dir, class_names)
+        return len(paths), class_names
+    if pipeline == 'compiled':
+        _, labels, manifest = emotion_model.dataset_compiler.load_compiled(split_dir)
+        return len(labels), manifest['class_names']
+    raise ValueError(f"Pipeline '{pipeline}' cannot be sharded (use 'tfdata' or 'compiled')")
+
+
+def _dataset_fn(split_dir, pipeline, global_batch_size, training, class_names):
+    """
+    Build the per-worker input function for strategy.distribute_datasets_from_function
+
+    Each input pipeline reads only its own shard and batches it at the
+    per-replica batch size. The dataset repeats, so workers with one sample
+    more or less never run out of batches before the others.
+    """
+    def dataset_fn(input_context):
+        batch_size = input_context.get_per_replica_batch_size(global_batch_size)
+        shard = (input_context.num_input_pipelines, input_context.input_pipeline_id)
+        if pipeline == 'compiled':
+            dataset, _, _ = emotion_model.create_compiled_dataset(split_dir, batch_size, training=training,
+                                                                  shard=shard)
+        else:
+            dataset, _, _ = emotion_model.create_tf_dataset(split_dir, batch_size, training=training,
+                                                            class_names=class_names, shard=shard)
+        return dataset.repeat()
+
+    return dataset_fn
+
+
+def train_distributed(train_dir, val_dir, epochs=50, batch_size=32, learning_rate=0.001,
+                      warmup_epochs=2, pipeline='tfdata', model_save_path='face_emotionModel.h5',
+                      backup_dir=None):
+    """
+    Train on every worker of the cluster described by TF_CONFIG
+
+    Every worker runs this function. The strategy must be created before
+    TensorFlow does anything else in the process.
+
+    Args:
+        train_dir: Training split (class folders, or a compiled split)
+        val_dir: Validation split
+        epochs: Number of training epochs
+        batch_size: Batch size per worker
+        learning_rate: Single-worker learning rate (scaled by the number of workers)
+        warmup_epochs: Epochs over which the learning rate ramps up to the scaled rate
+        pipeline: 'tfdata' or 'compiled'
+        model_save_path: Where the chief writes the best checkpoint and the final model
+        backup_dir: Optional shared directory for BackupAndRestore, so a
+            restarted cluster resumes from the last finished epoch
+
+    Returns:
+        Trained model and training history
+    """
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING
+        )
+    )
+    num_workers, task_index, is_chief = worker_info()
+    replicas = strategy.num_replicas_in_sync
+    global_batch_size = batch_size * replicas
+    scaled_learning_rate = learning_rate * replicas
+
+    train_samples, class_names = _split_info(train_dir, pipeline)
+    val_samples, _ = _split_info(val_dir, pipeline, class_names)
+    steps_per_epoch = max(1, train_samples // global_batch_size)
+    validation_steps = max(1, val_samples // global_batch_size)
+
+    if is_chief:
+        print("=" * 70)
+        print("DISTRIBUTED EMOTION MODEL TRAINING - Onipede 22CG031936")
+        print("=" * 70)
+        print(f"Workers: {num_workers} ({replicas} replicas)")
+        print(f"Global batch size: {global_batch_size} ({batch_size} per worker)")
+        print(f"Learning rate: {scaled_learning_rate:g} (warmup over {warmup_epochs} epochs from {learning_rate:g})")
+        print(f"Training samples: {train_samples} ({steps_per_epoch} steps/epoch)")
+        print(f"Validation samples: {val_samples} ({validation_steps} steps)")
+        print(f"Classes: {class_names}")
+
+    train_data = strategy.distribute_datasets_from_function(
+        _dataset_fn(train_dir, pipeline, global_batch_size, True, class_names)
+    )
+    val_data = strategy.distribute_datasets_from_function(
+        _dataset_fn(val_dir, pipeline, global_batch_size, False, class_names)
+    )
+
+    with strategy.scope():
+        model = emotion_model.create_emotion_model(input_shape=(48, 48, 1), num_classes=len(class_names))
+        model = emotion_model.compile_model(model, learning_rate=scaled_learning_rate)
+
+    # Non-chief workers take part in every save, but into a throwaway directory
+    scratch_dir = None if is_chief else tempfile.mkdtemp(prefix=f'worker{task_index}_')
+    save_path = model_save_path if is_chief else os.path.join(scratch_dir, os.path.basename(model_save_path))
+
+    callbacks = emotion_model.create_callbacks(save_path, verbose=1 if is_chief else 0)
+    callbacks.insert(0, LearningRateWarmup(learning_rate, scaled_learning_rate, warmup_epochs * steps_per_epoch))
+    if backup_dir:
+        callbacks.insert(0, keras.callbacks.BackupAndRestore(backup_dir))
+    if is_chief:
+        callbacks.append(emotion_model.ThroughputCallback(global_batch_size))
+
+    try:
+        history = model.fit(
+            train_data,
+            epochs=epochs,
+            steps_per_epoch=steps_per_epoch,
+            validation_data=val_data,
+            validation_steps=validation_steps,
+            callbacks=callbacks,
+            verbose=2 if is_chief else 0
+        )
+        model.save(save_path)
+    finally:
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if is_chief:
+        print("\n" + "=" * 70)
+        print(f"DISTRIBUTED TRAINING COMPLETED! Model saved to {model_save_path}")
+        print("=" * 70)
+
+    return model, history
+
+# ============================================================================
+# LOCAL LAUNCHER
+# ============================================================================
+
+def launch_local(num_workers, train_dir, val_dir, epochs=50, batch_size=32, learning_rate=0.001,
+                 warmup_epochs=2, pipeline='tfdata', model_save_path='face_emotionModel.h5',
+                 backup_dir=None, pin_cores=True):
+    """
+    Run a distributed training job as num_workers processes on this machine
+
+    Each worker gets its own TF_CONFIG on a free localhost port and, with
+    pin_cores, a disjoint set of cores. If any worker fails, the others are
+    stopped; otherwise they would wait on the collective forever.
+
+    Args:
+        num_workers: Number of worker processes
+        pin_cores: Pin each worker to its own cores and size its thread pools to match
+        (other arguments as for train_distributed)
+
+    Returns:
+        Exit code: 0 if every worker succeeded, else the first failure's code
+    """
+    hosts = [f'localhost:{port}' for port in _free_ports(num_workers)]
+    core_sets = split_cores(num_workers)
+    script = os.path.abspath(__file__)
+
+    processes = []
+    for index in range(num_workers):
+        command = [
+            sys.executable, script,
+            '--train-dir', train_dir, '--val-dir', val_dir,
+            '--epochs', str(epochs), '--batch-size', str(batch_size),
+            '--learning-rate', str(learning_rate), '--warmup-epochs', str(warmup_epochs),
+            '--pipeline', pipeline, '--model-save-path', model_save_path,
+        ]
+        if backup_dir:
+            command += ['--backup-dir', backup_dir]
+        env = dict(os.environ, TF_CONFIG=cluster_config(hosts, index))
+        if pin_cores:
+            cpus = core_sets[index]
+            command += ['--cpus', ','.join(str(cpu) for cpu in cpus)]
+            env['OMP_NUM_THREADS'] = str(len(cpus))
+        if index > 0:
+            env['TF_CPP_MIN_LOG_LEVEL'] = env.get('TF_CPP_MIN_LOG_LEVEL', '2')
+        processes.append(subprocess.Popen(command, env=env))
+
+    print(f"Started {num_workers} workers on {', '.join(hosts)}")
+    exit_code = 0
+    try:
+        while processes:
+            for process in list(processes):
+                code = process.poll()
+                if code is None:
+                    continue
+                processes.remove(process)
+                if code != 0 and exit_code == 0:
+                    exit_code = code
+                    print(f"Worker (pid {process.pid}) failed with exit code {code}, stopping the others")
+                    for other in processes:
+                        other.terminate()
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        exit_code = 130
+    finally:
+        for process in processes:
+            process.wait()
+    # A worker killed by a signal reports -signum; exit like a shell would (128 + signum)
+    return exit_code if exit_code >= 0 else 128 - exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker data-parallel training of the emotion model")
+    parser.add_argument('--train-dir', default='data/train', help="Training split")
+    parser.add_argument('--val-dir', default='data/validation', help="Validation split")
+    parser.add_argument('--epochs', type=int, default=50, help="Number of training epochs")
+    parser.add_argument('--batch-size', type=int, default=32, help="Batch size per worker")
+    parser.add_argument('--learning-rate', type=float, default=0.001,
+                        help="Single-worker learning rate (scaled by the number of workers)")
+    parser.add_argument('--warmup-epochs', type=int, default=2, help="Epochs of learning-rate warmup")
+    parser.add_argument('--pipeline', choices=['tfdata', 'compiled'], default='tfdata', help="Input pipeline")
+    parser.add_argument('--model-save-path', default='face_emotionModel.h5', help="Model written by the chief")
+    parser.add_argument('--backup-dir', default=None,
+                        help="Shared directory for resuming an interrupted job (BackupAndRestore)")
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help="Launch this many worker processes on this machine")
+    parser.add_argument('--no-pin', action='store_true', help="Do not pin local workers to separate cores")
+    parser.add_argument('--hosts', default=None,
+                        help="Comma-separated host:port of every worker (otherwise TF_CONFIG is used)")
+    parser.add_argument('--task-index', type=int, default=0, help="This host's position in --hosts")
+    parser.add_argument('--cpus', default=None, help="Comma-separated cores to pin this worker to")
+    args = parser.parse_args()
+
+    options = dict(
+        train_dir=args.train_dir, val_dir=args.val_dir, epochs=args.epochs, batch_size=args.batch_size,
+        learning_rate=args.learning_rate, warmup_epochs=args.warmup_epochs, pipeline=args.pipeline,
+        model_save_path=args.model_save_path, backup_dir=args.backup_dir,
+    )
+    if args.local_workers > 0:
+        sys.exit(launch_local(args.local_workers, pin_cores=not args.no_pin, **options))
+
+    if args.hosts:
+        os.environ['TF_CONFIG'] = cluster_config(args.hosts.split(','), args.task_index)
+    if args.cpus:
+        pin_to_cores([int(cpu) for cpu in args.cpus.split(',')])
+    train_distributed(**options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""
+Parallel Hyperparameter Search
+Author: Onipede-22CG031936
+
+Searches the learning rate, dropout rates, block widths and batch size of
+create_emotion_model / compile_model with many short training runs (trials)
+at once. Trials run in a pool of worker processes, each pinned to its own
+cores. Trial 0 always uses the current defaults from model.py as the
+baseline. The other trials are sampled at random from the search space.
+
+Pruning: after every epoch a trial reports its validation accuracy. From
+--prune-warmup epochs on, a trial whose best accuracy so far is below the
+median of the other trials at the same epoch is stopped. At least
+--prune-min-trials other trials must have reached that epoch first.
+
+Every trial, its parameters and each epoch's metrics are recorded in a
+SQLite file that can be queried directly, for example:
+
+    SELECT number, value, json_extract(params, '$.learning_rate')
+    FROM trials WHERE study = 'default' AND state = 'complete' ORDER BY value DESC;
+
+Running the same command again resumes an interrupted search. Finished
+trials are kept. Trials that were still running are trained again from the
+start. A trial's parameters depend only on the seed and its number, so
+resumed trials are the same trials. A study only resumes with the search
+space, seed, epochs, pipeline and data directories it was started with.
+
+Usage:
+    python hyperparameter_search.py --trials 40 --epochs 30 --processes 4
+    python hyperparameter_search.py --report
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import time
+from datetime import datetime
+
+import tensorflow as tf
+from tensorflow import keras
+
+import database
+import distributed_train
+import model as emotion_model
+
+
+# Parameter name -> ('loguniform' | 'uniform', low, high) or ('choice', options)
+DEFAULT_SEARCH_SPACE = {
+    'learning_rate': ('loguniform', 1e-4, 3e-3),
+    'conv_dropout': ('uniform', 0.1, 0.4),
+    'dense_dropout': ('uniform', 0.3, 0.6),
+    'width_multiplier': ('choice', [0.5, 0.75, 1.0]),
+    'dense_units': ('choice', [[512, 256], [256, 128], [256]]),
+    'batch_size': ('choice', [32, 64, 128]),
+}
+
+# The settings model.py trains with today (trial 0)
+BASELINE_PARAMS = {
+    'learning_rate': 0.001,
+    'conv_dropout': 0.25,
+    'dense_dropout': 0.5,
+    'width_multiplier': 1.0,
+    'dense_units': [512, 256],
+    'batch_size': 32,
+}
+
+# Filters of the four convolutional blocks at width_multiplier 1.0
+BASE_CONV_WIDTHS = (32, 64, 128, 256)
+
+
+def sample_params(space, seed, number):
+    """
+    Draw the parameters of one trial
+
+    Args:
+        space: Search space (see DEFAULT_SEARCH_SPACE)
+        seed: Search seed
+        number: Trial number (0 is the baseline)
+
+    Returns:
+        Dictionary of parameter values
+    """
+    if number == 0:
+        return dict(BASELINE_PARAMS)
+    rng = random.Random(seed * 1000003 + number)
+    params = {}
+    for name, spec in sorted(space.items()):
+        kind = spec[0]
+        if kind == 'choice':
+            params[name] = rng.choice(spec[1])
+        elif kind == 'uniform':
+            params[name] = rng.uniform(spec[1], spec[2])
+        elif kind == 'loguniform':
+            params[name] = math.exp(rng.uniform(math.log(spec[1]), math.log(spec[2])))
+        else:
+            raise ValueError(f"Unknown distribution '{kind}' for {name}")
+    return params
+
+# ============================================================================
+# RESULTS STORE
+# ============================================================================
+
+class SearchStore:
+    """
+    Studies, trials and per-epoch metrics in a SQLite file shared by all workers
+
+    Args:
+        path: Database file
+    """
+
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS studies (
+            name TEXT PRIMARY KEY,
+            space TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            settings TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS trials (
+            study TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            state TEXT NOT NULL,            -- running, complete, pruned or failed
+            value REAL,                     -- best validation accuracy
+            best_epoch INTEGER,
+            epochs_run INTEGER,
+            seconds REAL,
+            pid INTEGER,
+            cpus TEXT,
+            error TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            PRIMARY KEY (study, number)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS trial_epochs (
+            study TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            epoch INTEGER NOT NULL,
+            loss REAL,
+            accuracy REAL,
+            val_loss REAL,
+            val_accuracy REAL,
+            learning_rate REAL,
+            seconds REAL,
+            PRIMARY KEY (study, number, epoch)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_trial_epochs_epoch ON trial_epochs (study, epoch)',
+    )
+
+    # Settings that change what a trial's score means; a study resumes only with the same values
+    RESUME_SETTINGS = ('epochs', 'pipeline', 'train_dir', 'val_dir')
+
+    def __init__(self, path):
+        self.conn = database.connect(path)
+        with self.conn:
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+
+    def open_study(self, name, space, seed, settings):
+        """
+        Create a study, or check that an existing one was started with the same space, seed and settings
+
+        Raises:
+            ValueError: The study exists with a different search space, seed, epochs, pipeline or data
+        """
+        space_json = json.dumps(space, sort_keys=True)
+        with self.conn:
+            row = self.conn.execute('SELECT space, seed, settings FROM studies WHERE name = ?',
+                                    (name,)).fetchone()
+            if row is None:
+                self.conn.execute(
+                    'INSERT INTO studies (name, space, seed, settings, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (name, space_json, seed, json.dumps(settings, sort_keys=True), datetime.now().isoformat())
+                )
+            elif row[0] != space_json or row[1] != seed:
+                raise ValueError(f"Study '{name}' was started with a different search space or seed "
+                                 f"(use another --study name)")
+            else:
+                stored = json.loads(row[2] or '{}')
+                changed = [key for key in self.RESUME_SETTINGS
+                           if self._setting(key, stored.get(key)) != self._setting(key, settings.get(key))]
+                if changed:
+                    raise ValueError(f"Study '{name}' was started with different {', '.join(changed)} "
+                                     f"(use another --study name)")
+
+    @staticmethod
+    def _setting(key, value):
+        """Comparable form of a study setting (directories as absolute paths)"""
+        if key.endswith('_dir') and value:
+            return os.path.abspath(value)
+        return value
+
+    def finished(self, study):
+        """Trial numbers that are complete, pruned or failed"""
+        rows = self.conn.execute("SELECT number FROM trials WHERE study = ? AND state != 'running'", (study,))
+        return {row[0] for row in rows}
+
+    def start_trial(self, study, number, params, cpus):
+        """Mark a trial as running (dropping metrics left by an interrupted attempt)"""
+        with self.conn:
+            self.conn.execute('DELETE FROM trial_epochs WHERE study = ? AND number = ?', (study, number))
+            self.conn.execute(
+                '''INSERT OR REPLACE INTO trials (study, number, params, state, pid, cpus, started_at)
+                   VALUES (?, ?, ?, 'running', ?, ?, ?)''',
+                (study, number, json.dumps(params, sort_keys=True), os.getpid(),
+                 ','.join(str(cpu) for cpu in cpus or []), datetime.now().isoformat())
+            )
+
+    def report(self, study, number, epoch, logs, seconds):
+        """Record one epoch's metrics"""
+        with self.conn:
+            self.conn.execute(
+                '''INSERT OR REPLACE INTO trial_epochs
+                   (study, number, epoch, loss, accuracy, val_loss, val_accuracy, learning_rate, seconds)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (study, number, epoch, logs.get('loss'), logs.get('accuracy'), logs.get('val_loss'),
+                 logs.get('val_accuracy'), logs.get('lr'), seconds)
+            )
+
+    def median_at(self, study, number, epoch):
+        """
+        Median over the other trials of the best validation accuracy reached by this epoch
+
+        Returns:
+            Tuple of (median or None, number of trials it was computed from)
+        """
+        rows = self.conn.execute(
+            '''SELECT MAX(val_accuracy) FROM trial_epochs
+               WHERE study = ? AND number != ? AND epoch <= ?
+               GROUP BY number HAVING MAX(epoch) >= ?''',
+            (study, number, epoch, epoch)
+        ).fetchall()
+        values = [row[0] for row in rows if row[0] is not None]
+        return (statistics.median(values) if values else None), len(values)
+
+    def finish_trial(self, study, number, state, value=None, best_epoch=None, epochs_run=None,
+                     seconds=None, error=None):
+        """Record a trial's outcome"""
+        with self.conn:
+            self.conn.execute(
+                '''UPDATE trials SET state = ?, value = ?, best_epoch = ?, epochs_run = ?, seconds = ?,
+                   error = ?, finished_at = ? WHERE study = ? AND number = ?''',
+                (state, value, best_epoch, epochs_run, seconds, error, datetime.now().isoformat(),
+                 study, number)
+            )
+
+    def summary(self, study, limit=10):
+        """
+        Trial counts by state and the best complete trials
+
+        Returns:
+            Tuple of (dict state -> count, list of trial dicts ordered by value)
+        """
+        counts = dict(self.conn.execute(
+            'SELECT state, COUNT(*) FROM trials WHERE study = ? GROUP BY state', (study,)
+        ).fetchall())
+        rows = self.conn.execute(
+            '''SELECT number, value, best_epoch, epochs_run, seconds, params FROM trials
+               WHERE study = ? AND state = 'complete' ORDER BY value DESC LIMIT ?''',
+            (study, limit)
+        ).fetchall()
+        best = [{'number': r[0], 'value': r[1], 'best_epoch': r[2], 'epochs_run': r[3], 'seconds': r[4],
+                 'params': json.loads(r[5])} for r in rows]
+        return counts, best
+
+    def close(self):
+        self.conn.close()
+
+# ============================================================================
+# TRIALS (worker processes)
+# ============================================================================
+
+class TrialPruning(keras.callbacks.Callback):
+    """
+    Report each epoch to the store and stop the trial when it falls below the median
+
+    Args:
+        store: SearchStore
+        study: Study name
+        number: Trial number
+        warmup_epochs: Epochs before pruning is considered
+        min_trials: Other trials that must have reached the epoch before comparing
+    """
+
+    def __init__(self, store, study, number, warmup_epochs=3, min_trials=4):
+        super().__init__()
+        self.store = store
+        self.study = study
+        self.number = number
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.best_value = None
+        self.best_epoch = None
+        self.epochs_run = 0
+        self.pruned = False
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        epoch += 1
+        self.epochs_run = epoch
+        self.store.report(self.study, self.number, epoch, logs, time.perf_counter() - self._start)
+
+        value = logs.get('val_accuracy')
+        if value is not None and (self.best_value is None or value > self.best_value):
+            self.best_value, self.best_epoch = value, epoch
+
+        if epoch < self.warmup_epochs or self.best_value is None:
+            return
+        median, trials = self.store.median_at(self.study, self.number, epoch)
+        if trials >= self.min_trials and self.best_value < median:
+            self.pruned = True
+            self.model.stop_training = True
+
+
+# Set in worker processes by _init_worker
+_worker_store = None
+_worker_cpus = None
+
+
+def _init_worker(store_path, core_queue):
+    """Take a core set, pin this worker process to it and open the store"""
+    global _worker_store, _worker_cpus
+    try:
+        _worker_cpus = core_queue.get_nowait()
+    except queue.Empty:
+        # A replacement for a crashed worker: run unpinned rather than wait forever
+        _worker_cpus = None
+    if _worker_cpus:
+        distributed_train.pin_to_cores(_worker_cpus)
+    _worker_store = SearchStore(store_path)
+
+
+def _run_trial(task):
+    """
+    Train one trial (runs in a worker process)
+
+    Returns:
+        Dictionary with the trial number, state, value, epochs run, seconds and error
+    """
+    study, number, params, settings = task
+    _worker_store.start_trial(study, number, params, _worker_cpus)
+    start = time.perf_counter()
+    try:
+        keras.backend.clear_session()
+        tf.random.set_seed(settings['seed'] + number)
+
+        train_data, val_data, _, _, class_names = emotion_model.create_datasets(
+            settings['train_dir'], settings['val_dir'], params['batch_size'], settings['pipeline']
+        )
+        conv_widths = [emotion_model._scaled_channels(width, params['width_multiplier'])
+                       for width in BASE_CONV_WIDTHS]
+        net = emotion_model.create_emotion_model(
+            num_classes=len(class_names),
+            conv_widths=conv_widths,
+            dense_units=params['dense_units'],
+            conv_dropout=params['conv_dropout'],
+            dense_dropout=params['dense_dropout']
+        )
+        net = emotion_model.compile_model(net, learning_rate=params['learning_rate'])
+
+        models_dir = settings['models_dir']
+        callbacks = emotion_model.create_callbacks(
+            os.path.join(models_dir or '', f'{study}_trial_{number:04d}.h5'), verbose=0
+        )
+        if not models_dir:
+            callbacks = [c for c in callbacks if not isinstance(c, keras.callbacks.ModelCheckpoint)]
+        pruning = TrialPruning(_worker_store, study, number, settings['prune_warmup'], settings['prune_min_trials'])
+        callbacks.append(pruning)
+
+        net.fit(train_data, epochs=settings['epochs'], validation_data=val_data, callbacks=callbacks, verbose=0)
+
+        state = 'pruned' if pruning.pruned else 'complete'
+        seconds = time.perf_counter() - start
+        _worker_store.finish_trial(study, number, state, pruning.best_value, pruning.best_epoch,
+                                   pruning.epochs_run, seconds)
+        return {'number': number, 'state': state, 'value': pruning.best_value,
+                'epochs_run': pruning.epochs_run, 'seconds': seconds, 'error': None}
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        seconds = time.perf_counter() - start
+        _worker_store.finish_trial(study, number, 'failed', seconds=seconds, error=error)
+        return {'number': number, 'state': 'failed', 'value': None, 'epochs_run': None,
+                'seconds': seconds, 'error': error}
+
+# ============================================================================
+# SEARCH
+# ============================================================================
+
+def print_summary(store, study, limit=10):
+    """Print trial counts and the best complete trials of a study"""
+    counts, best = store.summary(study, limit)
+    print("\n" + "=" * 70)
+    print(f"STUDY '{study}': " + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+    print("=" * 70)
+    if not best:
+        print("No complete trials yet")
+        return
+    print(f"{'trial':>5} {'val_acc':>8} {'epoch':>6} {'epochs':>7} {'seconds':>8}  params")
+    for trial in best:
+        print(f"{trial['number']:>5} {trial['value']:>8.4f} {trial['best_epoch']:>6} {trial['epochs_run']:>7} "
+              f"{trial['seconds']:>8.0f}  {json.dumps(trial['params'], sort_keys=True)}")
+
+
+def run_search(train_dir, val_dir, trials=20, epochs=30, processes=None, store_path='hyperparameter_search.db',
+               study='default', pipeline='tfdata', seed=42, space=None, prune_warmup=3, prune_min_trials=4,
+               models_dir=None):
+    """
+    Run (or resume) a hyperparameter search
+
+    Args:
+        train_dir: Training split
+        val_dir: Validation split
+        trials: Total number of trials in the study, including finished ones
+        epochs: Maximum epochs per trial
+        processes: Trials trained at once (default: one per two cores)
+        store_path: SQLite results file
+        study: Study name (several studies can share one file)
+        pipeline: Input pipeline passed to create_datasets
+        seed: Seed of the parameter sampling
+        space: Search space (default DEFAULT_SEARCH_SPACE)
+        prune_warmup: First epoch at which a trial can be pruned
+        prune_min_trials: Other trials needed at an epoch before pruning there
+        models_dir: Directory for each trial's best checkpoint (None saves no models)
+
+    Returns:
+        List of result dictionaries of the trials run in this call
+    """
+    space = space or DEFAULT_SEARCH_SPACE
+    processes = max(1, processes or (os.cpu_count() or 1) // 2)
+    settings = {
+        'train_dir': train_dir, 'val_dir': val_dir, 'epochs': epochs, 'pipeline': pipeline, 'seed': seed,
+        'prune_warmup': prune_warmup, 'prune_min_trials': prune_min_trials, 'models_dir': models_dir,
+    }
+    if models_dir:
+        os.makedirs(models_dir, exist_ok=True)
+
+    store = SearchStore(store_path)
+    store.open_study(study, space, seed, settings)
+    finished = store.finished(study)
+    pending = [number for number in range(trials) if number not in finished]
+    print(f"Study '{study}': {trials} trials, {len(finished)} finished, {len(pending)} to run "
+          f"on {min(processes, len(pending)) if pending else 0} processes")
+    if not pending:
+        print_summary(store, study)
+        store.close()
+        return []
+
+    processes = min(processes, len(pending))
+    tasks = [(study, number, sample_params(space, seed, number), settings) for number in pending]
+
+    context = multiprocessing.get_context('spawn')
+    core_queue = context.Queue()
+    for cpus in distributed_train.split_cores(processes):
+        core_queue.put(cpus)
+    pool = context.Pool(processes, initializer=_init_worker, initargs=(store_path, core_queue))
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in pool.imap_unordered(_run_trial, tasks):
+            results.append(result)
+            value = f"{result['value']:.4f}" if result['value'] is not None else '-'
+            detail = f" ({result['error']})" if result['error'] else ''
+            print(f"[{len(results)}/{len(tasks)}] trial {result['number']}: {result['state']}, "
+                  f"val_accuracy {value}, {result['epochs_run'] or 0} epochs, "
+                  f"{result['seconds']:.0f}s{detail}")
+        pool.close()
+    except KeyboardInterrupt:
+        print("\nInterrupted - run the same command again to resume")
+    finally:
+        pool.terminate()
+        pool.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(results)} trials in {elapsed:.0f}s")
+    print_summary(store, study)
+    store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, resumable hyperparameter search with pruning")
+    parser.add_argument('--train-dir', default='data/train', help="Training split")
+    parser.add_argument('--val-dir', default='data/validation', help="Validation split")
+    parser.add_argument('--pipeline', choices=['tfdata', 'compiled', 'generator'], default='tfdata',
+                        help="Input pipeline")
+    parser.add_argument('--trials', type=int, default=20, help="Total trials in the study")
+    parser.add_argument('--epochs', type=int, default=30, help="Maximum epochs per trial")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Trials trained at once, each pinned to its share of the cores")
+    parser.add_argument('--store', default='hyperparameter_search.db', help="SQLite results file")
+    parser.add_argument('--study', default='default', help="Study name")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the parameter sampling")
+    parser.add_argument('--prune-warmup', type=int, default=3, help="First epoch at which trials can be pruned")
+    parser.add_argument('--prune-min-trials', type=int, default=4,
+                        help="Other trials that must reach an epoch before pruning there")
+    parser.add_argument('--models-dir', default=None, help="Save each trial's best model here")
+    parser.add_argument('--report', action='store_true', help="Only print the study's results")
+    args = parser.parse_args()
+
+    if args.report:
+        store = SearchStore(args.store)
+        print_summary(store, args.study, limit=20)
+        store.close()
+        return
+
+    run_search(
+        args.train_dir, args.val_dir, trials=args.trials, epochs=args.epochs, processes=args.processes,
+        store_path=args.store, study=args.study, pipeline=args.pipeline, seed=args.seed,
+        prune_warmup=args.prune_warmup, prune_min_trials=args.prune_min_trials, models_dir=args.models_dir
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Inference Backends
+Author: Onipede-22CG031936
+
+Serves the emotion model through full Keras (model.predict or a compiled
+tf.function) or through the TFLite interpreter (float16 or int8 quantized
+exports produced by model.py). Every backend exposes the same predict(batch)
+call, so the rest of the app does not care which one is loaded.
+"""
+
+import threading
+
+import numpy as np
+
+
+class KerasBackend:
+    """
+    Serve a Keras .h5 model
+
+    Args:
+        model_path: Path to the saved Keras model
+    """
+
+    name = 'keras'
+
+    def __init__(self, model_path):
+        from tensorflow import keras
+
+        self.model_path = model_path
+        self.model = keras.models.load_model(model_path)
+
+    def predict(self, batch):
+        """
+        Run a forward pass
+
+        Args:
+            batch: Float32 array of shape (N, 48, 48, 1)
+
+        Returns:
+            Array of shape (N, num_classes) with class probabilities
+        """
+        return self.model.predict(batch, verbose=0)
+
+
+def pick_bucket(buckets, size):
+    """Smallest of the sorted bucket sizes that holds size rows (the largest if none does)"""
+    for bucket in buckets:
+        if bucket >= size:
+            return bucket
+    return buckets[-1]
+
+
+def pad_to_bucket(chunk, buckets):
+    """Zero-pad a chunk of at most buckets[-1] rows up to its bucket size"""
+    bucket = pick_bucket(buckets, len(chunk))
+    if bucket == len(chunk):
+        return chunk
+    padding = np.zeros((bucket - len(chunk),) + chunk.shape[1:], dtype=chunk.dtype)
+    return np.concatenate([chunk, padding])
+
+
+class CompiledKerasBackend:
+    """
+    Serve a Keras .h5 model through a compiled tf.function
+
+    model.predict builds a data adapter and callback machinery on every call,
+    which costs more than the forward pass itself for small batches. This
+    backend calls the model inside one tf.function with a fixed input
+    signature instead. The signature leaves the batch dimension open, so the
+    function is traced once and serves any batch size as it is.
+
+    Only with XLA are batches zero-padded up to the next bucket size: XLA
+    compiles a program per concrete shape, so padding keeps that to one
+    program per bucket, each compiled at load time. Without XLA padding would
+    only add work. Batches above the largest bucket are split either way.
+
+    The function (and with XLA every bucket) is run during __init__, so
+    predict never traces or compiles.
+    The compiled function holds no mutable state, so request threads call it
+    concurrently without a lock.
+
+    Args:
+        model_path: Path to the saved Keras model
+        buckets: Batch sizes that inputs are padded to with XLA (the largest
+            also caps the rows per forward pass)
+        jit_compile: Compile the forward pass with XLA
+    """
+
+    name = 'compiled'
+
+    def __init__(self, model_path, buckets=(1, 2, 4, 8, 16, 32, 64), jit_compile=False):
+        import tensorflow as tf
+        from tensorflow import keras
+
+        self.model_path = model_path
+        self.model = keras.models.load_model(model_path)
+        self.buckets = tuple(sorted(set(int(b) for b in buckets)))
+        self.jit_compile = jit_compile
+
+        input_shape = tuple(self.model.input_shape[1:])
+        self._input_shape = input_shape
+
+        @tf.function(input_signature=[tf.TensorSpec((None,) + input_shape, tf.float32)],
+                     jit_compile=jit_compile)
+        def forward(batch):
+            return self.model(batch, training=False)
+
+        self._forward = forward
+        for bucket in self.buckets if jit_compile else self.buckets[:1]:
+            self._forward(np.zeros((bucket,) + input_shape, dtype=np.float32))
+
+    def predict(self, batch):
+        """
+        Run a forward pass
+
+        Args:
+            batch: Float32 array of shape (N, 48, 48, 1)
+
+        Returns:
+            Array of shape (N, num_classes) with class probabilities
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            rows = len(chunk)
+            if self.jit_compile:
+                chunk = pad_to_bucket(chunk, self.buckets)
+            outputs.append(self._forward(chunk).numpy()[:rows])
+        return np.concatenate(outputs) if len(outputs) != 1 else outputs[0]
+
+
+class TFLiteBackend:
+    """
+    Serve a .tflite model with the TFLite interpreter
+
+    Uses the lightweight tflite_runtime package when it is installed and
+    falls back to the interpreter bundled with TensorFlow. Quantized inputs
+    and outputs are converted with the tensors' scale and zero point.
+
+    Resizing an interpreter's input reallocates all of its tensors, and the
+    micro-batcher produces a different batch size on almost every call. So
+    batches are zero-padded up to the next bucket size (and split above the
+    largest), and each bucket gets its own interpreter, allocated once on
+    first use. The default buckets are spaced at most 1.5x apart, so padding
+    adds at most a third to a batch. Each interpreter holds mutable tensor buffers, so calls to the
+    same bucket are serialized while different buckets run concurrently.
+
+    Args:
+        model_path: Path to the .tflite file
+        num_threads: Interpreter threads (None lets TFLite decide)
+        buckets: Batch sizes that inputs are padded to
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None, buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64)):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.buckets = tuple(sorted(set(int(b) for b in buckets)))
+        self._interpreter_class = Interpreter
+        self._interpreters = {}  # bucket -> (interpreter, input details, output details, lock)
+        self._create_lock = threading.Lock()
+
+        # Fails early on a bad model file, and takes the input shape from the model
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._sample_shape = [int(d) for d in interpreter.get_input_details()[0]['shape'][1:]]
+        self._slot(self.buckets[0])
+
+    def _slot(self, bucket):
+        """Interpreter allocated for one bucket size (created on first use)"""
+        slot = self._interpreters.get(bucket)
+        if slot is not None:
+            return slot
+        with self._create_lock:
+            slot = self._interpreters.get(bucket)
+            if slot is None:
+                interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+                index = interpreter.get_input_details()[0]['index']
+                interpreter.resize_tensor_input(index, [bucket] + self._sample_shape)
+                interpreter.allocate_tensors()
+                slot = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0],
+                        threading.Lock())
+                self._interpreters[bucket] = slot
+        return slot
+
+    def _invoke(self, chunk):
+        """Run one chunk of at most the largest bucket size"""
+        rows = len(chunk)
+        data = pad_to_bucket(chunk, self.buckets)
+        interpreter, input_details, output_details, lock = self._slot(len(data))
+
+        if input_details['dtype'] != np.float32:
+            scale, zero_point = input_details['quantization']
+            data = np.round(data / scale + zero_point)
+            info = np.iinfo(input_details['dtype'])
+            data = np.clip(data, info.min, info.max)
+        with lock:
+            interpreter.set_tensor(input_details['index'], data.astype(input_details['dtype']))
+            interpreter.invoke()
+            output = interpreter.get_tensor(output_details['index'])[:rows]
+
+        if output_details['dtype'] != np.float32:
+            scale, zero_point = output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict(self, batch):
+        """
+        Run a forward pass
+
+        Args:
+            batch: Float32 array of shape (N, 48, 48, 1)
+
+        Returns:
+            Array of shape (N, num_classes) with class probabilities
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = [self._invoke(batch[start:start + largest]) for start in range(0, len(batch), largest)]
+        return np.concatenate(outputs) if len(outputs) != 1 else outputs[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'compiled': CompiledKerasBackend,
+    'tflite': TFLiteBackend,
+}
+
+
+def load_backend(name, model_path, **kwargs):
+    """
+    Create an inference backend by name
+
+    Args:
+        name: 'keras', 'compiled' or 'tflite'
+        model_path: Model file for that backend
+        **kwargs: Backend-specific options
+
+    Returns:
+        Backend instance with a predict(batch) method
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {sorted(BACKENDS)})")
+    return BACKENDS[name](model_path, **kwargs)
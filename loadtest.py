@@ -0,0 +1,636 @@
+"""
+Load Testing Harness
+Author: Onipede-22CG031936
+
+Measures how many /predict (or /api/v1/predict) requests per second the app
+sustains, and at what latency, so the number of workers and threads per box
+can be chosen from data rather than guesswork. It needs no external service:
+
+    1. The app is started locally (gunicorn, uvicorn or the Flask dev server)
+       in a temporary directory, so the real database and uploads are never
+       touched.
+    2. Synthetic face images are encoded up front, each one unique, so the
+       client does no image work during a run.
+    3. The app is driven either closed-loop (a fixed number of concurrent
+       clients sending back to back) or open-loop (Poisson arrivals at a
+       fixed rate; latency counts from the scheduled send time, so a
+       saturated server cannot hide its queueing delay).
+    4. Each run reports throughput, p50/p95/p99 latency, error and shed
+       rates, and CPU% and peak RSS per server worker (read from /proc).
+
+Every combination of --workers and --threads is started in turn and swept
+over the load levels. For each server configuration the report shows the
+load where throughput stops growing (saturation).
+
+Usage:
+    python loadtest.py --server flask --concurrency 1,4,16
+    python loadtest.py --workers 1,2,4 --threads 4,8 --concurrency 8,32,64 --duration 20
+    python loadtest.py --rates 5,10,20,40 --endpoint api --files-per-request 8
+    python loadtest.py --server uvicorn --workers 2 --threads 4 --output loadtest.json
+"""
+
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from benchmarks import synthetic_face
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILE_PREFIX = 'face_emotionModel'
+
+# A load level that adds less than this much throughput over the previous one is saturated
+SATURATION_GAIN = 0.05
+
+
+# ============================================================================
+# SYNTHETIC REQUESTS
+# ============================================================================
+
+def synthetic_images(count, width=640, height=480, seed=0):
+    """
+    Encode distinct photo-sized PNGs with one detectable face each
+
+    Args:
+        count: Number of images
+        width: Image width in pixels
+        height: Image height in pixels
+        seed: Random seed for face placement and noise
+
+    Returns:
+        List of PNG bytes (no two identical, so the prediction cache cannot help)
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    for index in range(count):
+        canvas = np.full((height, width), 90, np.uint8)
+        size = int(rng.integers(180, 260))
+        top = int(rng.integers(0, height - size))
+        left = int(rng.integers(0, width - size))
+        canvas[top:top + size, left:left + size] = synthetic_face(size, seed=index)
+        noise = rng.integers(-3, 4, canvas.shape)
+        canvas = np.clip(canvas.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        images.append(cv2.imencode('.png', cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR))[1].tobytes())
+    return images
+
+
+def encode_multipart(fields, files):
+    """
+    Build a multipart/form-data body
+
+    Args:
+        fields: Dict of form field name -> string value
+        files: List of (field name, filename, bytes)
+
+    Returns:
+        Tuple of (Content-Type header value, body bytes)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def build_requests(endpoint, count, files_per_request=1):
+    """
+    Pre-encode request bodies for an endpoint
+
+    Args:
+        endpoint: 'predict' (the HTML form) or 'api' (/api/v1/predict)
+        count: Number of distinct requests
+        files_per_request: Images per /api/v1/predict request
+
+    Returns:
+        List of (path, content type, body)
+    """
+    per_request = files_per_request if endpoint == 'api' else 1
+    images = synthetic_images(count * per_request)
+    requests = []
+    for index in range(count):
+        chunk = images[index * per_request:(index + 1) * per_request]
+        if endpoint == 'api':
+            files = [('files', f'face{index}_{i}.png', data) for i, data in enumerate(chunk)]
+            content_type, body = encode_multipart({'user_name': 'loadtest'}, files)
+            requests.append(('/api/v1/predict', content_type, body))
+        else:
+            content_type, body = encode_multipart({'user_name': 'loadtest'}, [('file', f'face{index}.png', chunk[0])])
+            requests.append(('/predict', content_type, body))
+    return requests
+
+
+# ============================================================================
+# SERVER PROCESS
+# ============================================================================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_workdir(workdir):
+    """
+    Make the served model available in the temporary working directory
+
+    Model files next to app.py are linked in. Without a trained model, a randomly
+    initialized one is saved instead (timing is the same, predictions are not).
+    """
+    linked = False
+    for name in os.listdir(REPO_DIR):
+        if name.startswith(MODEL_FILE_PREFIX) and name.endswith(('.h5', '.tflite')):
+            os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+            linked = linked or name == f'{MODEL_FILE_PREFIX}.h5'
+    if not linked:
+        print("No trained model found, serving a randomly initialized one")
+        sys.path.insert(0, REPO_DIR)
+        from model import create_emotion_model, compile_model
+        compile_model(create_emotion_model()).save(os.path.join(workdir, f'{MODEL_FILE_PREFIX}.h5'))
+
+
+class AppServer:
+    """
+    One locally started app server
+
+    Args:
+        server: 'gunicorn' (app:app, as in the Procfile), 'uvicorn' (asgi:app) or 'flask' (dev server)
+        workers: Worker processes (the Flask dev server always runs one)
+        threads: Threads per worker (gunicorn --threads, ASYNC_WORKERS for uvicorn)
+        workdir: Working directory for the database, uploads and the model
+        env: Extra environment variables for the app
+    """
+
+    def __init__(self, server, workers, threads, workdir, env=None):
+        self.server = server
+        self.workers = workers
+        self.threads = threads
+        self.workdir = workdir
+        self.port = _free_port()
+        self.env = dict(os.environ, PYTHONPATH=REPO_DIR, **(env or {}))
+        self.process = None
+        self.log_path = os.path.join(workdir, f'server-{server}-w{workers}-t{threads}.log')
+
+    def command(self):
+        bind = f'127.0.0.1:{self.port}'
+        if self.server == 'gunicorn':
+            return [sys.executable, '-m', 'gunicorn', 'app:app', '--pythonpath', REPO_DIR, '--bind', bind,
+                    '--workers', str(self.workers), '--threads', str(self.threads), '--timeout', '120']
+        if self.server == 'uvicorn':
+            self.env['ASYNC_WORKERS'] = str(self.threads)
+            return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', REPO_DIR, '--host', '127.0.0.1',
+                    '--port', str(self.port), '--workers', str(self.workers), '--log-level', 'warning']
+        return [sys.executable, '-c', "import app; app.app.run(host='127.0.0.1', port=%d, threaded=True)" % self.port]
+
+    def start(self, timeout=300):
+        """Start the server and wait until /readyz reports the model loaded"""
+        log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(self.command(), cwd=self.workdir, env=self.env, stdout=log,
+                                        stderr=subprocess.STDOUT, start_new_session=True)
+        log.close()
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {self.process.returncode}:\n{self.log_tail()}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                conn.request('GET', '/readyz')
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return
+                conn.close()
+            except OSError:
+                pass
+            time.sleep(0.5)
+        self.stop()
+        raise RuntimeError(f"Server not ready after {timeout}s:\n{self.log_tail()}")
+
+    def log_tail(self, lines=20):
+        with open(self.log_path, errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+
+    def worker_pids(self):
+        """Processes serving requests: the children of a gunicorn/uvicorn master, or the server itself"""
+        return child_pids(self.process.pid) or [self.process.pid]
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+# ============================================================================
+# PROCESS SAMPLING (Linux /proc)
+# ============================================================================
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def child_pids(pid):
+    """Direct children of a process (empty when /proc is unavailable)"""
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(set(children))
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, or None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB, or None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ProcessSampler:
+    """
+    Tracks CPU usage and peak RSS of the server workers during one run
+
+    Args:
+        pids: Worker process ids
+        interval: Seconds between RSS samples
+    """
+
+    def __init__(self, pids, interval=0.5):
+        self.pids = pids
+        self.interval = interval
+        self._peak_rss = {pid: 0.0 for pid in pids}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in self.pids:
+                self._peak_rss[pid] = max(self._peak_rss[pid], rss_mb(pid) or 0.0)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._cpu_start = {pid: cpu_seconds(pid) for pid in self.pids}
+        self._thread.start()
+
+    def stop(self):
+        """
+        Returns:
+            Dict of pid -> {'cpu_percent', 'peak_rss_mb'} (values None without /proc)
+        """
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._started
+        report = {}
+        for pid in self.pids:
+            start, end = self._cpu_start[pid], cpu_seconds(pid)
+            report[pid] = {
+                'cpu_percent': round((end - start) / elapsed * 100.0, 1) if None not in (start, end) else None,
+                'peak_rss_mb': round(self._peak_rss[pid], 1) if self._peak_rss[pid] else None,
+            }
+        return report
+
+
+# ============================================================================
+# LOAD GENERATION
+# ============================================================================
+
+def _send(conn, port, request, timeout):
+    """
+    Send one request on a keep-alive connection
+
+    Returns:
+        Tuple of (outcome, connection to reuse): outcome is 'ok', 'shed' (429/503) or 'error'
+    """
+    path, content_type, body = request
+    try:
+        if conn is None:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        conn.request('POST', path, body, {'Content-Type': content_type, 'Content-Length': str(len(body))})
+        response = conn.getresponse()
+        data = response.read()
+    except (OSError, http.client.HTTPException):
+        if conn is not None:
+            conn.close()
+        return 'error', None
+
+    if response.status in (429, 503):
+        return 'shed', conn
+    if response.status != 200:
+        return 'error', conn
+    # The batch API reports per-image failures inside a 200 NDJSON stream
+    if path.startswith('/api/') and b'"error"' in data:
+        return 'error', conn
+    return 'ok', conn
+
+
+def run_closed_loop(port, requests, concurrency, duration, timeout=60.0):
+    """
+    Keep a fixed number of clients busy, each sending its next request as soon as
+    the previous one finishes
+
+    Returns:
+        Tuple of (list of (latency seconds, outcome), elapsed seconds)
+    """
+    records = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        conn = None
+        local = []
+        while time.perf_counter() < stop_at:
+            request = requests[next(counter) % len(requests)]
+            start = time.perf_counter()
+            outcome, conn = _send(conn, port, request, timeout)
+            local.append((time.perf_counter() - start, outcome))
+        if conn is not None:
+            conn.close()
+        with lock:
+            records.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - started
+
+
+def run_open_loop(port, requests, rate, duration, timeout=60.0, max_outstanding=256, seed=0):
+    """
+    Send requests at Poisson-distributed arrival times, independent of how fast the
+    server answers. Latency is measured from each request's scheduled time.
+
+    Returns:
+        Tuple of (list of (latency seconds, outcome), elapsed seconds)
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, int(rate * duration * 1.5) + 10))
+    arrivals = arrivals[arrivals < duration]
+
+    records = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    started = time.perf_counter()
+
+    def client():
+        conn = None
+        local = []
+        while True:
+            index = next(counter)
+            if index >= len(arrivals):
+                break
+            scheduled = started + arrivals[index]
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            outcome, conn = _send(conn, port, requests[index % len(requests)], timeout)
+            local.append((time.perf_counter() - scheduled, outcome))
+        if conn is not None:
+            conn.close()
+        with lock:
+            records.extend(local)
+
+    threads = [threading.Thread(target=client, daemon=True)
+               for _ in range(min(max_outstanding, max(1, len(arrivals))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - started
+
+
+def summarize(records, elapsed, images_per_request=1):
+    """
+    Throughput and latency of one run
+
+    Args:
+        records: List of (latency seconds, outcome)
+        elapsed: Wall time of the run
+        images_per_request: Images in each request body
+
+    Returns:
+        Dictionary of request counts, rates and latency percentiles (ms, successful requests)
+    """
+    total = len(records)
+    ok = np.array([latency for latency, outcome in records if outcome == 'ok']) * 1000.0
+    shed = sum(1 for _, outcome in records if outcome == 'shed')
+    errors = sum(1 for _, outcome in records if outcome == 'error')
+
+    def percentile(q):
+        return round(float(np.percentile(ok, q)), 2) if len(ok) else None
+
+    return {
+        'requests': total,
+        'ok': int(len(ok)),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'images_per_second': round(len(ok) * images_per_request / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'mean_ms': round(float(ok.mean()), 2) if len(ok) else None,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'shed_rate': round(shed / total, 4) if total else 0.0,
+    }
+
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+def _format(value, width, digits=1):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def print_row(result):
+    workers = result['workers']
+    cpu = [w['cpu_percent'] for w in workers.values() if w['cpu_percent'] is not None]
+    rss = [w['peak_rss_mb'] for w in workers.values() if w['peak_rss_mb'] is not None]
+    print(f"{result['server_workers']:>7} {result['threads']:>7} {result['mode']:>6} {result['load']:>6} "
+          f"{result['throughput_rps']:>8.2f} {_format(result['p50_ms'], 8)} {_format(result['p95_ms'], 8)} "
+          f"{_format(result['p99_ms'], 8)} {result['error_rate'] * 100:>6.1f} {result['shed_rate'] * 100:>6.1f} "
+          f"{_format(sum(cpu) / len(cpu) if cpu else None, 9)} {_format(max(rss) if rss else None, 8)}")
+
+
+def find_saturation(results):
+    """
+    For each server configuration, the peak throughput and the load level where it saturates
+
+    Returns:
+        List of dicts with server_workers, threads, peak_rps, peak_load and saturated_at (None if
+        throughput still grew at the highest load)
+    """
+    summary = []
+    for (workers, threads), group in itertools.groupby(results, key=lambda r: (r['server_workers'], r['threads'])):
+        group = list(group)
+        peak = max(group, key=lambda r: r['throughput_rps'])
+        saturated_at = None
+        for previous, current in zip(group, group[1:]):
+            if current['throughput_rps'] < previous['throughput_rps'] * (1.0 + SATURATION_GAIN):
+                saturated_at = previous['load']
+                break
+        summary.append({'server_workers': workers, 'threads': threads, 'peak_rps': peak['throughput_rps'],
+                        'peak_load': peak['load'], 'p95_ms_at_peak': peak['p95_ms'], 'saturated_at': saturated_at})
+    return summary
+
+
+def run_sweep(args):
+    """
+    Start every workers x threads configuration and drive it at every load level
+
+    Returns:
+        Tuple of (list of per-run result dicts, saturation summary)
+    """
+    mode = 'rate' if args.rates else 'conc'
+    loads = [float(x) for x in args.rates.split(',')] if args.rates else [int(x) for x in args.concurrency.split(',')]
+    worker_counts = [int(x) for x in args.workers.split(',')]
+    thread_counts = [int(x) for x in args.threads.split(',')]
+    images_per_request = args.files_per_request if args.endpoint == 'api' else 1
+
+    print(f"Encoding {args.unique_requests} synthetic requests...")
+    requests = build_requests(args.endpoint, args.unique_requests, args.files_per_request)
+
+    # All load comes from one address, so per-client rate limiting is off unless asked for
+    env = {'STARTUP_MODE': 'background', 'CACHE_ENABLED': '1' if args.cache else '0',
+           'ADMISSION_RATE_PER_SECOND': '0'}
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='emotion-loadtest-')
+    try:
+        prepare_workdir(workdir)
+        print(f"\n{'workers':>7} {'threads':>7} {'mode':>6} {'load':>6} {'req/s':>8} {'p50 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8} {'err%':>6} {'shed%':>6} {'cpu%/wkr':>9} {'rss MB':>8}")
+        for workers in worker_counts:
+            for threads in thread_counts:
+                if args.server == 'flask' and (workers, threads) != (worker_counts[0], thread_counts[0]):
+                    continue
+                env['METRICS_DIR'] = os.path.join(workdir, f'metrics-w{workers}-t{threads}')
+                server = AppServer(args.server, workers, threads, workdir, env)
+                server.start()
+                try:
+                    run_closed_loop(server.port, requests, max(1, workers), args.warmup)
+                    pids = server.worker_pids()
+                    for load in loads:
+                        sampler = ProcessSampler(pids)
+                        sampler.start()
+                        if mode == 'rate':
+                            records, elapsed = run_open_loop(server.port, requests, load, args.duration,
+                                                             args.timeout, args.max_outstanding)
+                        else:
+                            records, elapsed = run_closed_loop(server.port, requests, load, args.duration,
+                                                               args.timeout)
+                        result = summarize(records, elapsed, images_per_request)
+                        result.update({'server': args.server, 'server_workers': workers, 'threads': threads,
+                                       'mode': mode, 'load': load, 'workers': sampler.stop()})
+                        results.append(result)
+                        print_row(result)
+                finally:
+                    server.stop()
+    finally:
+        if args.keep_workdir:
+            print(f"\nServer logs and database kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return results, find_saturation(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /predict against a locally started app")
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn', 'flask'], default='gunicorn',
+                        help="How the app is served (default: gunicorn, as in the Procfile)")
+    parser.add_argument('--workers', default='1', help="Comma-separated worker process counts to sweep")
+    parser.add_argument('--threads', default='8', help="Comma-separated threads per worker to sweep")
+    parser.add_argument('--concurrency', default='1,4,16', help="Closed-loop client counts to sweep")
+    parser.add_argument('--rates', help="Open-loop arrival rates (requests/sec) to sweep instead of --concurrency")
+    parser.add_argument('--endpoint', choices=['predict', 'api'], default='predict',
+                        help="/predict (HTML form) or /api/v1/predict (batch API)")
+    parser.add_argument('--files-per-request', type=int, default=4, help="Images per /api/v1/predict request")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds per load level")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Seconds of untimed load after startup")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Client timeout per request")
+    parser.add_argument('--max-outstanding', type=int, default=256, help="Open-loop connection cap")
+    parser.add_argument('--unique-requests', type=int, default=64, help="Distinct request bodies to cycle through")
+    parser.add_argument('--cache', action='store_true', help="Leave the prediction cache enabled")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Extra app setting, e.g. --env BATCH_MAX_SIZE=64 (repeatable)")
+    parser.add_argument('--output', help="Write all results as JSON")
+    parser.add_argument('--keep-workdir', action='store_true', help="Keep server logs and database")
+    args = parser.parse_args()
+
+    if args.server != 'flask' and importlib.util.find_spec(args.server) is None:
+        sys.exit(f"--server {args.server} needs {args.server}: pip install {args.server} (or use --server flask)")
+    if args.server == 'flask' and (',' in args.workers or ',' in args.threads):
+        print("The Flask dev server runs one process with a thread per request; only the first "
+              "--workers/--threads value is used")
+
+    results, saturation = run_sweep(args)
+
+    print("\nSaturation:")
+    for entry in saturation:
+        where = f"saturates at {entry['saturated_at']}" if entry['saturated_at'] is not None else "not saturated"
+        print(f"  workers={entry['server_workers']} threads={entry['threads']}: peak {entry['peak_rps']:.2f} req/s "
+              f"at {entry['peak_load']} (p95 {entry['p95_ms_at_peak']} ms), {where}")
+    if saturation:
+        best = max(saturation, key=lambda entry: entry['peak_rps'])
+        print(f"Best: workers={best['server_workers']} threads={best['threads']} ({best['peak_rps']:.2f} req/s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                                'cpu_count': os.cpu_count()},
+                'settings': vars(args),
+                'results': [dict(r, workers={str(pid): v for pid, v in r['workers'].items()}) for r in results],
+                'saturation': saturation,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
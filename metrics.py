@@ -0,0 +1,369 @@
+"""
+Latency Metrics and Prometheus Export
+Author: Onipede-22CG031936
+
+Records a latency histogram for every stage of a prediction (upload, decode,
+face detection, resize, inference, database) plus counters such as no-face
+fallbacks, errors and upload sizes, and renders them in the Prometheus text
+format for the /metrics endpoint.
+
+Each gunicorn worker keeps its metrics in memory and regularly writes a
+snapshot file into a directory shared by all workers. /metrics sums the
+snapshots of every worker, so whichever worker answers the scrape reports the
+totals for the whole server. A worker folds its totals into a shared
+retired snapshot and deletes its own file when it exits, and a scrape does
+the same for the files of workers that died without exiting cleanly, so the
+directory holds one file per live worker while counters never go backwards
+when a worker is recycled.
+
+A per-request trace (stage -> milliseconds) is collected in a thread-local,
+so the request handler can log one line showing where the time went.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server process, nothing to lock against
+    fcntl = None
+
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow cold requests
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upload size buckets in bytes (1 KB .. 16 MB, the upload limit)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))
+
+# Snapshot holding the summed totals of workers that have exited
+RETIRED_SNAPSHOT = 'retired.json'
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms shared across the threads of one worker
+
+    Args:
+        directory: Directory shared by all workers for snapshot files (None keeps
+            metrics local to this process)
+        flush_interval: Seconds between snapshot writes
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._definitions = {}   # name -> (type, help, buckets)
+        self._counters = {}      # (name, labels) -> value
+        self._histograms = {}    # (name, labels) -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        self._trace = threading.local()
+        self._dirty = False
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        self._snapshot_path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # pid plus start time, so a reused pid never overwrites an exited worker's totals
+            self._snapshot_path = os.path.join(directory, f'worker-{os.getpid()}-{time.time_ns()}.json')
+            self._thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # ------------------------------------------------------------------------
+    # Definitions and recording
+    # ------------------------------------------------------------------------
+
+    def counter(self, name, help_text):
+        """Declare a counter"""
+        self._definitions[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        """Declare a histogram with the given upper bounds"""
+        self._definitions[name] = ('histogram', help_text, tuple(buckets))
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Increase a counter
+
+        Args:
+            name: Declared counter name
+            amount: Increment
+            **labels: Label values
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        """
+        Record one observation in a histogram
+
+        Args:
+            name: Declared histogram name
+            value: Observed value (seconds for latency histograms)
+            **labels: Label values
+        """
+        buckets = self._definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+            self._dirty = True
+
+    def record_timings(self, timings, histogram='emotion_stage_seconds'):
+        """
+        Record every '<stage>_ms' entry of a timings dict as a stage latency
+
+        Args:
+            timings: Dict filled by extract_faces, classify_faces and the routes
+            histogram: Histogram with a 'stage' label
+        """
+        trace = getattr(self._trace, 'stages', None)
+        for key, value in timings.items():
+            if not key.endswith('_ms'):
+                continue
+            stage = key[:-3]
+            self.observe(histogram, value / 1000.0, stage=stage)
+            if trace is not None:
+                trace[stage] = round(trace.get(stage, 0.0) + value, 3)
+
+    @contextmanager
+    def stage(self, name, timings=None):
+        """
+        Time the body of a with-block as one stage
+
+        Args:
+            name: Stage name
+            timings: Optional dict that receives '<name>_ms' (recorded by record_timings
+                later); when omitted the stage is recorded immediately
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            if timings is not None:
+                timings[f'{name}_ms'] = timings.get(f'{name}_ms', 0.0) + elapsed_ms
+            else:
+                self.record_timings({f'{name}_ms': elapsed_ms})
+
+    # ------------------------------------------------------------------------
+    # Per-request trace
+    # ------------------------------------------------------------------------
+
+    def start_trace(self):
+        """Start collecting stage timings for the current request thread"""
+        self._trace.stages = {}
+
+    def end_trace(self):
+        """
+        Stop collecting stage timings for the current request thread
+
+        Returns:
+            Dict of stage -> milliseconds (empty if no trace was started)
+        """
+        stages = getattr(self._trace, 'stages', None) or {}
+        self._trace.stages = None
+        return stages
+
+    # ------------------------------------------------------------------------
+    # Snapshots and export
+    # ------------------------------------------------------------------------
+
+    def _snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, dict(labels), list(entry[0]), entry[1], entry[2]]
+                               for (name, labels), entry in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this worker's snapshot file (atomically) if anything changed"""
+        with self._flush_lock:
+            if self._snapshot_path is None or self._closed or not self._dirty:
+                return
+            _write_snapshot(self._snapshot_path, self._snapshot())
+
+    def close(self):
+        """Fold this worker's totals into the retired snapshot and remove its file (runs at exit)"""
+        if self._snapshot_path is None:
+            return
+        with self._flush_lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                with self._directory_lock():
+                    _write_snapshot(self._snapshot_path, self._snapshot())
+                    self._retire(self._snapshot_path)
+            except OSError as e:
+                print(f"Metrics snapshot cleanup failed: {e}")
+
+    @contextmanager
+    def _directory_lock(self):
+        """Serialize retiring snapshots (and scrapes) across the workers sharing the directory"""
+        with open(os.path.join(self.directory, 'retired.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _retire(self, path):
+        """Add an exited worker's snapshot to the retired totals and delete it (directory lock held)"""
+        retired_path = os.path.join(self.directory, RETIRED_SNAPSHOT)
+        snapshots = [snapshot for snapshot in (_read_snapshot(retired_path), _read_snapshot(path)) if snapshot]
+        _write_snapshot(retired_path, _merge_snapshots(snapshots))
+        os.remove(path)
+        if os.path.exists(f'{path}.tmp'):
+            os.remove(f'{path}.tmp')
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Metrics snapshot failed: {e}")
+
+    def _collect(self):
+        """Snapshots of every worker (or only this process without a shared directory)"""
+        if self._snapshot_path is None:
+            return [self._snapshot()]
+
+        self.flush()
+        snapshots = []
+        with self._directory_lock():
+            for name in os.listdir(self.directory):
+                if not (name.startswith('worker-') and name.endswith('.json')):
+                    continue
+                path = os.path.join(self.directory, name)
+                if not _worker_alive(name):
+                    # Killed before it could retire its own snapshot
+                    self._retire(path)
+                    continue
+                snapshot = _read_snapshot(path)
+                if snapshot:
+                    snapshots.append(snapshot)
+            retired = _read_snapshot(os.path.join(self.directory, RETIRED_SNAPSHOT))
+        if retired:
+            snapshots.append(retired)
+        return snapshots
+
+    def render(self):
+        """
+        Render the metrics of all workers in the Prometheus text exposition format
+
+        Returns:
+            String for a text/plain; version=0.0.4 response
+        """
+        counters, histograms = _sum_snapshots(self._collect())
+
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._definitions.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(labels, le=_format_value(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _sum_snapshots(snapshots):
+    """Add up counters and histograms across snapshots, keyed by (name, sorted labels)"""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, bucket_counts, total, count in snapshot['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            entry = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+            if len(entry[0]) != len(bucket_counts):
+                continue
+            entry[0] = [a + b for a, b in zip(entry[0], bucket_counts)]
+            entry[1] += total
+            entry[2] += count
+    return counters, histograms
+
+
+def _merge_snapshots(snapshots):
+    """Sum snapshots into a single snapshot in the file format"""
+    counters, histograms = _sum_snapshots(snapshots)
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, dict(labels), list(entry[0]), entry[1], entry[2]]
+                       for (name, labels), entry in histograms.items()],
+    }
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Missing, or being replaced by its worker right now; picked up on the next scrape
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _worker_alive(filename):
+    """Whether the process that owns a worker-<pid>-<start>.json snapshot is still running"""
+    try:
+        pid = int(filename.split('-')[1])
+    except (IndexError, ValueError):
+        return True
+    if pid == os.getpid() or os.name == 'nt':
+        # (os.kill would terminate the process on Windows)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to another user, or the platform can't tell
+        return True
+    return True
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -20,6 +20,9 @@ from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCheckpoint
 import numpy as np
 import os
+import time
+
+import dataset_compiler
 
 # Set random seeds for reproducibility
 np.random.seed(42)
@@ -29,69 +32,113 @@ tf.random.set_seed(42)
 # MODEL ARCHITECTURE
 # ============================================================================
 
-def create_emotion_model(input_shape=(48, 48, 1), num_classes=7):
+def create_emotion_model(input_shape=(48, 48, 1), num_classes=7, conv_widths=(32, 64, 128, 256),
+                         dense_units=(512, 256), conv_dropout=0.25, dense_dropout=0.5):
     """
     Create CNN model for emotion detection
     
     Args:
         input_shape: Shape of input images (height, width, channels)
         num_classes: Number of emotion classes to predict
+        conv_widths: Filters of each convolutional block (two conv layers + pooling per block)
+        dense_units: Units of each dense layer before the output layer
+        conv_dropout: Dropout rate after each convolutional block
+        dense_dropout: Dropout rate after each dense layer
     
     Returns:
         Compiled Keras model
     """
-    model = models.Sequential([
-        # First Convolutional Block
-        layers.Conv2D(32, (3, 3), activation='relu', input_shape=input_shape, padding='same'),
-        layers.BatchNormalization(),
-        layers.Conv2D(32, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.MaxPooling2D((2, 2)),
-        layers.Dropout(0.25),
-        
-        # Second Convolutional Block
-        layers.Conv2D(64, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.Conv2D(64, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.MaxPooling2D((2, 2)),
-        layers.Dropout(0.25),
-        
-        # Third Convolutional Block
-        layers.Conv2D(128, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.Conv2D(128, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.MaxPooling2D((2, 2)),
-        layers.Dropout(0.25),
-        
-        # Fourth Convolutional Block
-        layers.Conv2D(256, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.Conv2D(256, (3, 3), activation='relu', padding='same'),
-        layers.BatchNormalization(),
-        layers.MaxPooling2D((2, 2)),
-        layers.Dropout(0.25),
-        
-        # Flatten and Dense Layers
-        layers.Flatten(),
-        layers.Dense(512, activation='relu'),
-        layers.BatchNormalization(),
-        layers.Dropout(0.5),
-        layers.Dense(256, activation='relu'),
-        layers.BatchNormalization(),
-        layers.Dropout(0.5),
-        
-        # Output Layer
-        layers.Dense(num_classes, activation='softmax')
-    ])
+    model = models.Sequential()
+
+    # Convolutional Blocks
+    for block, filters in enumerate(conv_widths):
+        if block == 0:
+            model.add(layers.Conv2D(filters, (3, 3), activation='relu', input_shape=input_shape, padding='same'))
+        else:
+            model.add(layers.Conv2D(filters, (3, 3), activation='relu', padding='same'))
+        model.add(layers.BatchNormalization())
+        model.add(layers.Conv2D(filters, (3, 3), activation='relu', padding='same'))
+        model.add(layers.BatchNormalization())
+        model.add(layers.MaxPooling2D((2, 2)))
+        model.add(layers.Dropout(conv_dropout))
+
+    # Flatten and Dense Layers
+    model.add(layers.Flatten())
+    for units in dense_units:
+        model.add(layers.Dense(units, activation='relu'))
+        model.add(layers.BatchNormalization())
+        model.add(layers.Dropout(dense_dropout))
+
+    # Output Layer
+    model.add(layers.Dense(num_classes, activation='softmax'))
     
     return model
 
+
+def _scaled_channels(channels, width_multiplier, divisor=8):
+    """Scale a channel count by the width multiplier, rounded to a multiple of divisor"""
+    return max(divisor, int(channels * width_multiplier + divisor / 2) // divisor * divisor)
+
+
+def create_compact_model(input_shape=(48, 48, 1), num_classes=7, width_multiplier=1.0):
+    """
+    Create a compact, low-latency CNN for emotion detection
+
+    Same four-stage layout as create_emotion_model, but every 3x3 convolution
+    after the stem is depthwise-separable, and global average pooling replaces
+    Flatten + Dense(512) + Dense(256). The width multiplier scales the
+    channels of every layer.
+
+    Args:
+        input_shape: Shape of input images (height, width, channels)
+        num_classes: Number of emotion classes to predict
+        width_multiplier: Channel scale (e.g. 0.25, 0.5, 1.0)
+
+    Returns:
+        Keras model with a softmax output, servable exactly like the full model
+    """
+    def channels(base):
+        return _scaled_channels(base, width_multiplier)
+
+    model = models.Sequential(name=f'compact_w{width_multiplier:g}')
+
+    # Stem: one regular convolution (a depthwise one on a single channel learns little)
+    model.add(layers.Conv2D(channels(32), (3, 3), padding='same', use_bias=False, input_shape=input_shape))
+    model.add(layers.BatchNormalization())
+    model.add(layers.ReLU())
+
+    # Four depthwise-separable stages, downsampling 48 -> 24 -> 12 -> 6 -> 3
+    for stage, base in enumerate((32, 64, 128, 256)):
+        repeats = 1 if stage == 0 else 2
+        for _ in range(repeats):
+            model.add(layers.SeparableConv2D(channels(base), (3, 3), padding='same', use_bias=False))
+            model.add(layers.BatchNormalization())
+            model.add(layers.ReLU())
+        model.add(layers.MaxPooling2D((2, 2)))
+        model.add(layers.Dropout(0.1 if stage < 3 else 0.25))
+
+    # Global average pooling instead of Flatten + large Dense layers
+    model.add(layers.GlobalAveragePooling2D())
+    model.add(layers.Dropout(0.3))
+    model.add(layers.Dense(num_classes, activation='softmax'))
+
+    return model
+
 # ============================================================================
 # DATA PREPROCESSING AND AUGMENTATION
 # ============================================================================
 
+# Augmentation settings shared by create_data_generators and the tf.data pipeline
+AUGMENTATION = {
+    'rotation_range': 20,        # Degrees
+    'width_shift_range': 0.2,    # Fraction of width
+    'height_shift_range': 0.2,   # Fraction of height
+    'horizontal_flip': True,
+    'zoom_range': 0.2,           # Zoom factor in [1 - 0.2, 1 + 0.2]
+    'shear_range': 0.2,          # Degrees (same unit as ImageDataGenerator)
+}
+
+
 def create_data_generators(train_dir, val_dir, batch_size=32):
     """
     Create data generators for training and validation
@@ -104,16 +151,11 @@ def create_data_generators(train_dir, val_dir, batch_size=32):
     Returns:
         train_generator, validation_generator
     """
-    # Data augmentation for training set
+    # Data augmentation for training set (random rotation, shifts, flips, zoom and shear)
     train_datagen = ImageDataGenerator(
         rescale=1./255,              # Normalize pixel values to [0, 1]
-        rotation_range=20,           # Randomly rotate images
-        width_shift_range=0.2,       # Randomly shift images horizontally
-        height_shift_range=0.2,      # Randomly shift images vertically
-        horizontal_flip=True,        # Randomly flip images horizontally
-        zoom_range=0.2,              # Randomly zoom images
-        shear_range=0.2,             # Randomly apply shear transformation
-        fill_mode='nearest'          # Fill mode for new pixels
+        fill_mode='nearest',         # Fill mode for new pixels
+        **AUGMENTATION
     )
     
     # Only rescaling for validation set (no augmentation)
@@ -140,6 +182,248 @@ def create_data_generators(train_dir, val_dir, batch_size=32):
     
     return train_generator, validation_generator
 
+# ============================================================================
+# TF.DATA INPUT PIPELINE
+# ============================================================================
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+def list_image_files(data_dir, class_names=None):
+    """
+    List image files and integer labels from a class-folder directory
+
+    Args:
+        data_dir: Directory containing one subdirectory per class
+        class_names: Class order to use (defaults to sorted subdirectory names,
+            the same order flow_from_directory uses)
+
+    Returns:
+        Tuple of (file paths, labels, class names)
+    """
+    if class_names is None:
+        class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for root, _, files in os.walk(class_dir):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+                    labels.append(label)
+
+    return paths, labels, class_names
+
+
+def _decode_image(path, label, num_classes):
+    """Read and decode one image to a 48x48 grayscale uint8 tensor"""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=1, expand_animations=False)
+    image.set_shape([None, None, 1])
+    # Nearest-neighbour resize matches flow_from_directory's default interpolation
+    image = tf.image.resize(image, (48, 48), method='nearest')
+    return tf.cast(image, tf.uint8), tf.one_hot(label, num_classes)
+
+
+def augment_batch(images, augmentation=None):
+    """
+    Apply random rotation, shift, shear, zoom and horizontal flip to a whole batch
+
+    All per-image transforms are composed into one projective matrix each and
+    applied with a single vectorized op, instead of one image at a time.
+
+    Args:
+        images: Float tensor of shape (B, H, W, 1)
+        augmentation: Dict of ranges (defaults to AUGMENTATION)
+
+    Returns:
+        Augmented tensor of the same shape
+    """
+    aug = augmentation or AUGMENTATION
+    batch = tf.shape(images)[0]
+    height = tf.cast(tf.shape(images)[1], tf.float32)
+    width = tf.cast(tf.shape(images)[2], tf.float32)
+
+    def uniform(limit):
+        return tf.random.uniform([batch], -limit, limit)
+
+    deg = np.pi / 180.0
+    theta = uniform(aug['rotation_range'] * deg)
+    shear = uniform(aug['shear_range'] * deg)
+    tx = uniform(aug['width_shift_range']) * width
+    ty = uniform(aug['height_shift_range']) * height
+    zx = 1.0 + uniform(aug['zoom_range'])
+    zy = 1.0 + uniform(aug['zoom_range'])
+    if aug['horizontal_flip']:
+        flip = tf.where(tf.random.uniform([batch]) < 0.5, -1.0, 1.0)
+    else:
+        flip = tf.ones([batch])
+
+    zeros, ones = tf.zeros([batch]), tf.ones([batch])
+
+    def matrix(rows):
+        return tf.reshape(tf.stack([v for row in rows for v in row], axis=1), [-1, 3, 3])
+
+    # Output -> input pixel mapping, composed around the image centre
+    cx, cy = (width - 1) / 2.0, (height - 1) / 2.0
+    to_centre = matrix([[ones, zeros, -cx * ones], [zeros, ones, -cy * ones], [zeros, zeros, ones]])
+    from_centre = matrix([[ones, zeros, cx + tx], [zeros, ones, cy + ty], [zeros, zeros, ones]])
+    rotation = matrix([[tf.cos(theta), -tf.sin(theta), zeros], [tf.sin(theta), tf.cos(theta), zeros],
+                       [zeros, zeros, ones]])
+    shearing = matrix([[ones, -tf.sin(shear), zeros], [zeros, tf.cos(shear), zeros], [zeros, zeros, ones]])
+    zoom = matrix([[zx * flip, zeros, zeros], [zeros, zy, zeros], [zeros, zeros, ones]])
+
+    transform = from_centre @ rotation @ shearing @ zoom @ to_centre
+    transform = tf.reshape(transform, [-1, 9])[:, :8]
+
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transform,
+        output_shape=tf.shape(images)[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='NEAREST'
+    )
+
+
+def create_tf_dataset(data_dir, batch_size=32, training=False, class_names=None, cache_path='', shard=None):
+    """
+    Build a tf.data pipeline for one class-folder directory
+
+    Images are decoded in parallel and cached after the first epoch as 48x48
+    uint8 tensors. Training batches are shuffled and augmented batch-wise.
+    Batches are prefetched so the input pipeline overlaps with training.
+
+    Args:
+        data_dir: Directory containing one subdirectory per class
+        batch_size: Batch size
+        training: Shuffle and augment when True
+        class_names: Class order (defaults to sorted subdirectory names)
+        cache_path: File prefix for an on-disk cache ('' caches in memory, None disables)
+        shard: Optional (number of shards, shard index): keep only this worker's files,
+            before anything is decoded (distributed training)
+
+    Returns:
+        Tuple of (tf.data.Dataset yielding (images, one-hot labels), number of samples, class names)
+    """
+    paths, labels, class_names = list_image_files(data_dir, class_names)
+    num_classes = len(class_names)
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if shard is not None:
+        dataset = dataset.shard(*shard)
+    dataset = dataset.map(lambda p, l: _decode_image(p, l, num_classes),
+                          num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    if cache_path is not None:
+        dataset = dataset.cache(cache_path)
+    if training:
+        dataset = dataset.shuffle(len(paths), seed=42, reshuffle_each_iteration=True)
+
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    if training:
+        dataset = dataset.map(lambda x, y: (augment_batch(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+
+    return dataset.prefetch(tf.data.AUTOTUNE), len(paths), class_names
+
+
+def create_tf_datasets(train_dir, val_dir, batch_size=32):
+    """
+    tf.data replacement for create_data_generators
+
+    Args:
+        train_dir: Directory containing training data
+        val_dir: Directory containing validation data
+        batch_size: Batch size for training
+
+    Returns:
+        train_dataset, validation_dataset, info dict with sample counts and class names
+    """
+    train_dataset, train_samples, class_names = create_tf_dataset(train_dir, batch_size, training=True)
+    val_dataset, val_samples, _ = create_tf_dataset(val_dir, batch_size, class_names=class_names)
+
+    info = {'train_samples': train_samples, 'val_samples': val_samples, 'class_names': class_names}
+    return train_dataset, val_dataset, info
+
+
+def create_compiled_dataset(split_dir, batch_size=32, training=False, shard=None):
+    """
+    Build a tf.data pipeline over a split compiled by dataset_compiler.py
+
+    Images stay memory-mapped: each batch gathers its rows from the mapped
+    file, so startup is near-instant and the split is never loaded into RAM.
+
+    Args:
+        split_dir: Compiled split directory (its CURRENT build is read)
+        batch_size: Batch size
+        training: Shuffle and augment when True
+        shard: Optional (number of shards, shard index): read only this worker's rows
+
+    Returns:
+        Tuple of (tf.data.Dataset yielding (images, one-hot labels), number of samples, class names)
+    """
+    images, labels, manifest = dataset_compiler.load_compiled(split_dir)
+    num_classes = len(manifest['class_names'])
+    count = len(labels)
+
+    def gather(indices):
+        # Sorted indices turn the random batch into mostly sequential page reads
+        indices = np.sort(indices)
+        return images[indices], labels[indices].astype(np.int32)
+
+    def load_batch(indices):
+        x, y = tf.numpy_function(gather, [indices], (tf.uint8, tf.int32))
+        x.set_shape([None, 48, 48, 1])
+        y.set_shape([None])
+        return tf.cast(x, tf.float32) / 255.0, tf.one_hot(y, num_classes)
+
+    dataset = tf.data.Dataset.range(count)
+    if shard is not None:
+        dataset = dataset.shard(*shard)
+    if training:
+        dataset = dataset.shuffle(count, seed=42, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(load_batch, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    if training:
+        dataset = dataset.map(lambda x, y: (augment_batch(x), y), num_parallel_calls=tf.data.AUTOTUNE)
+
+    return dataset.prefetch(tf.data.AUTOTUNE), count, manifest['class_names']
+
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """
+    Report training steps/sec and samples/sec for each epoch
+    (time between the first and the last training batch, validation excluded)
+    """
+
+    def __init__(self, batch_size):
+        super().__init__()
+        self.batch_size = batch_size
+        self.history = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+        self._steps = 0
+        self._last = self._start
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self._last = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = self._last - self._start
+        if not self._steps or elapsed <= 0:
+            return
+        steps_per_sec = self._steps / elapsed
+        self.history.append(steps_per_sec)
+        if logs is not None:
+            logs['steps_per_sec'] = steps_per_sec
+        print(f"\nEpoch {epoch + 1}: {steps_per_sec:.2f} steps/sec "
+              f"({steps_per_sec * self.batch_size:.1f} samples/sec)")
+
 # ============================================================================
 # MODEL COMPILATION
 # ============================================================================
@@ -169,12 +453,13 @@ def compile_model(model, learning_rate=0.001):
 # TRAINING CALLBACKS
 # ============================================================================
 
-def create_callbacks(model_save_path='face_emotionModel.h5'):
+def create_callbacks(model_save_path='face_emotionModel.h5', verbose=1):
     """
     Create callbacks for training
 
     Args:
         model_save_path: Path to save the best model
+        verbose: Callback logging (0 on non-chief workers in distributed training)
 
     Returns:
         List of callbacks
@@ -184,7 +469,7 @@ def create_callbacks(model_save_path='face_emotionModel.h5'):
         monitor='val_loss',
         patience=10,
         restore_best_weights=True,
-        verbose=1
+        verbose=verbose
     )
 
     # Reduce learning rate when validation loss plateaus
@@ -193,7 +478,7 @@ def create_callbacks(model_save_path='face_emotionModel.h5'):
         factor=0.5,
         patience=5,
         min_lr=1e-7,
-        verbose=1
+        verbose=verbose
     )
 
     # Save the best model during training
@@ -202,7 +487,7 @@ def create_callbacks(model_save_path='face_emotionModel.h5'):
         monitor='val_accuracy',
         save_best_only=True,
         mode='max',
-        verbose=1
+        verbose=verbose
     )
 
     return [early_stopping, reduce_lr, model_checkpoint]
@@ -211,7 +496,41 @@ def create_callbacks(model_save_path='face_emotionModel.h5'):
 # TRAINING FUNCTION
 # ============================================================================
 
-def train_model(train_dir, val_dir, epochs=50, batch_size=32):
+def create_datasets(train_dir, val_dir, batch_size=32, pipeline='generator'):
+    """
+    Create training and validation inputs for the chosen input pipeline
+
+    Args:
+        train_dir: Directory containing training data organized by class
+        val_dir: Directory containing validation data organized by class
+        batch_size: Batch size for training
+        pipeline: 'generator' (ImageDataGenerator), 'tfdata', or 'compiled'
+            (train_dir and val_dir are dataset_compiler.py output splits)
+
+    Returns:
+        Tuple of (train data, validation data, train samples, validation samples, class names)
+    """
+    if pipeline == 'tfdata':
+        train_generator, validation_generator, info = create_tf_datasets(
+            train_dir, val_dir, batch_size
+        )
+        train_samples, val_samples, class_names = info['train_samples'], info['val_samples'], info['class_names']
+    elif pipeline == 'compiled':
+        train_generator, train_samples, class_names = create_compiled_dataset(train_dir, batch_size, training=True)
+        validation_generator, val_samples, _ = create_compiled_dataset(val_dir, batch_size)
+    elif pipeline == 'generator':
+        train_generator, validation_generator = create_data_generators(
+            train_dir, val_dir, batch_size
+        )
+        train_samples, val_samples = train_generator.samples, validation_generator.samples
+        class_names = list(train_generator.class_indices.keys())
+    else:
+        raise ValueError(f"Unknown pipeline '{pipeline}' (use 'generator', 'tfdata' or 'compiled')")
+
+    return train_generator, validation_generator, train_samples, val_samples, class_names
+
+
+def train_model(train_dir, val_dir, epochs=50, batch_size=32, pipeline='generator'):
     """
     Complete training pipeline for emotion detection model
 
@@ -220,6 +539,8 @@ def train_model(train_dir, val_dir, epochs=50, batch_size=32):
         val_dir: Directory containing validation data organized by class
         epochs: Number of training epochs
         batch_size: Batch size for training
+        pipeline: Input pipeline, 'generator' (ImageDataGenerator), 'tfdata', or
+            'compiled' (train_dir and val_dir are dataset_compiler.py output splits)
 
     Returns:
         Trained model and training history
@@ -241,18 +562,19 @@ def train_model(train_dir, val_dir, epochs=50, batch_size=32):
     model = compile_model(model, learning_rate=0.001)
 
     # Create data generators
-    print("\n[3/5] Creating data generators...")
-    train_generator, validation_generator = create_data_generators(
-        train_dir, val_dir, batch_size
+    print(f"\n[3/5] Creating data generators ({pipeline} pipeline)...")
+    train_generator, validation_generator, train_samples, val_samples, class_names = create_datasets(
+        train_dir, val_dir, batch_size, pipeline
     )
 
-    print(f"Training samples: {train_generator.samples}")
-    print(f"Validation samples: {validation_generator.samples}")
-    print(f"Classes: {list(train_generator.class_indices.keys())}")
+    print(f"Training samples: {train_samples}")
+    print(f"Validation samples: {val_samples}")
+    print(f"Classes: {class_names}")
 
     # Create callbacks
     print("\n[4/5] Setting up training callbacks...")
     callbacks = create_callbacks('face_emotionModel.h5')
+    callbacks.append(ThroughputCallback(batch_size))
 
     # Train model
     print("\n[5/5] Starting training...")
@@ -278,7 +600,7 @@ def train_model(train_dir, val_dir, epochs=50, batch_size=32):
 # MODEL EVALUATION
 # ============================================================================
 
-def evaluate_model(model, test_dir, batch_size=32):
+def evaluate_model(model, test_dir, batch_size=32, pipeline='generator'):
     """
     Evaluate the trained model on test data
 
@@ -286,6 +608,8 @@ def evaluate_model(model, test_dir, batch_size=32):
         model: Trained Keras model
         test_dir: Directory containing test data
         batch_size: Batch size for evaluation
+        pipeline: Input pipeline, 'generator' (ImageDataGenerator), 'tfdata', or
+            'compiled' (test_dir is a dataset_compiler.py output split)
 
     Returns:
         Test loss and accuracy
@@ -295,19 +619,25 @@ def evaluate_model(model, test_dir, batch_size=32):
     print("=" * 70)
 
     # Create test data generator
-    test_datagen = ImageDataGenerator(rescale=1./255)
-
-    test_generator = test_datagen.flow_from_directory(
-        test_dir,
-        target_size=(48, 48),
-        color_mode='grayscale',
-        batch_size=batch_size,
-        class_mode='categorical',
-        shuffle=False
-    )
+    if pipeline == 'tfdata':
+        test_generator, test_samples, _ = create_tf_dataset(test_dir, batch_size, cache_path=None)
+    elif pipeline == 'compiled':
+        test_generator, test_samples, _ = create_compiled_dataset(test_dir, batch_size)
+    else:
+        test_datagen = ImageDataGenerator(rescale=1./255)
+
+        test_generator = test_datagen.flow_from_directory(
+            test_dir,
+            target_size=(48, 48),
+            color_mode='grayscale',
+            batch_size=batch_size,
+            class_mode='categorical',
+            shuffle=False
+        )
+        test_samples = test_generator.samples
 
     # Evaluate model
-    print(f"\nEvaluating on {test_generator.samples} test samples...")
+    print(f"\nEvaluating on {test_samples} test samples...")
     test_loss, test_accuracy = model.evaluate(test_generator, verbose=1)
 
     print(f"\nTest Loss: {test_loss:.4f}")
@@ -336,6 +666,376 @@ def save_model(model, filepath='face_emotionModel.h5'):
     file_size = os.path.getsize(filepath) / (1024 * 1024)  # Convert to MB
     print(f"Model file size: {file_size:.2f} MB")
 
+# ============================================================================
+# TFLITE EXPORT (POST-TRAINING QUANTIZATION)
+# ============================================================================
+
+def load_calibration_images(data_dir, num_samples=200, batch_size=32):
+    """
+    Sample preprocessed images from a class-folder directory
+
+    Args:
+        data_dir: Directory containing images organized by class
+        num_samples: Number of images to sample
+        batch_size: Batch size used while reading
+
+    Returns:
+        Tuple of (images of shape (N, 48, 48, 1) in [0, 1], one-hot labels)
+    """
+    datagen = ImageDataGenerator(rescale=1./255)
+    generator = datagen.flow_from_directory(
+        data_dir,
+        target_size=(48, 48),
+        color_mode='grayscale',
+        batch_size=batch_size,
+        class_mode='categorical',
+        shuffle=True,
+        seed=42
+    )
+
+    num_samples = min(num_samples, generator.samples)
+    images, labels = [], []
+    collected = 0
+    while collected < num_samples:
+        batch_images, batch_labels = next(generator)
+        images.append(batch_images)
+        labels.append(batch_labels)
+        collected += len(batch_images)
+
+    return np.concatenate(images)[:num_samples], np.concatenate(labels)[:num_samples]
+
+
+def convert_to_tflite(model, quantization='float16', calibration_images=None):
+    """
+    Convert a Keras model to a post-training-quantized TFLite flatbuffer
+
+    Args:
+        model: Trained Keras model
+        quantization: 'float16' (half-precision weights) or 'int8' (full integer)
+        calibration_images: Representative inputs, required for 'int8'
+
+    Returns:
+        Serialized TFLite model as bytes
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if calibration_images is None or len(calibration_images) == 0:
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for image in calibration_images:
+                yield [image[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}' (use 'float16' or 'int8')")
+
+    return converter.convert()
+
+
+def _current_rss_mb():
+    """Resident memory of this process in MB (Linux only, None elsewhere)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _measure_backend(predict_fn, images, labels, latency_runs=100):
+    """Accuracy over images and median/p95 single-image latency of predict_fn"""
+    predictions = np.concatenate([predict_fn(images[i:i + 32]) for i in range(0, len(images), 32)])
+    accuracy = float(np.mean(np.argmax(predictions, axis=1) == np.argmax(labels, axis=1)))
+
+    sample = images[:1]
+    predict_fn(sample)  # Warm-up
+    latencies = []
+    for _ in range(latency_runs):
+        start = time.perf_counter()
+        predict_fn(sample)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return accuracy, float(np.median(latencies)), float(np.percentile(latencies, 95))
+
+
+def export_tflite_models(model, calibration_dir, eval_dir=None, keras_path='face_emotionModel.h5',
+                         output_prefix='face_emotionModel', num_calibration_samples=200,
+                         num_eval_samples=1000):
+    """
+    Export float16 and int8 TFLite models and compare them with the Keras model
+
+    Args:
+        model: Trained Keras model
+        calibration_dir: Class-folder directory used for int8 calibration (e.g. data/train)
+        eval_dir: Class-folder directory for the accuracy comparison (defaults to calibration_dir)
+        keras_path: Saved .h5 file of the same model, used for size and memory comparison
+        output_prefix: Output files are written as <prefix>_float16.tflite and <prefix>_int8.tflite
+        num_calibration_samples: Images in the representative dataset
+        num_eval_samples: Images used to measure accuracy
+
+    Returns:
+        Dictionary mapping variant name to accuracy, latency and size metrics
+    """
+    from inference_backends import TFLiteBackend
+
+    print("\n" + "=" * 70)
+    print("TFLITE EXPORT")
+    print("=" * 70)
+
+    print(f"\nLoading {num_calibration_samples} calibration images from {calibration_dir}...")
+    calibration_images, _ = load_calibration_images(calibration_dir, num_calibration_samples)
+    eval_images, eval_labels = load_calibration_images(eval_dir or calibration_dir, num_eval_samples)
+
+    report = {}
+
+    # Baseline: the Keras model as served by app.py
+    accuracy, latency, latency_p95 = _measure_backend(
+        lambda batch: model.predict(batch, verbose=0), eval_images, eval_labels
+    )
+    report['keras'] = {
+        'path': keras_path,
+        'size_mb': os.path.getsize(keras_path) / (1024 * 1024) if os.path.exists(keras_path) else None,
+        'rss_delta_mb': None,
+        'accuracy': accuracy,
+        'latency_ms': latency,
+        'latency_p95_ms': latency_p95,
+    }
+    if os.path.exists(keras_path):
+        rss_before = _current_rss_mb()
+        reloaded = keras.models.load_model(keras_path)
+        rss_after = _current_rss_mb()
+        if rss_before is not None:
+            report['keras']['rss_delta_mb'] = rss_after - rss_before
+        del reloaded
+
+    for quantization in ('float16', 'int8'):
+        print(f"\nConverting with {quantization} quantization...")
+        tflite_model = convert_to_tflite(model, quantization, calibration_images)
+        path = f"{output_prefix}_{quantization}.tflite"
+        with open(path, 'wb') as f:
+            f.write(tflite_model)
+        print(f"✓ Saved {path}")
+
+        rss_before = _current_rss_mb()
+        backend = TFLiteBackend(path)
+        rss_after = _current_rss_mb()
+
+        accuracy, latency, latency_p95 = _measure_backend(backend.predict, eval_images, eval_labels)
+        report[quantization] = {
+            'path': path,
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            'rss_delta_mb': rss_after - rss_before if rss_before is not None else None,
+            'accuracy': accuracy,
+            'latency_ms': latency,
+            'latency_p95_ms': latency_p95,
+        }
+
+    # Comparison table
+    baseline = report['keras']
+    print("\n" + "-" * 70)
+    print(f"{'Variant':<10}{'Size MB':>10}{'RSS MB':>10}{'Accuracy':>11}{'Delta':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    print("-" * 70)
+    for name, metrics in report.items():
+        size = f"{metrics['size_mb']:.2f}" if metrics['size_mb'] is not None else 'n/a'
+        rss = f"{metrics['rss_delta_mb']:.1f}" if metrics['rss_delta_mb'] is not None else 'n/a'
+        metrics['accuracy_delta'] = metrics['accuracy'] - baseline['accuracy']
+        print(f"{name:<10}{size:>10}{rss:>10}{metrics['accuracy']:>11.4f}"
+              f"{metrics['accuracy_delta']:>+9.4f}{metrics['latency_ms']:>10.3f}{metrics['latency_p95_ms']:>10.3f}")
+    print("=" * 70)
+
+    return report
+
+# ============================================================================
+# COMPACT MODEL AND KNOWLEDGE DISTILLATION
+# ============================================================================
+
+class Distiller(keras.Model):
+    """
+    Train a student model to match a frozen teacher's softened predictions
+
+    The loss mixes cross-entropy on the true labels with the KL divergence
+    between teacher and student distributions at a raised temperature. Both
+    models end in softmax, so their log-probabilities are used as logits
+    (softmax(log p / T) equals softmax(logits / T)).
+
+    Args:
+        student: Model being trained
+        teacher: Trained model providing soft targets (not updated)
+        temperature: Softening temperature
+        alpha: Weight of the hard-label loss (1 - alpha goes to distillation)
+    """
+
+    def __init__(self, student, teacher, temperature=4.0, alpha=0.3):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.temperature = temperature
+        self.alpha = alpha
+        self.hard_loss = keras.losses.CategoricalCrossentropy()
+        self.soft_loss = keras.losses.KLDivergence()
+
+    def _soften(self, probabilities):
+        return tf.nn.softmax(tf.math.log(probabilities + 1e-7) / self.temperature, axis=-1)
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def train_step(self, data):
+        x, y = data
+        teacher_probabilities = self.teacher(x, training=False)
+
+        with tf.GradientTape() as tape:
+            student_probabilities = self.student(x, training=True)
+            hard = self.hard_loss(y, student_probabilities)
+            soft = self.soft_loss(self._soften(teacher_probabilities), self._soften(student_probabilities))
+            loss = self.alpha * hard + (1 - self.alpha) * soft * self.temperature ** 2
+
+        gradients = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(gradients, self.student.trainable_variables))
+
+        self.compiled_metrics.update_state(y, student_probabilities)
+        results = {m.name: m.result() for m in self.metrics}
+        results.update({'loss': loss, 'hard_loss': hard, 'distillation_loss': soft})
+        return results
+
+    def test_step(self, data):
+        x, y = data
+        student_probabilities = self.student(x, training=False)
+        loss = self.hard_loss(y, student_probabilities)
+        self.compiled_metrics.update_state(y, student_probabilities)
+        results = {m.name: m.result() for m in self.metrics}
+        results['loss'] = loss
+        return results
+
+
+def train_compact_model(train_dir, val_dir, width_multiplier=0.5, teacher_path='face_emotionModel.h5',
+                        epochs=50, batch_size=32, pipeline='tfdata', temperature=4.0, alpha=0.3):
+    """
+    Train a compact model, distilling from the full model when it is available
+
+    Args:
+        train_dir: Directory containing training data organized by class
+        val_dir: Directory containing validation data organized by class
+        width_multiplier: Channel scale for create_compact_model
+        teacher_path: Trained full model used as teacher (None or missing file trains on labels only)
+        epochs: Number of training epochs
+        batch_size: Batch size for training
+        pipeline: Input pipeline, as for train_model
+        temperature: Distillation temperature
+        alpha: Weight of the hard-label loss
+
+    Returns:
+        Trained student model and training history
+    """
+    train_data, val_data, train_samples, val_samples, class_names = create_datasets(
+        train_dir, val_dir, batch_size, pipeline
+    )
+
+    student = create_compact_model(num_classes=len(class_names), width_multiplier=width_multiplier)
+    print(f"\nCompact model (width {width_multiplier:g}): {student.count_params():,} parameters")
+
+    if teacher_path and os.path.exists(teacher_path):
+        print(f"Distilling from teacher {teacher_path} (T={temperature}, alpha={alpha})")
+        teacher = keras.models.load_model(teacher_path)
+        trainer = Distiller(student, teacher, temperature=temperature, alpha=alpha)
+        trainer.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001), metrics=['accuracy'])
+    else:
+        print("No teacher model found, training on labels only")
+        trainer = compile_model(student, learning_rate=0.001)
+
+    # The checkpoint callback is left out: a Distiller cannot be saved as .h5,
+    # and restore_best_weights already keeps the best student weights
+    callbacks = [callback for callback in create_callbacks() if not isinstance(callback, ModelCheckpoint)]
+    callbacks.append(ThroughputCallback(batch_size))
+
+    history = trainer.fit(train_data, epochs=epochs, validation_data=val_data, callbacks=callbacks, verbose=1)
+
+    # Compile the bare student so it can be saved and evaluated like the full model
+    student = compile_model(student, learning_rate=0.001)
+    return student, history
+
+
+def compare_compact_models(train_dir, val_dir, eval_dir=None, widths=(0.25, 0.5, 1.0),
+                           teacher_path='face_emotionModel.h5', epochs=50, batch_size=32,
+                           pipeline='tfdata', output_prefix='face_emotionModel_compact',
+                           num_eval_samples=1000):
+    """
+    Train one compact model per width and report accuracy against CPU latency and size
+
+    Args:
+        train_dir: Directory containing training data organized by class
+        val_dir: Directory containing validation data organized by class
+        eval_dir: Class-folder directory for the accuracy comparison (defaults to val_dir)
+        widths: Width multipliers to train
+        teacher_path: Trained full model (teacher, and baseline row of the report)
+        epochs: Number of training epochs per width
+        batch_size: Batch size for training
+        pipeline: Input pipeline, as for train_model
+        output_prefix: Models are saved as <prefix>_w<width>.h5, the report as <prefix>_report.json
+        num_eval_samples: Images used to measure accuracy
+
+    Returns:
+        Dictionary mapping variant name to parameters, size, accuracy and latency
+    """
+    import json
+
+    print("\n" + "=" * 70)
+    print("COMPACT MODELS")
+    print("=" * 70)
+
+    eval_images, eval_labels = load_calibration_images(eval_dir or val_dir, num_eval_samples)
+
+    def measure(name, model, path):
+        # Direct calls measure the network itself, without model.predict's per-call overhead
+        accuracy, latency, latency_p95 = _measure_backend(
+            lambda batch: model(batch, training=False).numpy(), eval_images, eval_labels
+        )
+        report[name] = {
+            'path': path,
+            'params': model.count_params(),
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            'accuracy': accuracy,
+            'latency_ms': latency,
+            'latency_p95_ms': latency_p95,
+        }
+
+    report = {}
+    if teacher_path and os.path.exists(teacher_path):
+        measure('full', keras.models.load_model(teacher_path), teacher_path)
+
+    for width in widths:
+        print(f"\nTraining compact model with width multiplier {width:g}...")
+        student, _ = train_compact_model(train_dir, val_dir, width, teacher_path, epochs, batch_size, pipeline)
+        path = f"{output_prefix}_w{width:g}.h5"
+        save_model(student, path)
+        measure(f'w{width:g}', student, path)
+
+    # Comparison table
+    print("\n" + "-" * 70)
+    print(f"{'Variant':<10}{'Params':>12}{'Size MB':>10}{'Accuracy':>11}{'p50 ms':>10}{'p95 ms':>10}")
+    print("-" * 70)
+    for name, metrics in report.items():
+        print(f"{name:<10}{metrics['params']:>12,}{metrics['size_mb']:>10.2f}{metrics['accuracy']:>11.4f}"
+              f"{metrics['latency_ms']:>10.3f}{metrics['latency_p95_ms']:>10.3f}")
+    print("=" * 70)
+
+    with open(f"{output_prefix}_report.json", 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Report saved to {output_prefix}_report.json")
+
+    return report
+
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
@@ -402,9 +1102,29 @@ if __name__ == "__main__":
     EPOCHS = 50
     BATCH_SIZE = 32
 
+    # Input pipeline: 'generator' (ImageDataGenerator), 'tfdata' (parallel decode, caching,
+    # batch augmentation; much faster on CPU), or 'compiled' (memory-mapped arrays built by
+    # dataset_compiler.py, rebuilt incrementally)
+    INPUT_PIPELINE = 'generator'
+
+    # Compiled dataset location and whether images are face-cropped like the web app
+    COMPILED_DIR = 'data_compiled'
+    COMPILE_FACE_CROP = False
+
     # Model save path
     MODEL_SAVE_PATH = 'face_emotionModel.h5'
 
+    # Data-parallel training across this many local worker processes (0 trains in this
+    # process). BATCH_SIZE is then per worker; see distributed_train.py for several hosts
+    DISTRIBUTED_WORKERS = 0
+
+    # Also export quantized TFLite models (served with INFERENCE_BACKEND=tflite)
+    EXPORT_TFLITE = True
+
+    # Also train compact depthwise-separable models distilled from the full model
+    TRAIN_COMPACT = False
+    COMPACT_WIDTHS = (0.25, 0.5, 1.0)
+
     # ========================================================================
     # TRAINING PIPELINE
     # ========================================================================
@@ -424,21 +1144,68 @@ if __name__ == "__main__":
         print("\nOnce you have prepared the dataset, update the paths in this script")
         print("and run again: python model.py")
     else:
-        # Train the model
-        model, history = train_model(
-            train_dir=TRAIN_DIR,
-            val_dir=VAL_DIR,
-            epochs=EPOCHS,
-            batch_size=BATCH_SIZE
-        )
+        train_input, val_input, test_input = TRAIN_DIR, VAL_DIR, TEST_DIR
+        if INPUT_PIPELINE == 'compiled':
+            # Compile (or incrementally update) the memory-mapped splits, then train from them
+            dataset_compiler.compile_dataset(os.path.dirname(TRAIN_DIR), COMPILED_DIR, face_crop=COMPILE_FACE_CROP)
+            train_input = os.path.join(COMPILED_DIR, 'train')
+            val_input = os.path.join(COMPILED_DIR, 'validation')
+            test_input = os.path.join(COMPILED_DIR, 'test')
+
+        if DISTRIBUTED_WORKERS > 0:
+            # Train in worker processes; the chief writes MODEL_SAVE_PATH
+            import distributed_train
+            exit_code = distributed_train.launch_local(
+                DISTRIBUTED_WORKERS,
+                train_dir=train_input,
+                val_dir=val_input,
+                epochs=EPOCHS,
+                batch_size=BATCH_SIZE,
+                pipeline=INPUT_PIPELINE,
+                model_save_path=MODEL_SAVE_PATH
+            )
+            if exit_code != 0:
+                raise SystemExit(exit_code)
+            model = keras.models.load_model(MODEL_SAVE_PATH)
+        else:
+            # Train the model
+            model, history = train_model(
+                train_dir=train_input,
+                val_dir=val_input,
+                epochs=EPOCHS,
+                batch_size=BATCH_SIZE,
+                pipeline=INPUT_PIPELINE
+            )
 
         # Evaluate on test set (if available)
         if os.path.exists(TEST_DIR):
-            evaluate_model(model, TEST_DIR, BATCH_SIZE)
+            evaluate_model(model, test_input, BATCH_SIZE, pipeline=INPUT_PIPELINE)
 
         # Save the final model
         save_model(model, MODEL_SAVE_PATH)
 
+        # Export float16/int8 TFLite models and compare them with Keras
+        if EXPORT_TFLITE:
+            export_tflite_models(
+                model,
+                calibration_dir=TRAIN_DIR,
+                eval_dir=TEST_DIR if os.path.exists(TEST_DIR) else VAL_DIR,
+                keras_path=MODEL_SAVE_PATH
+            )
+
+        # Accuracy / latency / size report for each compact width
+        if TRAIN_COMPACT:
+            compare_compact_models(
+                train_input,
+                val_input,
+                eval_dir=VAL_DIR,
+                widths=COMPACT_WIDTHS,
+                teacher_path=MODEL_SAVE_PATH,
+                epochs=EPOCHS,
+                batch_size=BATCH_SIZE,
+                pipeline=INPUT_PIPELINE
+            )
+
         print("\n" + "=" * 70)
         print("✓ ALL DONE!")
         print("=" * 70)
@@ -0,0 +1,581 @@
+"""
+Shared Model Server
+Author: Onipede-22CG031936
+
+Runs the emotion model in one dedicated process for all web workers. Each
+gunicorn worker that loads its own copy of face_emotionModel.h5 multiplies
+RAM by the worker count, and every worker's TensorFlow thread pool competes
+for the same cores. With the model server, the workers never import
+TensorFlow. They detect and crop faces, then hand the 48x48 crops to this
+process, which batches requests from all workers into shared forward passes.
+
+Transport:
+    Each worker creates a shared-memory ring of slots. A slot holds up to
+    slot_rows input faces and their output probabilities. The worker writes
+    its crops into a free slot and sends an 8-byte message (slot, rows) over
+    a Unix socket. The server runs the slot's rows in its next batch, writes
+    the probabilities back into the same slot and answers with (slot,
+    status). Nothing is pickled: tensors only ever travel through shared
+    memory.
+
+Usage:
+    # Start the server, then the web server with MODEL_SERVER_SOCKET set
+    python model_server.py -- gunicorn app:app --threads 8 --workers 4
+
+    # Or run it on its own and point workers at it
+    python model_server.py --socket /tmp/emotion-model.sock
+    MODEL_SERVER_SOCKET=/tmp/emotion-model.sock gunicorn app:app --workers 4
+"""
+
+import argparse
+import os
+import queue
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from batching import MicroBatcher, QueueFullError
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'emotion-model.sock')
+
+# Wire format (little-endian, fixed size)
+MAGIC = b'EMS1'
+HELLO = struct.Struct('<4sIIII64s')   # magic, height, width, channels, num_classes, model version
+ATTACH = struct.Struct('<II64s')      # slots, rows per slot, shared memory name
+ACK = struct.Struct('<I')             # 0 once the server has mapped the ring
+REQUEST = struct.Struct('<II')        # slot, rows
+RESPONSE = struct.Struct('<II')       # slot, status
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_OVERLOADED = 2
+
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes, or return None when the peer closed the connection"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+# ============================================================================
+# SHARED MEMORY RING
+# ============================================================================
+
+class SlotRing:
+    """
+    Fixed slots of input faces and output probabilities in one shared memory segment
+
+    Args:
+        shm: SharedMemory segment
+        slots: Number of slots
+        slot_rows: Faces per slot
+        input_shape: Shape of one face, e.g. (48, 48, 1)
+        num_classes: Model outputs per face
+    """
+
+    def __init__(self, shm, slots, slot_rows, input_shape, num_classes):
+        self.shm = shm
+        self.slots = slots
+        self.slot_rows = slot_rows
+        input_size = slots * slot_rows * int(np.prod(input_shape)) * 4
+        self.inputs = np.ndarray((slots, slot_rows) + tuple(input_shape), np.float32, shm.buf, 0)
+        self.outputs = np.ndarray((slots, slot_rows, num_classes), np.float32, shm.buf, input_size)
+
+    @staticmethod
+    def nbytes(slots, slot_rows, input_shape, num_classes):
+        return slots * slot_rows * (int(np.prod(input_shape)) + num_classes) * 4
+
+    @classmethod
+    def create(cls, slots, slot_rows, input_shape, num_classes):
+        """Allocate a new segment (worker side)"""
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(slots, slot_rows, input_shape, num_classes))
+        return cls(shm, slots, slot_rows, input_shape, num_classes)
+
+    @classmethod
+    def attach(cls, name, slots, slot_rows, input_shape, num_classes):
+        """Map a worker's segment (server side); the worker owns and unlinks it"""
+        shm = shared_memory.SharedMemory(name=name)
+        # Otherwise this process's resource tracker would unlink the worker's segment at exit
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        if shm.size < cls.nbytes(slots, slot_rows, input_shape, num_classes):
+            shm.close()
+            raise ValueError(f"Shared memory segment '{name}' is smaller than announced")
+        return cls(shm, slots, slot_rows, input_shape, num_classes)
+
+    def close(self):
+        self.inputs = self.outputs = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A view is still referenced somewhere; the mapping goes away with it
+            pass
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+class _WorkerConnection:
+    """Server-side state of one connected web worker"""
+
+    def __init__(self, sock, ring):
+        self.sock = sock
+        self.ring = ring
+        self.send_lock = threading.Lock()
+        self.pending = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def respond(self, slot, status):
+        try:
+            with self.send_lock:
+                self.sock.sendall(RESPONSE.pack(slot, status))
+        except OSError:
+            pass
+
+    def finish_one(self):
+        """A request finished; unmap the ring once the worker is gone and nothing is pending"""
+        with self.lock:
+            self.pending -= 1
+            release = self.closed and self.pending == 0
+        if release:
+            self.ring.close()
+
+
+class ModelServer:
+    """
+    Serves one model to many worker processes over Unix socket + shared memory
+
+    Args:
+        socket_path: Unix socket to listen on
+        backend: Inference backend with predict(batch)
+        model_version: Version string handed to workers (prediction cache key)
+        input_shape: Shape of one face
+        num_classes: Model outputs per face
+        max_batch_size: Maximum faces per forward pass, across all workers
+        max_wait_ms: Longest wait for a batch to fill
+        max_queue_size: Requests allowed to wait before workers are told the server is overloaded
+    """
+
+    def __init__(self, socket_path, backend, model_version, input_shape=(48, 48, 1), num_classes=7,
+                 max_batch_size=64, max_wait_ms=5.0, max_queue_size=1024):
+        self.socket_path = socket_path
+        self.backend = backend
+        self.model_version = model_version
+        self.input_shape = tuple(input_shape)
+        self.num_classes = num_classes
+        self.batcher = MicroBatcher(backend.predict, max_batch_size=max_batch_size,
+                                    max_wait_ms=max_wait_ms, max_queue_size=max_queue_size)
+        self._listener = None
+        self._connections = 0
+        self._connections_lock = threading.Lock()
+
+    def start(self):
+        """Listen on the socket and accept workers in a background thread"""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(128)
+        threading.Thread(target=self._accept_loop, name='model-server-accept', daemon=True).start()
+        print(f"Model server listening on {self.socket_path}")
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_worker, args=(sock,), name='model-server-worker', daemon=True).start()
+
+    def _serve_worker(self, sock):
+        """Handshake with one worker, then feed its requests into the shared batcher"""
+        try:
+            height, width, channels = self.input_shape
+            sock.sendall(HELLO.pack(MAGIC, height, width, channels, self.num_classes,
+                                    self.model_version.encode('ascii')[:64]))
+            data = _recv_exact(sock, ATTACH.size)
+            if data is None:
+                return
+            slots, slot_rows, name = ATTACH.unpack(data)
+            ring = SlotRing.attach(name.rstrip(b'\0').decode('ascii'), slots, slot_rows,
+                                   self.input_shape, self.num_classes)
+            sock.sendall(ACK.pack(0))
+        except (OSError, ValueError) as e:
+            print(f"Model server handshake failed: {e}")
+            sock.close()
+            return
+
+        connection = _WorkerConnection(sock, ring)
+        with self._connections_lock:
+            self._connections += 1
+        try:
+            while True:
+                data = _recv_exact(sock, REQUEST.size)
+                if data is None:
+                    break
+                slot, rows = REQUEST.unpack(data)
+                if slot >= slots or not 0 < rows <= slot_rows:
+                    connection.respond(slot, STATUS_ERROR)
+                    continue
+                with connection.lock:
+                    connection.pending += 1
+                try:
+                    # A view into the worker's slot: the batcher copies it into the batch
+                    future = self.batcher.submit_async(ring.inputs[slot, :rows])
+                except QueueFullError:
+                    connection.finish_one()
+                    connection.respond(slot, STATUS_OVERLOADED)
+                    continue
+                future.add_done_callback(
+                    lambda future, slot=slot, rows=rows: self._complete(connection, slot, rows, future))
+        except OSError:
+            pass
+        finally:
+            with self._connections_lock:
+                self._connections -= 1
+            sock.close()
+            with connection.lock:
+                connection.closed = True
+                release = connection.pending == 0
+            if release:
+                ring.close()
+
+    def _complete(self, connection, slot, rows, future):
+        """Write a finished request's probabilities into its slot and notify the worker"""
+        try:
+            if future.exception() is not None:
+                print(f"Model server inference failed: {future.exception()}")
+                connection.respond(slot, STATUS_ERROR)
+            elif not connection.closed:
+                connection.ring.outputs[slot, :rows] = future.result()
+                connection.respond(slot, STATUS_OK)
+        finally:
+            connection.finish_one()
+
+    def warm_up(self, runs=2):
+        """Run every batch size the batcher can produce once, before workers connect"""
+        for batch_size in sorted({1, self.batcher.max_batch_size}):
+            inputs = np.zeros((batch_size,) + self.input_shape, np.float32)
+            for _ in range(runs):
+                self.backend.predict(inputs)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        self.batcher.close()
+
+    def stats(self):
+        return dict(self.batcher.stats(), connected_workers=self._connections)
+
+
+# ============================================================================
+# CLIENT (used by app.py in each web worker)
+# ============================================================================
+
+class _ServerConnection:
+    """
+    One worker's connection and shared memory ring
+
+    The ring is unmapped once the connection is closed and no request thread
+    is using it any more. The server unmaps its side when the connection
+    drops and it has answered every request it accepted, and the segment's
+    name was already unlinked during the handshake, so nothing is left behind.
+    """
+
+    def __init__(self, sock, ring, model_version):
+        self.sock = sock
+        self.ring = ring
+        self.model_version = model_version
+        self.free = queue.Queue()
+        for slot in range(ring.slots):
+            self.free.put(slot)
+        self.pending = {}  # slot -> Future
+        self.send_lock = threading.Lock()
+        self.broken = False
+        self.users = 0
+        self.users_lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read_loop, name='model-server-client', daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                data = _recv_exact(self.sock, RESPONSE.size)
+                if data is None:
+                    break
+                slot, status = RESPONSE.unpack(data)
+                future = self.pending.pop(slot, None)
+                if future is not None:
+                    future.set_result(status)
+        except OSError:
+            pass
+        self.broken = True
+        for slot in list(self.pending):
+            future = self.pending.pop(slot, None)
+            if future is not None:
+                future.set_exception(ConnectionError("Lost connection to the model server"))
+
+    def send(self, slot, rows):
+        future = Future()
+        self.pending[slot] = future
+        try:
+            with self.send_lock:
+                self.sock.sendall(REQUEST.pack(slot, rows))
+        except OSError:
+            self.pending.pop(slot, None)
+            self.close()
+            raise ConnectionError("Lost connection to the model server")
+        return future
+
+    def enter(self):
+        """A request thread starts using the ring"""
+        with self.users_lock:
+            self.users += 1
+
+    def leave(self):
+        """A request thread is done with the ring; unmap it if the connection is gone"""
+        with self.users_lock:
+            self.users -= 1
+            release = self.broken and self.users == 0
+        if release:
+            self.ring.close()
+
+    def close(self):
+        with self.users_lock:
+            self.broken = True
+            release = self.users == 0
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if release:
+            self.ring.close()
+
+
+class ModelServerClient:
+    """
+    Inference backend that forwards batches to model_server.py
+
+    Exposes the same predict(batch) as the backends in inference_backends.py,
+    so the rest of app.py is unchanged. Concurrent request threads share one
+    connection; each request uses its own slots of the ring.
+
+    Args:
+        socket_path: Unix socket of the model server
+        slots: Slots in this worker's ring (requests in flight at once)
+        slot_rows: Faces per slot (larger batches are split over several slots)
+        timeout: Seconds to wait for a free slot or a result
+        connect_timeout: Seconds to keep retrying while the server starts
+    """
+
+    name = 'server'
+
+    def __init__(self, socket_path, slots=64, slot_rows=16, timeout=30.0, connect_timeout=60.0):
+        self.socket_path = socket_path
+        self.slots = slots
+        self.slot_rows = slot_rows
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._rows = 0
+        self._reconnects = 0
+        self._round_trip = 0.0
+        self._connection = self._connect(connect_timeout)
+        self.model_version = self._connection.model_version
+
+    def _connect(self, connect_timeout):
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"No model server at {self.socket_path}")
+                time.sleep(0.2)
+
+        hello = _recv_exact(sock, HELLO.size)
+        if hello is None or hello[:4] != MAGIC:
+            sock.close()
+            raise ConnectionError("Unexpected handshake from the model server")
+        _, height, width, channels, num_classes, version = HELLO.unpack(hello)
+
+        ring = SlotRing.create(self.slots, self.slot_rows, (height, width, channels), num_classes)
+        sock.sendall(ATTACH.pack(self.slots, self.slot_rows, ring.shm.name.encode('ascii')))
+        if _recv_exact(sock, ACK.size) is None:
+            ring.close()
+            ring.shm.unlink()
+            sock.close()
+            raise ConnectionError("Model server closed the connection during the handshake")
+        # Both processes have it mapped, so the name is no longer needed (nothing leaks on a crash)
+        ring.shm.unlink()
+        return _ServerConnection(sock, ring, version.rstrip(b'\0').decode('ascii'))
+
+    def _current(self):
+        """The live connection, reconnecting once after the server restarted (call with _lock held)"""
+        if self._connection.broken:
+            self._connection.close()
+            self._connection = self._connect(self.timeout)
+            self._reconnects += 1
+        return self._connection
+
+    def predict(self, batch):
+        """
+        Run a forward pass in the model server
+
+        Args:
+            batch: Float32 array of shape (N, 48, 48, 1)
+
+        Returns:
+            Array of shape (N, num_classes) with class probabilities
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            connection = self._current()
+            connection.enter()
+        try:
+            return self._predict(connection, batch)
+        finally:
+            connection.leave()
+
+    def _predict(self, connection, batch):
+        if len(batch) == 0:
+            return np.zeros((0, connection.ring.outputs.shape[-1]), np.float32)
+        started = time.perf_counter()
+
+        submitted = []
+        try:
+            for start in range(0, len(batch), self.slot_rows):
+                chunk = batch[start:start + self.slot_rows]
+                try:
+                    slot = connection.free.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise QueueFullError(f"All {self.slots} model server slots are busy")
+                connection.ring.inputs[slot, :len(chunk)] = chunk
+                submitted.append((slot, len(chunk), connection.send(slot, len(chunk))))
+
+            outputs = []
+            for slot, rows, future in submitted:
+                status = future.result(timeout=self.timeout)
+                if status == STATUS_OVERLOADED:
+                    raise QueueFullError("Model server queue is full")
+                if status != STATUS_OK:
+                    raise RuntimeError("Model server failed to run the batch")
+                outputs.append(connection.ring.outputs[slot, :rows].copy())
+        except FutureTimeoutError:
+            # (not the builtin TimeoutError before Python 3.11.) The server may still write into
+            # these slots, so the whole ring is abandoned; it is unmapped once no thread uses it
+            connection.close()
+            raise TimeoutError(f"No answer from the model server within {self.timeout}s")
+        finally:
+            # A slot is reusable once the server has answered for it (never on an abandoned ring)
+            for slot, _, future in submitted:
+                future.add_done_callback(
+                    lambda future, slot=slot: None if connection.broken else connection.free.put(slot))
+
+        with self._stats_lock:
+            self._requests += 1
+            self._rows += len(batch)
+            self._round_trip += time.perf_counter() - started
+        return np.concatenate(outputs, axis=0)
+
+    def stats(self):
+        """
+        Snapshot of this worker's model server traffic for /stats
+
+        Returns:
+            Dictionary with slot usage, request counts and mean round trip (ms)
+        """
+        connection = self._connection
+        with self._stats_lock:
+            return {
+                'socket': self.socket_path,
+                'connected': not connection.broken,
+                'slots': self.slots,
+                'slots_in_use': self.slots - connection.free.qsize(),
+                'requests': self._requests,
+                'rows': self._rows,
+                'reconnects': self._reconnects,
+                'mean_round_trip_ms': self._round_trip / self._requests * 1000.0 if self._requests else 0.0,
+            }
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the emotion model to all web workers from one process")
+    parser.add_argument('--socket', default=os.environ.get('MODEL_SERVER_SOCKET') or DEFAULT_SOCKET,
+                        help="Unix socket to listen on")
+    parser.add_argument('--max-batch-size', type=int, default=64, help="Maximum faces per forward pass")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="Longest wait for a batch to fill")
+    parser.add_argument('--max-queue', type=int, default=1024, help="Requests waiting before workers get 503")
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help="Web server command to run with MODEL_SERVER_SOCKET set, after '--'")
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+
+    # The web server gets the original environment plus the socket path
+    web_env = dict(os.environ, MODEL_SERVER_SOCKET=args.socket)
+
+    # The same backend settings as the web workers; app.py itself is never imported here
+    import serving_config
+    from prediction_cache import file_fingerprint
+
+    print("Loading model...")
+    backend = serving_config.load_served_backend()
+    server = ModelServer(
+        args.socket, backend, file_fingerprint(serving_config.SERVED_MODEL_PATH),
+        num_classes=len(serving_config.EMOTION_LABELS),
+        max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, max_queue_size=args.max_queue
+    )
+    server.warm_up()
+    server.start()
+    print(f"Model loaded ({backend.name} backend: {serving_config.SERVED_MODEL_PATH})")
+
+    stop = threading.Event()
+    child = subprocess.Popen(command, env=web_env) if command else None
+
+    def shutdown(signum, frame):
+        if child is not None and child.poll() is None:
+            child.send_signal(signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    exit_code = 0
+    if child is not None:
+        exit_code = child.wait()
+    else:
+        stop.wait()
+    server.close()
+    print(f"Model server stopped ({server.stats()['requests']} requests served)")
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
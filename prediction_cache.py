@@ -0,0 +1,242 @@
+"""
+Content-Hash Prediction Cache
+Author: Onipede-22CG031936
+
+Caches prediction results keyed by a hash of the image bytes plus the model
+version, so re-uploads of the same image skip decoding, face detection and
+the forward pass. An in-process LRU holds recent results and an optional
+SQLite table keeps them across restarts. Rows for that table go through the
+background group-commit writer when one is running, and the table is pruned
+by age and size every few hundred inserts.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import database
+
+
+INSERT_CACHE_SQL = 'INSERT OR REPLACE INTO prediction_cache (cache_key, result, created_at) VALUES (?, ?, ?)'
+# Parameters: oldest created_at to keep, number of newest rows to keep
+PRUNE_CACHE_SQL = '''
+    DELETE FROM prediction_cache WHERE created_at < ? OR cache_key IN (
+        SELECT cache_key FROM prediction_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+    )
+'''
+
+
+def file_fingerprint(filepath, chunk_size=1024 * 1024):
+    """
+    Compute a short content hash of a file (used as the model version)
+
+    Args:
+        filepath: Path of the file to hash
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        First 16 hex characters of the SHA-256 digest, or 'none' if unreadable
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return 'none'
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Two-tier (memory LRU + optional SQLite) cache of prediction results
+
+    Args:
+        model_version: Identifier of the loaded model, part of every key
+        max_entries: Maximum number of results kept in memory
+        ttl_seconds: Age after which entries are ignored (0 disables expiry)
+        db_path: SQLite database for the persistent tier (None disables it)
+        writer: database.PredictionWriter that commits persistent rows off the request
+            path (None writes them synchronously)
+        max_persistent_entries: Rows kept in the persistent tier
+        prune_every: Persistent inserts between two pruning passes
+    """
+
+    def __init__(self, model_version, max_entries=4096, ttl_seconds=86400, db_path=None, writer=None,
+                 max_persistent_entries=100000, prune_every=500):
+        self.model_version = model_version
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.db_path = db_path
+        self.writer = writer
+        self.max_persistent_entries = max(1, int(max_persistent_entries))
+        self.prune_every = max(1, int(prune_every))
+        self._inserts = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0,
+            'persist_dropped': 0,
+        }
+
+        if self.db_path:
+            self._init_table()
+
+    def _connection(self):
+        """Return this thread's SQLite connection (sqlite3 objects are per-thread)"""
+        return database.thread_connection(self.db_path)
+
+    def _init_table(self):
+        """Create the persistent cache table if it doesn't exist"""
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_prediction_cache_created ON prediction_cache (created_at)')
+        # Drop rows that expired while the app was down
+        conn.execute(PRUNE_CACHE_SQL, self._prune_params())
+        conn.commit()
+
+    def _prune_params(self):
+        oldest = time.time() - self.ttl if self.ttl > 0 else 0.0
+        return oldest, self.max_persistent_entries
+
+    def make_key(self, image, variant=''):
+        """
+        Build the cache key for an image
+
+        Args:
+            image: Encoded image bytes or a decoded numpy array
+            variant: Extra qualifier for results computed with different options
+
+        Returns:
+            String key combining the model version, variant and content hash
+        """
+        digest = hashlib.sha256()
+        if isinstance(image, np.ndarray):
+            digest.update(str(image.shape).encode())
+            digest.update(np.ascontiguousarray(image).tobytes())
+        else:
+            digest.update(image)
+        return f"{self.model_version}:{variant}:{digest.hexdigest()}"
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return result
+                del self._entries[key]
+                self._stats['expired'] += 1
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    'SELECT result, created_at FROM prediction_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading prediction cache: {e}")
+                row = None
+
+            if row is not None and not self._expired(row[1]):
+                result = json.loads(row[0])
+                self._remember(key, result, row[1])
+                with self._lock:
+                    self._stats['persistent_hits'] += 1
+                return result
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def _remember(self, key, result, created_at):
+        """Insert into the memory tier, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (created_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def put(self, key, result):
+        """
+        Store a result in both tiers
+
+        Args:
+            key: Key from make_key
+            result: JSON-serializable prediction result
+        """
+        created_at = time.time()
+        self._remember(key, result, created_at)
+
+        if self.db_path:
+            with self._lock:
+                self._inserts += 1
+                prune = self._inserts % self.prune_every == 0
+            self._persist(INSERT_CACHE_SQL, (key, json.dumps(result), created_at))
+            if prune:
+                self._persist(PRUNE_CACHE_SQL, self._prune_params())
+
+    def _persist(self, sql, params):
+        """Run a write on the persistent tier, through the background writer when there is one"""
+        if self.writer is not None:
+            # Never block the request: the cache is best effort
+            if not self.writer.enqueue(params, timeout=0, sql=sql):
+                with self._lock:
+                    self._stats['persist_dropped'] += 1
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"Error writing prediction cache: {e}")
+
+    def stats(self):
+        """
+        Snapshot of cache effectiveness
+
+        Returns:
+            Dictionary with hit/miss counters, hit ratio and memory tier size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        hits = stats['memory_hits'] + stats['persistent_hits']
+        lookups = hits + stats['misses']
+        stats['hit_ratio'] = hits / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl
+        stats['persistent'] = bool(self.db_path)
+        stats['max_persistent_entries'] = self.max_persistent_entries
+        stats['model_version'] = self.model_version
+        return stats
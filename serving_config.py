@@ -0,0 +1,59 @@
+"""
+Model Serving Settings
+Author: Onipede-22CG031936
+
+Which model file is served, through which inference backend, and the class
+labels, read from the environment. app.py and model_server.py both take
+their settings from here. Importing this module has no side effects, so the
+model server loads the model exactly as a web worker would without running
+any of app.py's startup code (detectors, database, upload store).
+"""
+
+import os
+
+from inference_backends import load_backend
+
+
+# Emotion labels (adjust based on your model's output classes)
+EMOTION_LABELS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+
+# Inference backend: 'compiled' serves the .h5 model through a fixed-signature tf.function,
+# 'keras' through model.predict, 'tflite' serves a quantized export from model.py
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'compiled')
+# Batch sizes the compiled backend pads inputs to when XLA is on (one XLA program each;
+# without XLA there is a single graph and the largest size only caps rows per call), and XLA on/off
+COMPILED_BUCKETS = [int(b) for b in os.environ.get('COMPILED_BUCKETS', '1,2,4,8,16,32,64').split(',')]
+COMPILED_XLA = os.environ.get('COMPILED_XLA', '0') == '1'
+TFLITE_MODEL_PATH = os.environ.get('TFLITE_MODEL_PATH', 'face_emotionModel_int8.tflite')
+TFLITE_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', 0)) or None
+# Batch sizes the TFLite backend pads inputs to (one interpreter allocated for each, on first use)
+TFLITE_BUCKETS = [int(b) for b in os.environ.get('TFLITE_BUCKETS', '1,2,3,4,6,8,12,16,24,32,48,64').split(',')]
+
+# The pre-trained emotion detection model, and the file the configured backend serves
+MODEL_PATH = 'face_emotionModel.h5'
+SERVED_MODEL_PATH = TFLITE_MODEL_PATH if INFERENCE_BACKEND == 'tflite' else MODEL_PATH
+
+
+def load_served_backend(backend=None, model_path=None, buckets=None, jit_compile=None, num_threads=None):
+    """
+    Load the configured inference backend in this process
+
+    Args:
+        backend: Backend name (defaults to INFERENCE_BACKEND)
+        model_path: Model file (defaults to SERVED_MODEL_PATH)
+        buckets: Batch buckets (defaults to COMPILED_BUCKETS or TFLITE_BUCKETS)
+        jit_compile: Compiled backend XLA switch (defaults to COMPILED_XLA)
+        num_threads: TFLite interpreter threads (defaults to TFLITE_NUM_THREADS)
+
+    Returns:
+        Backend with a predict(batch) method
+    """
+    backend = backend or INFERENCE_BACKEND
+    backend_options = {}
+    if backend == 'tflite':
+        backend_options['num_threads'] = num_threads if num_threads is not None else TFLITE_NUM_THREADS
+        backend_options['buckets'] = buckets if buckets is not None else TFLITE_BUCKETS
+    elif backend == 'compiled':
+        backend_options['buckets'] = buckets if buckets is not None else COMPILED_BUCKETS
+        backend_options['jit_compile'] = jit_compile if jit_compile is not None else COMPILED_XLA
+    return load_backend(backend, model_path or SERVED_MODEL_PATH, **backend_options)
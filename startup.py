@@ -0,0 +1,106 @@
+"""
+Startup Tracking and Readiness
+Author: Onipede-22CG031936
+
+Measures each phase of worker startup (imports, database, model load,
+warm-up) and tracks whether the worker is ready to serve traffic, so the
+/healthz and /readyz probes can keep the load balancer away from cold workers.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTracker:
+    """
+    Records startup phase durations and the worker's readiness state
+
+    States: 'starting' -> 'warming' -> 'ready', or 'failed' if a required
+    phase raised an exception.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._phases = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.state = 'starting'
+        self.error = None
+
+    def record(self, name, seconds):
+        """
+        Record a phase that was timed elsewhere
+
+        Args:
+            name: Phase name
+            seconds: Duration in seconds
+        """
+        with self._lock:
+            self._phases.append({'phase': name, 'ms': round(seconds * 1000.0, 2)})
+        print(f"Startup phase '{name}': {seconds * 1000.0:.1f} ms")
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the body of a with-block as a named startup phase
+
+        Args:
+            name: Phase name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def set_state(self, state):
+        """Move to 'warming' (or any other non-terminal state)"""
+        self.state = state
+
+    def mark_ready(self):
+        """Mark the worker as ready to receive traffic"""
+        self.state = 'ready'
+        self.record('total_until_ready', time.perf_counter() - self._origin)
+        self._ready.set()
+
+    def mark_failed(self, error):
+        """Mark startup as failed; waiters are released so requests fail fast"""
+        self.state = 'failed'
+        self.error = str(error)
+        print(f"Startup failed: {error}")
+        self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """
+        Block until startup finished (ready or failed)
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Boolean indicating whether the worker is ready
+        """
+        self._ready.wait(timeout)
+        return self.state == 'ready'
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def report(self):
+        """
+        Snapshot of startup progress
+
+        Returns:
+            Dictionary with state, error, uptime and the list of timed phases
+        """
+        with self._lock:
+            phases = list(self._phases)
+        return {
+            'state': self.state,
+            'error': self.error,
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'phases': phases,
+        }
@@ -0,0 +1,449 @@
+"""
+Upload Storage
+Author: Onipede-22CG031936
+
+Keeps disk I/O for uploaded images off the request's critical path. Uploads
+are decoded from memory for prediction, and the original bytes are handed
+to a background writer thread when they need to be kept for the results page.
+
+Kept uploads live in a content-addressed store: each image is stored once,
+under its SHA-256 hash, in sharded directories, with a small JPEG thumbnail
+for the results page. A background thread evicts the least recently used
+images when the store exceeds its size or age budget, and marks the
+predictions that referenced them as evicted. Only one process runs
+eviction at a time (the one holding the store's evict.lock).
+"""
+
+import atexit
+import hashlib
+import io
+import os
+import queue
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import database
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server process evicts
+    fcntl = None
+
+
+class BackgroundWriter:
+    """
+    Background thread that persists uploaded image bytes to disk
+
+    Args:
+        max_pending: Maximum number of writes waiting in the queue; when full,
+            writes happen synchronously in the caller so no upload is lost
+    """
+
+    def __init__(self, max_pending=256):
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._written = 0
+        self._failed = 0
+        self._sync_writes = 0
+        self._bytes = 0
+        self._write_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='upload-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, filepath, data):
+        """
+        Schedule the bytes to be written to filepath
+
+        Args:
+            filepath: Destination path of the file
+            data: Raw file contents, or a callable producing them in the writer thread
+        """
+        try:
+            self._queue.put_nowait((filepath, data))
+        except queue.Full:
+            with self._lock:
+                self._sync_writes += 1
+            self._write(filepath, data)
+
+    def _write(self, filepath, data):
+        """Write a file atomically so readers never see a partial image"""
+        start = time.perf_counter()
+        tmp_path = f"{filepath}.{threading.get_ident()}.tmp"
+        try:
+            if callable(data):
+                data = data()
+            os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, filepath)
+        except Exception as e:
+            print(f"Error saving upload {filepath}: {e}")
+            with self._lock:
+                self._failed += 1
+            return
+
+        with self._lock:
+            self._written += 1
+            self._bytes += len(data)
+            self._write_time += time.perf_counter() - start
+
+    def _run(self):
+        """Worker loop draining the write queue"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued write has been completed"""
+        self._queue.join()
+
+    def close(self, timeout=10.0):
+        """Flush pending writes and stop the worker thread"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def stats(self):
+        """
+        Snapshot of writer activity
+
+        Returns:
+            Dictionary with pending/written/failed counts and mean write time (ms)
+        """
+        with self._lock:
+            return {
+                'pending': self._queue.qsize(),
+                'written': self._written,
+                'failed': self._failed,
+                'sync_writes': self._sync_writes,
+                'bytes_written': self._bytes,
+                'mean_write_ms': self._write_time / self._written * 1000.0 if self._written else 0.0,
+            }
+
+
+def make_thumbnail(data, max_size=256, quality=80):
+    """
+    Encode a small JPEG preview of an image
+
+    Args:
+        data: Encoded image bytes
+        max_size: Longest side of the thumbnail in pixels
+        quality: JPEG quality
+
+    Returns:
+        JPEG bytes
+    """
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        # OpenCV cannot decode GIF, fall back to Pillow for the first frame
+        with Image.open(io.BytesIO(data)) as pil_image:
+            img = cv2.cvtColor(np.array(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    height, width = img.shape[:2]
+    scale = max_size / max(height, width)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+UPLOAD_OBJECTS_SQL = """
+    CREATE TABLE IF NOT EXISTS upload_objects (
+        key TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        thumb_size INTEGER NOT NULL DEFAULT 0,
+        created REAL NOT NULL,
+        last_access REAL NOT NULL
+    )
+"""
+
+# Objects read per eviction query
+EVICT_BATCH = 256
+
+# Object keys look like 'ab/cd/<64 hex chars>.<ext>'
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]{1,5}$')
+
+
+class UploadStore:
+    """
+    Content-addressed upload storage with thumbnails and LRU eviction
+
+    Objects are stored as <root>/objects/ab/cd/<sha256>.<ext> and their
+    thumbnails as <root>/thumbs/ab/cd/<sha256>.jpg. An upload_objects table
+    in the app database tracks size and last access for eviction; it is
+    shared by all workers, so the budget applies to the whole server.
+
+    Args:
+        root: Directory of the store
+        db_path: SQLite database holding upload_objects and predictions
+        writer: BackgroundWriter used for object and thumbnail writes
+        max_bytes: Total size budget for objects plus thumbnails (0 disables)
+        max_age_seconds: Objects older than this are evicted (0 disables)
+        evict_interval: Seconds between eviction passes
+        thumbnail_size: Longest side of thumbnails in pixels
+    """
+
+    def __init__(self, root, db_path, writer, max_bytes=0, max_age_seconds=0,
+                 evict_interval=60.0, thumbnail_size=256):
+        self.root = root
+        self.db_path = db_path
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_interval = evict_interval
+        self.thumbnail_size = thumbnail_size
+
+        self._lock = threading.Lock()
+        self._stored = 0
+        self._deduplicated = 0
+        self._evicted = 0
+        self._evicted_bytes = 0
+        self._evict_lock_file = None
+
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'thumbs'), exist_ok=True)
+        conn = database.thread_connection(db_path)
+        with conn:
+            conn.execute(UPLOAD_OBJECTS_SQL)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_objects_access ON upload_objects (last_access)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_objects_created ON upload_objects (created)')
+
+        self._stop = threading.Event()
+        self._thread = None
+        if evict_interval and (max_bytes or max_age_seconds):
+            self._thread = threading.Thread(target=self._evict_loop, name='upload-evictor', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @staticmethod
+    def make_key(digest, extension):
+        """Sharded object key for a hex digest"""
+        return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension.lower()}'
+
+    def object_path(self, key):
+        return os.path.join(self.root, 'objects', key)
+
+    def thumbnail_path(self, key):
+        return os.path.join(self.root, 'thumbs', key.rsplit('.', 1)[0] + '.jpg')
+
+    def _register(self, key, size):
+        """
+        Record an object, or refresh its last access if it is already stored
+
+        Returns:
+            Boolean indicating whether the object must be written
+        """
+        now = time.time()
+        conn = database.thread_connection(self.db_path)
+        with conn:
+            if conn.execute('UPDATE upload_objects SET last_access = ? WHERE key = ?', (now, key)).rowcount:
+                # A row whose file is missing (write failed, or still queued) is written again
+                if os.path.exists(self.object_path(key)):
+                    with self._lock:
+                        self._deduplicated += 1
+                    return False
+                with self._lock:
+                    self._stored += 1
+                return True
+            conn.execute(
+                'INSERT OR IGNORE INTO upload_objects (key, size, created, last_access) VALUES (?, ?, ?, ?)',
+                (key, size, now, now)
+            )
+            # A re-uploaded image makes its earlier predictions point at a valid object again
+            conn.execute('UPDATE predictions SET image_evicted = 0 WHERE image_filename = ? AND image_evicted = 1',
+                         (key,))
+        with self._lock:
+            self._stored += 1
+        return True
+
+    def _write_thumbnail(self, key, data):
+        """Build a thumbnail in the writer thread and record its size"""
+        thumbnail = make_thumbnail(data, self.thumbnail_size)
+        conn = database.thread_connection(self.db_path)
+        with conn:
+            conn.execute('UPDATE upload_objects SET thumb_size = ? WHERE key = ?', (len(thumbnail), key))
+        return thumbnail
+
+    def put(self, data, extension):
+        """
+        Store uploaded bytes (written in the background) and return their key
+
+        Args:
+            data: Encoded image bytes
+            extension: File extension without the dot
+
+        Returns:
+            Object key, stored in predictions.image_filename
+        """
+        key = self.make_key(hashlib.sha256(data).hexdigest(), extension)
+        if self._register(key, len(data)):
+            self.writer.submit(self.object_path(key), data)
+            self.writer.submit(self.thumbnail_path(key), lambda: self._write_thumbnail(key, data))
+        return key
+
+    def put_file(self, path, extension):
+        """
+        Move a file that was saved to disk into the store (synchronously)
+
+        Args:
+            path: Saved upload; it is moved or removed
+            extension: File extension without the dot
+
+        Returns:
+            Object key, stored in predictions.image_filename
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        key = self.make_key(digest.hexdigest(), extension)
+
+        if self._register(key, os.path.getsize(path)):
+            os.makedirs(os.path.dirname(self.object_path(key)), exist_ok=True)
+            os.replace(path, self.object_path(key))
+            self.writer.submit(self.thumbnail_path(key), lambda: self._write_thumbnail(key, self._read(key)))
+        else:
+            os.remove(path)
+        return key
+
+    def _read(self, key):
+        with open(self.object_path(key), 'rb') as f:
+            return f.read()
+
+    def touch(self, key):
+        """Mark an object as recently used (called when its thumbnail is served)"""
+        conn = database.thread_connection(self.db_path)
+        with conn:
+            conn.execute('UPDATE upload_objects SET last_access = ? WHERE key = ?', (time.time(), key))
+
+    def evict(self):
+        """
+        Run one eviction pass: expire old objects, then drop the least recently
+        used ones until the store fits its size budget
+
+        Returns:
+            Dictionary with the number of objects and bytes evicted
+        """
+        conn = database.thread_connection(self.db_path)
+        evicted = evicted_bytes = 0
+
+        # Only candidates are read, a batch at a time: first every expired object...
+        if self.max_age_seconds:
+            expiry = time.time() - self.max_age_seconds
+            while True:
+                rows = conn.execute(
+                    'SELECT key, size + thumb_size, last_access FROM upload_objects WHERE created < ? '
+                    'ORDER BY created LIMIT ?', (expiry, EVICT_BATCH)
+                ).fetchall()
+                removed = [size for key, size, last_access in rows if self._remove(conn, key, last_access)]
+                evicted += len(removed)
+                evicted_bytes += sum(removed)
+                if len(rows) < EVICT_BATCH:
+                    break
+
+        # ...then the least recently used ones while the store is over budget
+        if self.max_bytes:
+            total = conn.execute('SELECT COALESCE(SUM(size + thumb_size), 0) FROM upload_objects').fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute(
+                    'SELECT key, size + thumb_size, last_access FROM upload_objects ORDER BY last_access LIMIT ?',
+                    (EVICT_BATCH,)
+                ).fetchall()
+                progress = False
+                for key, size, last_access in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if self._remove(conn, key, last_access):
+                        total -= size
+                        evicted += 1
+                        evicted_bytes += size
+                        progress = True
+                if not progress:
+                    break
+
+        with self._lock:
+            self._evicted += evicted
+            self._evicted_bytes += evicted_bytes
+        if evicted:
+            print(f"Evicted {evicted} upload(s), {evicted_bytes / (1024 * 1024):.1f} MB")
+        return {'evicted': evicted, 'evicted_bytes': evicted_bytes}
+
+    def _remove(self, conn, key, last_access):
+        """Delete one object unless it was used again since it was selected"""
+        with conn:
+            if not conn.execute('DELETE FROM upload_objects WHERE key = ? AND last_access = ?',
+                                (key, last_access)).rowcount:
+                return False
+            conn.execute('UPDATE predictions SET image_evicted = 1 WHERE image_filename = ?', (key,))
+        for path in (self.object_path(key), self.thumbnail_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _is_evictor(self):
+        """
+        Whether this process runs eviction: the first worker to lock evict.lock
+        keeps it for its lifetime, and another takes over when that process exits
+        """
+        if fcntl is None or self._evict_lock_file is not None:
+            return True
+        lock_file = open(os.path.join(self.root, 'evict.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._evict_lock_file = lock_file
+        return True
+
+    def _evict_loop(self):
+        while not self._stop.wait(self.evict_interval):
+            try:
+                if self._is_evictor():
+                    self.evict()
+            except Exception as e:
+                print(f"Upload eviction failed: {e}")
+
+    def close(self):
+        """Stop the eviction thread and hand eviction over to another process"""
+        self._stop.set()
+        if self._evict_lock_file is not None:
+            self._evict_lock_file.close()
+            self._evict_lock_file = None
+
+    def stats(self):
+        """
+        Snapshot of store activity
+
+        Returns:
+            Dictionary with stored/deduplicated/evicted counts and the current store size
+        """
+        conn = database.thread_connection(self.db_path)
+        objects, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size + thumb_size), 0) FROM upload_objects'
+        ).fetchone()
+        with self._lock:
+            return {
+                'objects': objects,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'stored': self._stored,
+                'deduplicated': self._deduplicated,
+                'evicted': self._evicted,
+                'evicted_bytes': self._evicted_bytes,
+            }
@@ -0,0 +1,14 @@
+"""
+Shared pytest setup
+Author: Onipede-22CG031936
+
+The modules live at the repository root, not in a package, so the root is put
+on sys.path for the tests to import them the way app.py does.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,119 @@
+"""
+Tests for admission control and load shedding
+Author: Onipede-22CG031936
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_client_over_its_rate_gets_429():
+    controller = AdmissionController(rate=1.0, burst=2)
+    for _ in range(2):
+        controller.admit('alice').release()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('alice')
+    assert rejected.value.status == 429
+    assert rejected.value.reason == 'rate_limited'
+    assert rejected.value.retry_after >= 1
+
+    # Other clients have their own buckets
+    controller.admit('bob').release()
+    assert controller.stats()['shed']['rate_limited'] == 1
+
+
+def test_full_queue_is_shed_with_503():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, rate=0)
+    running = controller.admit(None)
+    queued = controller.request(None)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.request(None)
+    assert (rejected.value.status, rejected.value.reason) == (503, 'queue_full')
+
+    running.release()
+    queued.result(1).release()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_request_that_cannot_start_before_its_deadline_is_shed_at_once():
+    controller = AdmissionController(max_in_flight=1, max_queue=8, rate=0, initial_service_ms=1000)
+    running = controller.admit(None)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(None, timeout=0.2)
+    assert rejected.value.reason == 'deadline'
+    assert time.monotonic() - started < 0.1
+    running.release()
+
+
+def test_queued_request_expires_at_its_deadline_and_leaves_the_queue():
+    controller = AdmissionController(max_in_flight=1, max_queue=8, rate=0, initial_service_ms=1)
+    running = controller.admit(None)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(None, timeout=0.1)
+    assert rejected.value.reason == 'deadline'
+    assert controller.stats()['queue_depth'] == 0
+
+    running.release()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    controller = AdmissionController(max_in_flight=1, max_queue=8, rate=0)
+    running = controller.admit(None)
+    first, second = controller.request(None), controller.request(None)
+
+    running.release()
+    assert first.done() and not second.done()
+    first.result().release()
+    second.result(1).release()
+    assert controller.stats()['completed'] == 3
+
+
+def test_waiter_past_its_deadline_is_skipped_when_a_slot_frees():
+    controller = AdmissionController(max_in_flight=1, max_queue=8, rate=0, initial_service_ms=1)
+    running = controller.admit(None)
+    stale = controller.request(None, timeout=0.05)
+    fresh = controller.request(None)
+    time.sleep(0.1)
+
+    running.release()
+    with pytest.raises(AdmissionRejected):
+        stale.result(1)
+    fresh.result(1).release()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_concurrent_releases_free_the_slot_once():
+    controller = AdmissionController(max_in_flight=2, rate=0)
+    for _ in range(50):
+        ticket = controller.admit(None)
+        threads = [threading.Thread(target=ticket.release) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert controller.stats()['in_flight'] == 0
+    assert controller.stats()['completed'] == 50
+
+
+def test_cancelled_async_waiter_does_not_keep_a_slot():
+    controller = AdmissionController(max_in_flight=1, max_queue=8, rate=0)
+    running = controller.admit(None)
+
+    async def cancel_while_queued():
+        task = asyncio.ensure_future(controller.admit_async(None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_queued())
+    assert controller.stats()['queue_depth'] == 0
+    running.release()
+    assert controller.stats()['in_flight'] == 0
@@ -0,0 +1,141 @@
+"""
+Tests for the micro-batching scheduler
+Author: Onipede-22CG031936
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher, QueueFullError
+
+
+class GatedModel:
+    """predict_fn that records batch sizes and can hold a call until released"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, inputs):
+        self.batches.append(len(inputs))
+        self.started.set()
+        self.gate.wait(5)
+        return inputs * 10
+
+
+def rows(value, n=1):
+    return np.full((n, 1), value, np.float32)
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = GatedModel()
+    model.gate.clear()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+    try:
+        # The first request occupies the model; the next three queue up behind it
+        first = batcher.submit_async(rows(1))
+        assert model.started.wait(5)
+        futures = [batcher.submit_async(rows(value, 2)) for value in (2, 3, 4)]
+        model.gate.set()
+
+        np.testing.assert_array_equal(first.result(5), rows(10))
+        for value, future in zip((2, 3, 4), futures):
+            np.testing.assert_array_equal(future.result(5), rows(value * 10, 2))
+        assert model.batches == [1, 6]
+        assert batcher.stats()['requests'] == 4
+    finally:
+        batcher.close()
+
+
+def test_request_that_does_not_fit_is_carried_to_the_next_batch():
+    model = GatedModel()
+    model.gate.clear()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+    try:
+        blocker = batcher.submit_async(rows(0))
+        assert model.started.wait(5)
+        futures = [batcher.submit_async(rows(value, 3)) for value in (1, 2)]
+        model.gate.set()
+
+        blocker.result(5)
+        for value, future in zip((1, 2), futures):
+            np.testing.assert_array_equal(future.result(5), rows(value * 10, 3))
+        assert model.batches == [1, 3, 3]
+    finally:
+        batcher.close()
+
+
+def test_oversized_request_bypasses_the_queue():
+    model = GatedModel()
+    batcher = MicroBatcher(model, max_batch_size=2)
+    try:
+        np.testing.assert_array_equal(batcher.submit(rows(5, 3)), rows(50, 3))
+        assert model.batches == [3]
+        assert batcher.stats()['requests'] == 0
+    finally:
+        batcher.close()
+
+
+def test_full_queue_rejects_new_requests():
+    model = GatedModel()
+    model.gate.clear()
+    batcher = MicroBatcher(model, max_batch_size=1, max_queue_size=1)
+    try:
+        running = batcher.submit_async(rows(1))
+        assert model.started.wait(5)
+        queued = batcher.submit_async(rows(2))
+        with pytest.raises(QueueFullError):
+            batcher.submit_async(rows(3))
+        assert batcher.stats()['rejected'] == 1
+
+        model.gate.set()
+        running.result(5)
+        queued.result(5)
+    finally:
+        model.gate.set()
+        batcher.close()
+
+
+def test_model_error_fails_every_request_in_the_batch_and_the_batcher_keeps_running():
+    calls = []
+
+    def predict(inputs):
+        calls.append(len(inputs))
+        if len(calls) == 1:
+            raise ValueError('bad batch')
+        return inputs
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=20)
+    try:
+        futures = [batcher.submit_async(rows(value)) for value in (1, 2)]
+        for future in futures:
+            with pytest.raises(ValueError, match='bad batch'):
+                future.result(5)
+        assert batcher.stats()['errors'] == 1
+
+        np.testing.assert_array_equal(batcher.submit(rows(7), timeout=5), rows(7))
+    finally:
+        batcher.close()
+
+
+def test_close_drains_queued_requests_and_refuses_new_ones():
+    model = GatedModel()
+    model.gate.clear()
+    batcher = MicroBatcher(model, max_batch_size=1, max_wait_ms=1)
+    running = batcher.submit_async(rows(1))
+    assert model.started.wait(5)
+    queued = batcher.submit_async(rows(2))
+
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    model.gate.set()
+    closer.join(10)
+
+    np.testing.assert_array_equal(running.result(5), rows(10))
+    np.testing.assert_array_equal(queued.result(5), rows(20))
+    with pytest.raises(RuntimeError):
+        batcher.submit_async(rows(3))
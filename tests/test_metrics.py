@@ -0,0 +1,105 @@
+"""
+Tests for metrics snapshot aggregation across workers
+Author: Onipede-22CG031936
+"""
+
+import os
+
+import metrics
+from metrics import MetricsRegistry
+
+
+def make_registry(directory=None):
+    registry = MetricsRegistry(directory, flush_interval=3600)
+    registry.counter('requests_total', 'Requests')
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    return registry
+
+
+def samples(text):
+    """Metric lines of a Prometheus exposition as {series: value}"""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            series, value = line.rsplit(' ', 1)
+            result[series] = float(value)
+    return result
+
+
+def test_histogram_buckets_are_rendered_cumulatively():
+    registry = make_registry()
+    for value in (0.05, 0.5, 0.5, 3.0):
+        registry.observe('latency_seconds', value, stage='infer')
+    registry.inc('requests_total', route='/predict')
+    registry.inc('requests_total', 2, route='/predict')
+
+    rendered = samples(registry.render())
+    assert rendered['requests_total{route="/predict"}'] == 3
+    assert rendered['latency_seconds_bucket{stage="infer",le="0.1"}'] == 1
+    assert rendered['latency_seconds_bucket{stage="infer",le="1.0"}'] == 3
+    assert rendered['latency_seconds_bucket{stage="infer",le="+Inf"}'] == 4
+    assert rendered['latency_seconds_count{stage="infer"}'] == 4
+    assert abs(rendered['latency_seconds_sum{stage="infer"}'] - 4.05) < 1e-9
+
+
+def test_scrape_sums_the_snapshots_of_every_worker(tmp_path):
+    first, second = make_registry(str(tmp_path)), make_registry(str(tmp_path))
+    try:
+        first.inc('requests_total', route='/predict')
+        second.inc('requests_total', 2, route='/predict')
+        second.inc('requests_total', route='/api')
+        second.observe('latency_seconds', 0.5, stage='infer')
+        second.flush()
+
+        rendered = samples(first.render())
+        assert rendered['requests_total{route="/predict"}'] == 3
+        assert rendered['requests_total{route="/api"}'] == 1
+        assert rendered['latency_seconds_count{stage="infer"}'] == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_exited_worker_totals_are_kept_after_its_file_is_removed(tmp_path):
+    first, second = make_registry(str(tmp_path)), make_registry(str(tmp_path))
+    try:
+        first.inc('requests_total', route='/predict')
+        second.inc('requests_total', 4, route='/predict')
+        first.flush()
+        second.close()
+
+        workers = [name for name in os.listdir(tmp_path) if name.startswith('worker-') and name.endswith('.json')]
+        assert len(workers) == 1
+        assert samples(first.render())['requests_total{route="/predict"}'] == 5
+
+        # A replacement worker adds to the totals instead of starting from zero
+        third = make_registry(str(tmp_path))
+        third.inc('requests_total', route='/predict')
+        third.flush()
+        assert samples(first.render())['requests_total{route="/predict"}'] == 6
+        third.close()
+    finally:
+        first.close()
+
+
+def test_snapshot_of_a_killed_worker_is_retired_on_the_next_scrape(tmp_path):
+    registry = make_registry(str(tmp_path))
+    try:
+        # pid far above any real pid: the worker that wrote it no longer exists
+        dead = tmp_path / 'worker-999999999-1.json'
+        metrics._write_snapshot(str(dead), {
+            'counters': [['requests_total', {'route': '/predict'}, 7]],
+            'histograms': [['latency_seconds', {'stage': 'infer'}, [1, 0], 0.05, 1]],
+        })
+        registry.inc('requests_total', route='/predict')
+
+        rendered = samples(registry.render())
+        assert rendered['requests_total{route="/predict"}'] == 8
+        assert rendered['latency_seconds_bucket{stage="infer",le="0.1"}'] == 1
+        assert not dead.exists()
+        assert (tmp_path / metrics.RETIRED_SNAPSHOT).exists()
+
+        # Retired totals are counted once, not again on every scrape
+        assert samples(registry.render())['requests_total{route="/predict"}'] == 8
+    finally:
+        registry.close()
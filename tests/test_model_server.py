@@ -0,0 +1,149 @@
+"""
+Tests for the shared model server and its shared-memory ring
+Author: Onipede-22CG031936
+"""
+
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import QueueFullError
+from model_server import ModelServer, ModelServerClient
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="the model server uses Unix sockets")
+
+NUM_CLASSES = 7
+
+
+class EchoBackend:
+    """Returns each face's first pixel in every output, and can hold a batch until released"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict(self, batch):
+        self.batches.append(len(batch))
+        self.started.set()
+        self.gate.wait(5)
+        return np.repeat(batch.reshape(len(batch), -1)[:, :1], NUM_CLASSES, axis=1)
+
+
+def faces(values):
+    batch = np.zeros((len(values), 48, 48, 1), np.float32)
+    batch[:, 0, 0, 0] = values
+    return batch
+
+
+@pytest.fixture
+def backend():
+    backend = EchoBackend()
+    yield backend
+    backend.gate.set()
+
+
+@pytest.fixture
+def start_server(tmp_path, backend):
+    servers, clients = [], []
+
+    def start(max_queue_size=1024, **client_options):
+        server = ModelServer(str(tmp_path / 'model.sock'), backend, 'test-version',
+                             max_batch_size=64, max_wait_ms=1, max_queue_size=max_queue_size)
+        server.start()
+        servers.append(server)
+        client = ModelServerClient(server.socket_path, connect_timeout=5, **client_options)
+        clients.append(client)
+        return server, client
+
+    yield start
+    for client in clients:
+        client._connection.close()
+    for server in servers:
+        server.close()
+
+
+def run_in_thread(fn, *args):
+    result = {}
+
+    def target():
+        try:
+            result['value'] = fn(*args)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, result
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_request_larger_than_a_slot_is_split_and_reassembled_in_order(start_server):
+    _, client = start_server(slots=8, slot_rows=4)
+    values = np.arange(1, 11, dtype=np.float32)
+
+    outputs = client.predict(faces(values))
+
+    assert client.model_version == 'test-version'
+    assert outputs.shape == (10, NUM_CLASSES)
+    np.testing.assert_array_equal(outputs[:, 0], values)
+    assert client.stats()['rows'] == 10
+    assert client.stats()['slots_in_use'] == 0
+    assert client.predict(faces([])).shape == (0, NUM_CLASSES)
+
+
+def test_full_server_queue_is_reported_as_overload(start_server, backend):
+    server, client = start_server(max_queue_size=1)
+    backend.gate.clear()
+    running, _ = run_in_thread(client.predict, faces([1]))
+    assert backend.started.wait(5)
+    queued, queued_result = run_in_thread(client.predict, faces([2]))
+    wait_for(lambda: server.batcher.stats()['queue_depth'] == 1)
+
+    with pytest.raises(QueueFullError):
+        client.predict(faces([3]))
+
+    backend.gate.set()
+    running.join(5)
+    queued.join(5)
+    np.testing.assert_array_equal(queued_result['value'][:, 0], [2])
+
+
+def test_busy_slots_are_reported_as_overload(start_server, backend):
+    _, client = start_server(slots=1, slot_rows=4, timeout=0.2)
+    backend.gate.clear()
+    running, _ = run_in_thread(client.predict, faces([1]))
+    assert backend.started.wait(5)
+
+    with pytest.raises(QueueFullError):
+        client.predict(faces([2]))
+
+    backend.gate.set()
+    running.join(5)
+
+
+def test_timeout_abandons_and_unmaps_the_ring_then_reconnects(start_server, backend):
+    _, client = start_server(slots=4, slot_rows=4, timeout=0.2)
+    ring = client._connection.ring
+    backend.gate.clear()
+
+    with pytest.raises(TimeoutError):
+        client.predict(faces([1]))
+
+    assert client._connection.broken
+    assert ring.inputs is None and ring.shm.buf is None
+
+    backend.gate.set()
+    client.timeout = 5
+    np.testing.assert_array_equal(client.predict(faces([4, 5]))[:, 0], [4, 5])
+    assert client.stats()['reconnects'] == 1
@@ -0,0 +1,105 @@
+"""
+Tests for the group-commit prediction writer
+Author: Onipede-22CG031936
+"""
+
+from datetime import datetime
+
+import pytest
+
+import database
+from database import PredictionWriter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    conn = database.connect(path)
+    with conn:
+        conn.execute('''
+            CREATE TABLE predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_name TEXT NOT NULL,
+                image_filename TEXT,
+                predicted_emotion TEXT NOT NULL,
+                confidence_score REAL NOT NULL,
+                timestamp DATETIME NOT NULL,
+                face_index INTEGER NOT NULL DEFAULT 0,
+                face_box TEXT,
+                image_stored INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        conn.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT)')
+    conn.close()
+    return path
+
+
+def prediction(user='alice', emotion='Happy'):
+    return (user, None, emotion, 90.0, datetime.now(), 0, None, 0)
+
+
+def count_rows(db_path, table='predictions'):
+    conn = database.connect(db_path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_flush_waits_until_queued_rows_are_committed_in_groups(db_path):
+    writer = PredictionWriter(db_path, max_batch=10, max_delay_ms=50)
+    try:
+        for _ in range(25):
+            assert writer.enqueue(prediction())
+        writer.flush()
+
+        assert count_rows(db_path) == 25
+        stats = writer.stats()
+        assert stats['rows_written'] == 25
+        assert stats['pending'] == 0
+        assert 3 <= stats['commits'] < 25
+    finally:
+        writer.close()
+
+
+def test_close_commits_outstanding_rows_and_refuses_new_ones(db_path):
+    writer = PredictionWriter(db_path, max_batch=500, max_delay_ms=10000)
+    for _ in range(5):
+        writer.enqueue(prediction())
+    writer.close()
+
+    assert count_rows(db_path) == 5
+    assert not writer.enqueue(prediction())
+    writer.flush()  # returns at once instead of waiting for a stopped thread
+
+
+def test_failing_cache_statement_does_not_roll_back_prediction_rows(db_path):
+    # All four statements land in one batch
+    writer = PredictionWriter(db_path, max_batch=4, max_delay_ms=10000)
+    try:
+        writer.enqueue(prediction())
+        writer.enqueue(('k',), sql='INSERT INTO missing_table (key) VALUES (?)')
+        writer.enqueue(prediction())
+        writer.enqueue(('k', 'v'), sql='INSERT INTO cache (key, value) VALUES (?, ?)')
+        writer.flush()
+
+        assert count_rows(db_path) == 2
+        stats = writer.stats()
+        assert stats['rows_written'] == 2
+        assert stats['failed_rows'] == 2  # the bad statement's transaction, including the good cache row
+    finally:
+        writer.close()
+
+
+def test_failed_batch_does_not_stop_the_writer(db_path):
+    writer = PredictionWriter(db_path, max_batch=10, max_delay_ms=20)
+    try:
+        writer.enqueue(prediction(user=None))  # violates NOT NULL
+        writer.flush()
+        assert writer.stats()['failed_rows'] == 1
+
+        writer.enqueue(prediction())
+        writer.flush()
+        assert count_rows(db_path) == 1
+    finally:
+        writer.close()
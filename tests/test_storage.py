@@ -0,0 +1,146 @@
+"""
+Tests for the content-addressed upload store and its eviction
+Author: Onipede-22CG031936
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import database
+import storage
+from storage import BackgroundWriter, UploadStore
+
+
+def image_bytes(seed, size=64):
+    pixels = np.random.RandomState(seed).randint(0, 255, (size, size, 3), dtype=np.uint8)
+    return cv2.imencode('.png', pixels)[1].tobytes()
+
+
+@pytest.fixture
+def writer():
+    writer = BackgroundWriter()
+    yield writer
+    writer.close()
+
+
+@pytest.fixture
+def make_store(tmp_path, writer):
+    db_path = str(tmp_path / 'app.db')
+    conn = database.thread_connection(db_path)
+    with conn:
+        conn.execute('''CREATE TABLE predictions (id INTEGER PRIMARY KEY, image_filename TEXT,
+                                                  image_evicted INTEGER NOT NULL DEFAULT 0)''')
+    stores = []
+
+    def make(**options):
+        store = UploadStore(str(tmp_path / 'uploads'), db_path, writer, evict_interval=0, **options)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def put(store, writer, seed, created=None, last_access=None):
+    """Store an image, record a prediction for it and optionally backdate it"""
+    key = store.put(image_bytes(seed), 'png')
+    writer.flush()
+    conn = database.thread_connection(store.db_path)
+    with conn:
+        conn.execute('INSERT INTO predictions (image_filename) VALUES (?)', (key,))
+        if created is not None:
+            conn.execute('UPDATE upload_objects SET created = ? WHERE key = ?', (created, key))
+        if last_access is not None:
+            conn.execute('UPDATE upload_objects SET last_access = ? WHERE key = ?', (last_access, key))
+    return key
+
+
+def evicted_flags(store):
+    conn = database.thread_connection(store.db_path)
+    return dict(conn.execute('SELECT image_filename, image_evicted FROM predictions'))
+
+
+def test_identical_uploads_are_stored_once(make_store, writer):
+    store = make_store()
+    first = store.put(image_bytes(1), 'png')
+    second = store.put(image_bytes(1), 'PNG')
+    writer.flush()
+
+    assert first == second
+    assert storage.KEY_PATTERN.match(first)
+    assert os.path.exists(store.object_path(first)) and os.path.exists(store.thumbnail_path(first))
+    assert (store.stats()['stored'], store.stats()['deduplicated']) == (1, 1)
+
+
+def test_least_recently_used_objects_are_evicted_until_the_store_fits(make_store, writer):
+    store = make_store()
+    keys = [put(store, writer, seed, last_access=1000 + seed) for seed in range(3)]
+    conn = database.thread_connection(store.db_path)
+    sizes = dict(conn.execute('SELECT key, size + thumb_size FROM upload_objects'))
+    store.max_bytes = sizes[keys[1]] + sizes[keys[2]]
+
+    result = store.evict()
+
+    assert result == {'evicted': 1, 'evicted_bytes': sizes[keys[0]]}
+    assert not os.path.exists(store.object_path(keys[0]))
+    assert not os.path.exists(store.thumbnail_path(keys[0]))
+    assert all(os.path.exists(store.object_path(key)) for key in keys[1:])
+    assert evicted_flags(store) == {keys[0]: 1, keys[1]: 0, keys[2]: 0}
+
+
+def test_expired_objects_are_evicted_in_batches(make_store, writer, monkeypatch):
+    monkeypatch.setattr(storage, 'EVICT_BATCH', 2)
+    store = make_store(max_age_seconds=3600)
+    old = [put(store, writer, seed, created=1000.0) for seed in range(5)]
+    fresh = put(store, writer, 99)
+
+    assert store.evict()['evicted'] == 5
+    assert not any(os.path.exists(store.object_path(key)) for key in old)
+    assert os.path.exists(store.object_path(fresh))
+    assert store.stats()['objects'] == 1
+
+
+def test_object_used_after_it_was_selected_is_kept(make_store, writer):
+    store = make_store()
+    key = put(store, writer, 1, last_access=1000.0)
+    store.touch(key)
+
+    conn = database.thread_connection(store.db_path)
+    assert not store._remove(conn, key, 1000.0)
+    assert os.path.exists(store.object_path(key))
+
+
+def test_reupload_after_eviction_restores_the_object_and_its_predictions(make_store, writer):
+    store = make_store(max_age_seconds=3600)
+    key = put(store, writer, 1, created=1000.0)
+    store.evict()
+    assert evicted_flags(store) == {key: 1}
+
+    assert store.put(image_bytes(1), 'png') == key
+    writer.flush()
+    assert os.path.exists(store.object_path(key))
+    assert evicted_flags(store) == {key: 0}
+
+
+def test_registered_object_with_a_missing_file_is_written_again(make_store, writer):
+    store = make_store()
+    key = put(store, writer, 1)
+    os.remove(store.object_path(key))
+
+    store.put(image_bytes(1), 'png')
+    writer.flush()
+    assert os.path.exists(store.object_path(key))
+
+
+@pytest.mark.skipif(storage.fcntl is None, reason="eviction is not coordinated without fcntl")
+def test_only_one_store_on_a_root_runs_eviction_at_a_time(make_store):
+    first, second = make_store(), make_store()
+    assert first._is_evictor()
+    assert not second._is_evictor()
+
+    first.close()
+    assert second._is_evictor()
@@ -0,0 +1,274 @@
+"""
+Video Emotion Timeline
+Author: Onipede-22CG031936
+
+Builds a per-second, per-face emotion timeline for a video clip using the
+same face detection, preprocessing and inference functions as app.py.
+
+Frames are decoded as a stream and sampled at a configurable rate. Full Haar
+detection only runs every few seconds; in between, faces are followed by a
+cheap template-matching tracker. Face crops from many sampled frames are
+classified together in batches. Memory stays bounded for any clip length,
+because finished seconds are yielded as soon as their crops are classified
+and only a small window of crops and open seconds is kept.
+
+Usage:
+    python video_analysis.py clip.mp4 [--sample-fps 2] [--redetect-seconds 1]
+"""
+
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+
+ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+
+
+def _iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def _match_tracks(tracks, detections, threshold=0.3):
+    """
+    Greedily pair existing tracks with new detections, highest overlap first
+
+    Args:
+        tracks: Current FaceTrack objects
+        detections: New (x, y, w, h) boxes
+        threshold: Minimum IoU for a track to keep following a box
+
+    Returns:
+        List with the matched track (or None) for each detection
+    """
+    pairs = sorted(((_iou(track.box, box), t, d)
+                    for t, track in enumerate(tracks) for d, box in enumerate(detections)),
+                   key=lambda pair: pair[0], reverse=True)
+    assigned = [None] * len(detections)
+    used = set()
+    for iou, t, d in pairs:
+        if iou <= threshold:
+            break
+        if t in used or assigned[d] is not None:
+            continue
+        assigned[d] = tracks[t]
+        used.add(t)
+    return assigned
+
+
+class FaceTrack:
+    """
+    Template-matching tracker for one face
+
+    Between detections the face is searched for in a window around its last
+    position with normalized cross-correlation. This costs far less than
+    running the cascade over the whole frame.
+
+    Args:
+        face_id: Stable identifier of the face in the timeline
+        gray: Grayscale frame the face was detected in
+        box: (x, y, w, h) detection box
+    """
+
+    def __init__(self, face_id, gray, box):
+        self.face_id = face_id
+        self.reset(gray, box)
+
+    def reset(self, gray, box):
+        """Re-anchor the track on a fresh detection"""
+        x, y, w, h = box
+        self.box = (int(x), int(y), int(w), int(h))
+        self.template = gray[y:y + h, x:x + w].copy()
+
+    def update(self, gray, search_margin=0.5, min_score=0.5):
+        """
+        Find the face in a new frame
+
+        Args:
+            gray: Grayscale frame
+            search_margin: Search window padding as a fraction of the box size
+            min_score: Minimum correlation to consider the face still present
+
+        Returns:
+            Boolean indicating whether the face was found
+        """
+        x, y, w, h = self.box
+        pad_x, pad_y = int(w * search_margin), int(h * search_margin)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return False
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if score < min_score:
+            return False
+
+        self.box = (x0 + dx, y0 + dy, w, h)
+        return True
+
+
+def analyze_video(video_path, detect_fn, prepare_fn, infer_fn, labels, sample_fps=2.0,
+                  redetect_seconds=1.0, max_faces=10, batch_size=32, summary=None):
+    """
+    Stream a per-second emotion timeline for every face in a video
+
+    Args:
+        video_path: Path of the video file (anything cv2.VideoCapture can open)
+        detect_fn: Callable(gray) -> array of (x, y, w, h) face boxes
+        prepare_fn: Callable(gray, boxes) -> (N, 48, 48, 1) model inputs
+        infer_fn: Callable(batch) -> (N, num_classes) probabilities
+        labels: Emotion label for each output class
+        sample_fps: Frames per second that are analyzed
+        redetect_seconds: Interval between full face detections
+        max_faces: Maximum faces tracked at once
+        batch_size: Face crops classified per forward pass
+        summary: Optional dict that receives processing counters at the end
+
+    Yields:
+        Dicts with 'second', 'face_id', 'emotion', 'confidence', 'samples' and 'box',
+        in order of completion
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError("Could not open video")
+
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_step = max(1, int(round(native_fps / sample_fps)))
+    redetect_every = max(1, int(round(redetect_seconds * native_fps / frame_step)))
+
+    counters = {'frames_read': 0, 'frames_sampled': 0, 'detections': 0,
+                'tracker_updates': 0, 'crops_classified': 0, 'forward_passes': 0, 'faces': 0}
+    tracks = []
+    next_face_id = 0
+
+    pending_crops = []   # Face crops waiting for the next forward pass
+    pending_keys = []    # (second, face_id, box) for each pending crop
+    open_seconds = {}    # (second, face_id) -> [samples, probability sum, last box]
+
+    def classify_pending():
+        """Run one forward pass over the pending crops and fold results into open seconds"""
+        if not pending_crops:
+            return
+        probabilities = infer_fn(np.concatenate(pending_crops, axis=0))
+        counters['forward_passes'] += 1
+        counters['crops_classified'] += len(pending_keys)
+        for (second, face_id, box), probs in zip(pending_keys, probabilities):
+            entry = open_seconds.setdefault((second, face_id), [0, np.zeros(len(labels)), box])
+            entry[0] += 1
+            entry[1] += probs
+            entry[2] = box
+        pending_crops.clear()
+        pending_keys.clear()
+
+    def close_seconds(before_second):
+        """Yield every aggregated second that can no longer receive samples"""
+        for key in sorted(k for k in open_seconds if k[0] < before_second):
+            samples, prob_sum, box = open_seconds.pop(key)
+            mean = prob_sum / samples
+            index = int(np.argmax(mean))
+            yield {
+                'second': key[0],
+                'face_id': key[1],
+                'emotion': labels[index],
+                'confidence': float(mean[index]) * 100,
+                'samples': samples,
+                'box': list(box),
+            }
+
+    try:
+        frame_index = -1
+        sample_index = 0
+        while True:
+            # grab() advances without converting the frame; only sampled frames are retrieved
+            if not capture.grab():
+                break
+            frame_index += 1
+            counters['frames_read'] += 1
+            if frame_index % frame_step:
+                continue
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            counters['frames_sampled'] += 1
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            second = int(frame_index / native_fps)
+
+            if sample_index % redetect_every == 0:
+                # Full detection, matched to existing tracks by overlap
+                counters['detections'] += 1
+                detections = [tuple(int(v) for v in box) for box in detect_fn(gray)]
+                detections = sorted(detections, key=lambda b: b[2] * b[3], reverse=True)[:max_faces]
+                matched = []
+                for box, track in zip(detections, _match_tracks(tracks, detections)):
+                    if track is not None:
+                        track.reset(gray, box)
+                        matched.append(track)
+                    else:
+                        matched.append(FaceTrack(next_face_id, gray, box))
+                        next_face_id += 1
+                tracks = matched
+            else:
+                counters['tracker_updates'] += len(tracks)
+                tracks = [track for track in tracks if track.update(gray)]
+            sample_index += 1
+
+            if tracks:
+                pending_crops.append(prepare_fn(gray, [track.box for track in tracks]))
+                pending_keys.extend((second, track.face_id, track.box) for track in tracks)
+
+            if len(pending_keys) >= batch_size:
+                classify_pending()
+                yield from close_seconds(second)
+
+        classify_pending()
+        yield from close_seconds(float('inf'))
+    finally:
+        capture.release()
+        counters['faces'] = next_face_id
+        counters['native_fps'] = native_fps
+        counters['frame_step'] = frame_step
+        if summary is not None:
+            summary.update(counters)
+
+
+if __name__ == '__main__':
+    import os
+
+    parser = argparse.ArgumentParser(description="Per-second emotion timeline for a video clip")
+    parser.add_argument('video', help="Path of the video file")
+    parser.add_argument('--sample-fps', type=float, default=2.0, help="Frames analyzed per second")
+    parser.add_argument('--redetect-seconds', type=float, default=1.0, help="Seconds between full detections")
+    parser.add_argument('--max-faces', type=int, default=10, help="Maximum faces tracked at once")
+    args = parser.parse_args()
+
+    # Load the model before the first frame instead of in the background
+    os.environ.setdefault('STARTUP_MODE', 'blocking')
+    # Nothing is stored, so skip the web app's database, uploads and writers
+    os.environ.setdefault('SERVICES_ENABLED', '0')
+    import app as emotion_app
+
+    summary = {}
+    for entry in analyze_video(
+        args.video,
+        detect_fn=emotion_app.face_detectors.detect,
+        prepare_fn=emotion_app.crop_faces,
+        infer_fn=emotion_app.run_inference,
+        labels=emotion_app.EMOTION_LABELS,
+        sample_fps=args.sample_fps,
+        redetect_seconds=args.redetect_seconds,
+        max_faces=args.max_faces,
+        summary=summary
+    ):
+        print(json.dumps(entry))
+    print(json.dumps({'summary': summary}))